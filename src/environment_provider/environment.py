@@ -15,21 +15,28 @@
 # limitations under the License.
 """Backend for the environment requests."""
 
+import argparse
 import json
 import time
 import sys
 import traceback
 import logging
+import os
 import re
+from multiprocessing.pool import ThreadPool
+from threading import Event, Thread
 from typing import Optional, Union
 
 from etos_lib import ETOS
 from jsontas.jsontas import JsonTas
+from opentelemetry import context as otel_context
 from opentelemetry import trace
 
 from environment_provider.lib.database import ETCDPath
+from environment_provider.lib.provider_session import ProviderSession
 from environment_provider.lib.registry import ProviderRegistry
-from environment_provider.lib.releaser import EnvironmentReleaser
+from environment_provider.lib.releaser import BatchReleaser, EnvironmentReleaser, ReleaseTimeout
+from environment_provider.splitter.timings import record_released_sub_suite
 from execution_space_provider import ExecutionSpaceProvider
 from execution_space_provider.execution_space import ExecutionSpace
 from iut_provider import IutProvider
@@ -38,6 +45,7 @@ from log_area_provider import LogAreaProvider
 from log_area_provider.log_area import LogArea
 
 TRACER = trace.get_tracer(__name__)
+LOGGER = logging.getLogger(__name__)
 # REGEX for matching /testrun/tercc-id/suite/main-suite-id/subsuite/subsuite-id/suite.
 SUBSUITE_REGEX = r"/testrun/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/suite/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/subsuite/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/suite"  # pylint:disable=line-too-long
 
@@ -73,6 +81,8 @@ def release_environment(
     :return: Whether or not the release was successful
     """
     etos.config.set("SUITE_ID", sub_suite.get("suite_id"))
+    # Record the durations of the tests, if the sub suite has finished, before checking in.
+    record_released_sub_suite(etos, sub_suite)
     iut = sub_suite.get("iut")
     iut_ruleset = provider_registry.get_iut_provider().get("iut")
     executor = sub_suite.get("executor")
@@ -115,55 +125,190 @@ def release_environment(
     return failure
 
 
+def wait_for_logs_collected(testrun: ETCDPath, timeout: float) -> bool:
+    """Wait for the logs of a testrun to be collected.
+
+    A component that downloads the logs of a testrun, such as the ETOS client, registers
+    as its log collector by writing 'false' to the 'logs-collected' key of the testrun,
+    and writes 'true' to it once it has downloaded the logs. The wait for a registered log
+    collector returns as soon as the logs are collected, or at the timeout.
+
+    If no log collector has registered, the logs are given the full timeout to be collected,
+    which is the fixed grace period that the ETOS client has always had.
+
+    :param testrun: Path to the testrun in ETCD.
+    :param timeout: Maximum time, in seconds, to wait for the logs to be collected.
+    :return: Whether or not a registered log collector collected the logs within the timeout.
+    """
+    logs_collected = testrun.join("logs-collected")
+    if logs_collected.read() is None:
+        LOGGER.info(
+            "No log collector has registered, waiting %ds for logs to be collected", timeout
+        )
+        time.sleep(timeout)
+        return False
+    try:
+        events, cancel = logs_collected.watch()
+    except Exception:  # pylint:disable=broad-except
+        LOGGER.warning("Could not watch for collected logs, polling them instead")
+        end = time.time() + timeout
+        while logs_collected.read() != b"true" and time.time() < end:
+            time.sleep(1)
+        return logs_collected.read() == b"true"
+
+    collected = Event()
+
+    def wait_for_collected() -> None:
+        for event in events:
+            kv = event.get("kv", {})
+            if kv.get("key", b"").decode() == str(logs_collected) and kv.get("value") == b"true":
+                collected.set()
+                return
+
+    Thread(target=wait_for_collected, daemon=True).start()
+    try:
+        # Checked after starting the watch, so that the signal is not missed.
+        if logs_collected.read() == b"true" or collected.wait(timeout):
+            return True
+        LOGGER.info("Logs were not collected within %ds, releasing the testrun anyway", timeout)
+        return False
+    finally:
+        cancel()
+
+
+def sub_suite_keys(testrun: ETCDPath) -> list[str]:
+    """Get the keys of all sub suites of a testrun.
+
+    The keys are read from the sub suite index of the testrun, which is written together
+    with each sub suite. Testruns without an index are searched using a keys-only listing.
+
+    :param testrun: Path to the testrun in ETCD.
+    :return: Keys of the sub suites in ETCD.
+    """
+    index = testrun.join("subsuites").read_all()
+    if index:
+        return [value.decode() for value, _ in index]
+    return [key for key in testrun.join("suite").read_keys() if re.match(SUBSUITE_REGEX, key)]
+
+
+def release_sub_suite(
+    etos: ETOS,
+    jsontas: JsonTas,
+    registry: ProviderRegistry,
+    key: str,
+    context: otel_context.Context,
+) -> Optional[Exception]:
+    """Release the environment of a single sub suite in a worker thread.
+
+    :param etos: ETOS library instance.
+    :param jsontas: JSONTas instance, with a dataset of its own since providers modify it.
+    :param registry: The provider registry to get providers from.
+    :param key: Key of the sub suite in ETCD.
+    :param context: OpenTelemetry context to create the release spans in.
+    :return: The exception raised when releasing the sub suite, if any.
+    """
+    token = otel_context.attach(context)
+    try:
+        value = ETCDPath(key).read()
+        if value is None:
+            LOGGER.warning("Sub suite %r has already been removed", key)
+            return None
+        return release_environment(etos, jsontas, registry, json.loads(value))
+    except Exception as exception:  # pylint:disable=broad-except
+        LOGGER.exception("Failed to release sub suite %r", key)
+        return exception
+    finally:
+        otel_context.detach(token)
+
+
 def release_full_environment(etos: ETOS, jsontas: JsonTas, suite_id: str) -> tuple[bool, str]:
     """Release an already requested environment.
 
+    The sub suites are released concurrently, after which the testrun is deleted. Checking in
+    the log areas of the sub suites may remove their logs, and deleting the testrun deletes
+    the references to its last log files, which the ETOS client uses to download the logs.
+    The release therefore starts once the logs have been collected, see
+    :func:`wait_for_logs_collected`.
+
+    The release can be configured with these environment variables:
+
+        - ETOS_LOGS_COLLECTED_TIMEOUT: Maximum time to wait for logs to be collected before
+          releasing the testrun, 0 to not wait (default 30).
+        - ETOS_RELEASE_CONCURRENCY: Number of sub suites to release at the same time (default 10).
+
     :param etos: ETOS library instance.
     :param jsontas: JSONTas instance.
-    :return: Release status and a message if status is False.
+    :param suite_id: ID of the testrun to release.
+    :return: Release status and a message, per failed sub suite, if status is False.
     """
-    failure = None
     registry = ProviderRegistry(etos, jsontas, suite_id)
-    # TODO: Remove the sleeping when we can communicate the log urls to the
-    # etos-client using internal messaging via SSE.
-    #
-    # We need to sleep here for a while to prevent us from deleting the
-    # references to the last log files created. This is to ensure that
-    # etos-client has enough time to find and download them.
-    time.sleep(30)
-    # Iterating over all keys "below" the suite key to find all sub suites.
-    for value, metadata in registry.testrun.join("suite").read_all():
-        key = metadata.get("key", b"").decode()
-        if re.match(SUBSUITE_REGEX, key) is None:
-            continue
-        try:
-            sub_suite = json.loads(value)
-            failure = release_environment(etos, jsontas, registry, sub_suite)
-        except json.JSONDecodeError as exception:
-            failure = exception
-        ETCDPath(key).delete()
+    timeout = float(os.getenv("ETOS_LOGS_COLLECTED_TIMEOUT", "30"))
+    if timeout > 0:
+        wait_for_logs_collected(registry.testrun, timeout)
+    sub_suites = sub_suite_keys(registry.testrun)
+
+    failures = []
+    try:
+        if sub_suites:
+            context = otel_context.get_current()
+            concurrency = max(1, int(os.getenv("ETOS_RELEASE_CONCURRENCY", "10")))
+            with ThreadPool(processes=min(concurrency, len(sub_suites))) as thread_pool:
+                results = thread_pool.starmap(
+                    release_sub_suite,
+                    [
+                        (etos, JsonTas(jsontas.dataset.copy()), registry, key, context)
+                        for key in sub_suites
+                    ],
+                )
+            failures = [(key, failure) for key, failure in zip(sub_suites, results) if failure]
+    finally:
+        registry.close()
+    # All sub suites are deleted together with the testrun, in a single request.
     registry.testrun.delete_all()
 
-    if failure:
-        # Return the traceback from exception stored in failure.
-        return False, "".join(
-            traceback.format_exception(failure, value=failure, tb=failure.__traceback__)
+    if failures:
+        # Return the traceback from the exception of each failed sub suite.
+        return False, "\n".join(
+            f"Failed to release sub suite {key!r}:\n"
+            + "".join(traceback.format_exception(failure, value=failure, tb=failure.__traceback__))
+            for key, failure in failures
         )
     return True, ""
 
 
-def run(environment_id: str):
-    """Run is an entrypoint for releasing environments."""
+def run(environment_id: Union[str, list[str]], label_selector: Optional[str] = None):
+    """Run is an entrypoint for releasing environments.
+
+    A single environment ID is released by itself, several IDs or a label selector
+    are released in bulk, with a single checkin per provider.
+
+    :param environment_id: ID, or list of IDs, of the environments to release.
+    :param label_selector: Label selector of the environments to release.
+    """
+    environment_ids = [environment_id] if isinstance(environment_id, str) else environment_id
     logformat = "[%(asctime)s] %(levelname)s:%(message)s"
     logging.basicConfig(
         level=logging.INFO, stream=sys.stdout, format=logformat, datefmt="%Y-%m-%d %H:%M:%S"
     )
     try:
-        releaser = EnvironmentReleaser()
-        releaser.run(environment_id)
-        result = {"conclusion": "Successful", "description": "Successfully released an environment"}
+        if len(environment_ids) == 1 and label_selector is None:
+            EnvironmentReleaser().run(environment_ids[0])
+            description = "Successfully released an environment"
+        else:
+            BatchReleaser().run(environment_ids or None, label_selector)
+            description = "Successfully released environments"
+        result = {"conclusion": "Successful", "description": description}
         with open("/dev/termination-log", "w", encoding="utf-8") as termination_log:
             json.dump(result, termination_log)
+    except ReleaseTimeout as timeout:
+        # The releases may still succeed, so the release has neither succeeded nor failed.
+        LOGGER.warning("%s", timeout)
+        result = {"conclusion": "Inconclusive", "description": str(timeout)}
+        try:
+            with open("/dev/termination-log", "w", encoding="utf-8") as termination_log:
+                json.dump(result, termination_log)
+        except PermissionError:
+            pass
     except:
         try:
             result = {"conclusion": "Failed", "description": traceback.format_exc()}
@@ -172,7 +317,15 @@ def run(environment_id: str):
         except PermissionError:
             pass
         raise
+    finally:
+        ProviderSession.close_all()
 
 
 if __name__ == "__main__":
-    run(sys.argv[1])
+    PARSER = argparse.ArgumentParser(description="Release environments checked out by ETOS.")
+    PARSER.add_argument("environment_ids", nargs="*", help="IDs of environments to release.")
+    PARSER.add_argument("--selector", help="Label selector of environments to release.")
+    ARGS = PARSER.parse_args()
+    if not ARGS.environment_ids and ARGS.selector is None:
+        PARSER.error("Either environment IDs or a label selector is required")
+    run(ARGS.environment_ids, ARGS.selector)
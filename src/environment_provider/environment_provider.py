@@ -23,8 +23,10 @@ import time
 import traceback
 import uuid
 from datetime import datetime
-from tempfile import NamedTemporaryFile
-from typing import Any, Optional
+from multiprocessing.pool import ThreadPool
+from queue import Queue
+from threading import Event, Lock
+from typing import Any, Iterator, Optional
 
 from etos_lib.etos import ETOS
 from etos_lib.lib.events import EiffelEnvironmentDefinedEvent
@@ -38,28 +40,36 @@ from etos_lib.kubernetes.schemas import (
     Metadata,
 )
 from etos_lib.kubernetes.schemas import Test
-from etos_lib.kubernetes.schemas import Provider as ProviderSchema
 from etos_lib.kubernetes.schemas import EnvironmentRequest as EnvironmentRequestSchema
 from jsontas.jsontas import JsonTas
 from packageurl import PackageURL
+from opentelemetry import context as otel_context
 from opentelemetry import trace
 from opentelemetry.trace import SpanKind
 
+from execution_space_provider import ExecutionSpaceProvider
 from execution_space_provider.execution_space import ExecutionSpace
+from iut_provider.iut import Iut
+from iut_provider.utilities.prepare import Prepare
+from log_area_provider import LogAreaProvider
 from log_area_provider.log_area import LogArea
 
+from .lib.backoff import Backoff, wake_on_release
 from .lib.config import Config
 from .lib.otel_tracing import get_current_context
+from .lib.provider_cache import to_ruleset
+from .lib.provider_session import ProviderSession
 from .lib.encrypt import Encrypt
 from .lib.graphql import request_main_suite
 from .lib.join import Join
 from .lib.json_dumps import JsonDumps
 from .lib.log_area import LogArea
 from .lib.registry import ProviderRegistry
-from .lib.database import ETCDPath
+from .lib.database import Database, ETCDPath
 from .lib.test_suite import TestSuite
 from .lib.uuid_generate import UuidGenerate
 from .splitter.split import Splitter
+from .splitter.timings import TimingStore
 
 logging.getLogger("pika").setLevel(logging.WARNING)
 
@@ -76,7 +86,7 @@ class EnvironmentProviderError(Exception):
     """Environment provider got an error."""
 
 
-class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
+class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes,too-many-public-methods
     """Environment provider."""
 
     logger = logging.getLogger("EnvironmentProvider")
@@ -84,6 +94,8 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
     log_area_provider = None
     execution_space_provider = None
     testrun = None
+    registry = None
+    lock = Lock()
 
     def __init__(self, suite_runner_ids: Optional[list[str]] = None) -> None:
         """Initialize ETOS, dataset, provider registry and splitter.
@@ -116,6 +128,8 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
         self.dataset.add("uuid_generate", UuidGenerate)
         self.dataset.add("join", Join)
         self.dataset.add("encrypt", Encrypt)
+        if self.registry is not None:
+            self.registry.close()
         self.registry = ProviderRegistry(self.etos, self.jsontas, self.suite_id)
 
     def new_dataset(self, request: EnvironmentRequestSchema) -> None:
@@ -162,6 +176,11 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
             "WAIT_FOR_LOG_AREA_TIMEOUT",
             int(os.getenv("ETOS_WAIT_FOR_LOG_AREA_TIMEOUT", "10")),
         )
+        self.etos.config.set(
+            "CHECKOUT_CONCURRENCY", int(os.getenv("ETOS_CHECKOUT_CONCURRENCY", "10"))
+        )
+        self.etos.config.set("SPLITTER", os.getenv("ETOS_SPLITTER", "round-robin"))
+        self.etos.config.set("TEST_TIMINGS_FILE", os.getenv("ETOS_TEST_TIMINGS_FILE"))
 
         self.logger.info("Connect to RabbitMQ")
         self.etos.config.rabbitmq_publisher_from_environment()
@@ -178,6 +197,7 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
                 provider.checkin_all()
             except:  # noqa pylint:disable=bare-except
                 pass
+        self.logger.debug("Database latency: %r", Database.shared().latency)
 
     @staticmethod
     def get_constraint(recipe: dict, key: str) -> Any:
@@ -220,8 +240,17 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
             {"name": sub_suite.get("name"), "uri": url},
         )
 
-        suite = self.registry.testrun.join(f"suite/{sub_suite['test_suite_started_id']}")
-        suite.join(f"/subsuite/{event_id}/suite").write(json.dumps(sub_suite))
+        # The sub suite is added to the sub suite index of the testrun in the same transaction,
+        # so that releasers can find all sub suites without reading every key of the testrun.
+        with self.registry.testrun.transaction() as testrun:
+            suite = testrun.join(f"suite/{sub_suite['test_suite_started_id']}")
+            path = suite.join(f"/subsuite/{event_id}/suite")
+            path.write(json.dumps(sub_suite))
+            testrun.join(f"subsuites/{event_id}").write(str(path))
+            # The durations of the tests are recorded, for the splitter, when it is released.
+            TimingStore.unrecorded(testrun, sub_suite["test_suite_started_id"], event_id).write(
+                "true"
+            )
 
     def upload_sub_suite(self, sub_suite: dict) -> tuple[str, dict]:
         """Upload sub suite to log area.
@@ -231,21 +260,16 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
         """
         sub_suite = sub_suite.copy()
         sub_suite["recipes"] = self.recipes_from_tests(sub_suite["recipes"])
-        try:
-            with NamedTemporaryFile(mode="w", delete=False) as sub_suite_file:
-                json.dump(sub_suite, sub_suite_file)
-            log_area = LogArea(self.etos, sub_suite)
-            return (
-                log_area.upload(
-                    sub_suite_file.name,
-                    f"{sub_suite['name']}.json",
-                    sub_suite["test_suite_started_id"],
-                    sub_suite["sub_suite_id"],
-                ),
-                sub_suite,
-            )
-        finally:
-            os.remove(sub_suite_file.name)
+        log_area = LogArea(self.etos, sub_suite)
+        return (
+            log_area.upload(
+                json.dumps(sub_suite).encode(),
+                f"{sub_suite['name']}.json",
+                sub_suite["test_suite_started_id"],
+                sub_suite["sub_suite_id"],
+            ),
+            sub_suite,
+        )
 
     def recipes_from_tests(self, tests: list[Test]) -> list[dict]:
         """Load Eiffel TERCC recipes from test.
@@ -331,19 +355,246 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
             environment.spec.model_dump(),
         )
 
-    def checkout_an_execution_space(self) -> ExecutionSpace:
+    def publish_sub_suite(self, request: EnvironmentRequestSchema, sub_suite: dict) -> None:
+        """Make a sub suite available to the suite runner.
+
+        :param request: The environment request that the sub suite belongs to.
+        :param sub_suite: Sub suite to publish.
+        """
+        if self.environment_provider_config.etos_controller:
+            self.send_environment_events(*self.create_environment_resource(request, sub_suite))
+        else:
+            self.send_environment_events(*self.upload_sub_suite(sub_suite))
+        self.logger.info(
+            "Environment for %r checked out and is ready for use",
+            sub_suite["name"],
+            extra={"user_log": True},
+        )
+
+    def checkout_an_execution_space(self, jsontas: Optional[JsonTas] = None) -> ExecutionSpace:
         """Check out a single execution space.
 
+        :param jsontas: Optional JSONTas instance, with a dataset private to a single IUT,
+                        to check out the execution space with.
         :return: An execution space
         """
-        return self.execution_space_provider.wait_for_and_checkout_execution_spaces(1, 1)[0]
+        provider = self.execution_space_provider
+        if jsontas is not None:
+            provider = ExecutionSpaceProvider(
+                self.etos, jsontas, provider.ruleset  # pylint:disable=no-member
+            )
+            self.etos.config.get("PROVIDERS").append(provider)
+        return provider.wait_for_and_checkout_execution_spaces(1, 1)[0]
 
-    def checkout_a_log_area(self) -> LogArea:
+    def checkout_a_log_area(self, jsontas: Optional[JsonTas] = None) -> LogArea:
         """Check out a single log area.
 
+        :param jsontas: Optional JSONTas instance, with a dataset private to a single IUT,
+                        to check out the log area with.
         :return: A log area
         """
-        return self.log_area_provider.wait_for_and_checkout_log_areas(1, 1)[0]
+        provider = self.log_area_provider
+        if jsontas is not None:
+            provider = LogAreaProvider(
+                self.etos, jsontas, provider.ruleset  # pylint:disable=no-member
+            )
+            self.etos.config.get("PROVIDERS").append(provider)
+        return provider.wait_for_and_checkout_log_areas(1, 1)[0]
+
+    def checkout_execution_spaces(self, amount: int) -> list[ExecutionSpace]:
+        """Check out several execution spaces in a single request to the provider.
+
+        :param amount: The number of execution spaces to check out.
+        :return: A list of execution spaces.
+        """
+        return self.execution_space_provider.wait_for_and_checkout_execution_spaces(amount, amount)
+
+    def checkout_log_areas(self, amount: int) -> list[LogArea]:
+        """Check out several log areas in a single request to the provider.
+
+        :param amount: The number of log areas to check out.
+        :return: A list of log areas.
+        """
+        return self.log_area_provider.wait_for_and_checkout_log_areas(amount, amount)
+
+    @staticmethod
+    def supports_bulk_checkout(provider: Any) -> bool:
+        """Check whether a provider can check out items for many IUTs in a single request.
+
+        External providers are not given any IUT specific data when starting a checkout,
+        which means that a single request for N items is equivalent to N requests for
+        one item. JSONTas providers may evaluate the 'iut' key in their rulesets and are
+        therefore always checked out per IUT.
+
+        :param provider: The execution space or log area provider to check.
+        :return: Whether or not bulk checkout is supported.
+        """
+        return provider.ruleset.get("type", "jsontas") == "external"
+
+    def checkout_iut_resources(
+        self,
+        test_runner: str,
+        iut: Iut,
+        suite: dict,
+        context: otel_context.Context,
+        cancelled: Optional[Event] = None,
+    ) -> tuple[Iut, dict]:
+        """Check out an execution space and a log area for a single IUT.
+
+        This method is executed in a worker thread and works on a copy of the dataset
+        so that the 'iut', 'suite' and 'executor' keys are never shared between IUTs.
+        Execution spaces and log areas that are already added to the suite, by a bulk
+        checkout, are not checked out again, and nothing more is checked out once the
+        checkout is cancelled.
+
+        :param test_runner: The test runner that the IUT is assigned to.
+        :param iut: The IUT to check out an execution space and a log area for.
+        :param suite: The suite dictionary, for the IUT, to add the execution space and
+                      log area to.
+        :param context: OpenTelemetry context to create the checkout spans in.
+        :param cancelled: Optional event that is set when the checkout is cancelled.
+        :return: The IUT and its suite.
+        """
+        if cancelled is None:
+            cancelled = Event()
+        FORMAT_CONFIG.identifier = self.suite_id
+        with self.lock:
+            dataset = self.dataset.copy()
+        jsontas = JsonTas(dataset=dataset)
+        dataset.add("iut", iut)
+        dataset.add("suite", suite)
+
+        if suite.get("executor") is None and not cancelled.is_set():
+            with self.tracer.start_as_current_span(
+                "request_execution_space", context=context, kind=SpanKind.CLIENT
+            ) as span:
+                span.set_attribute(SemConvAttributes.TEST_RUNNER_ID, test_runner)
+                suite["executor"] = self.checkout_an_execution_space(jsontas)
+        dataset.add("executor", suite.get("executor"))
+
+        if suite.get("log_area") is None and not cancelled.is_set():
+            with self.tracer.start_as_current_span(
+                "request_log_area", context=context, kind=SpanKind.CLIENT
+            ) as span:
+                span.set_attribute(SemConvAttributes.TEST_RUNNER_ID, test_runner)
+                suite["log_area"] = self.checkout_a_log_area(jsontas)
+        return iut, suite
+
+    def assign_bulk_checkout(self, provider: Any, key: str, iuts: dict, items: list) -> None:
+        """Assign the items of a bulk checkout to the suites of the IUTs, one item per suite.
+
+        Providers are requested for exactly one item per IUT. Should a provider return
+        more items than that, the surplus is checked in immediately instead of being kept
+        until the environment is released. Should it return fewer, the IUTs without an
+        item are checked out per IUT instead.
+
+        :param provider: The execution space or log area provider that was checked out from.
+        :param key: The key to add the items to in the suites, 'executor' or 'log_area'.
+        :param iuts: IUTs, and their suites, that are assigned to the test runner.
+        :param items: The items returned by the provider.
+        """
+        suites = list(iuts.values())
+        for suite, item in zip(suites, items):
+            suite[key] = item
+        if len(items) > len(suites):
+            self.logger.warning(
+                "Provider %r returned %d items for %d IUTs, checking in the surplus",
+                provider.id,
+                len(items),
+                len(suites),
+            )
+            provider.checkin(items[len(suites) :])
+        elif len(items) < len(suites):
+            self.logger.warning(
+                "Provider %r returned %d items for %d IUTs, checking out the rest per IUT",
+                provider.id,
+                len(items),
+                len(suites),
+            )
+
+    def bulk_checkout_executors_and_log_areas(self, test_runner: str, iuts: dict) -> None:
+        """Check out execution spaces and log areas for all IUTs from providers that support it.
+
+        :param test_runner: The test runner that the IUTs are assigned to.
+        :param iuts: IUTs, and their suites, that are assigned to the test runner.
+        """
+        if self.supports_bulk_checkout(self.execution_space_provider):
+            with self.tracer.start_as_current_span(
+                "request_execution_space", kind=SpanKind.CLIENT
+            ) as span:
+                span.set_attribute(SemConvAttributes.TEST_RUNNER_ID, test_runner)
+                executors = self.checkout_execution_spaces(len(iuts))
+            self.assign_bulk_checkout(self.execution_space_provider, "executor", iuts, executors)
+
+        if self.supports_bulk_checkout(self.log_area_provider):
+            with self.tracer.start_as_current_span(
+                "request_log_area", kind=SpanKind.CLIENT
+            ) as span:
+                span.set_attribute(SemConvAttributes.TEST_RUNNER_ID, test_runner)
+                log_areas = self.checkout_log_areas(len(iuts))
+            self.assign_bulk_checkout(self.log_area_provider, "log_area", iuts, log_areas)
+
+    def checkout_executors_and_log_areas(
+        self, test_runner: str, iuts: dict
+    ) -> Iterator[tuple[Iut, dict]]:
+        """Check out an execution space and a log area for all IUTs of a test runner.
+
+        Providers that support bulk checkout are requested once for all IUTs, the rest
+        are checked out per IUT in parallel. The number of parallel checkouts is limited
+        by the 'CHECKOUT_CONCURRENCY' config.
+
+        IUTs are yielded as soon as both their execution space and log area are checked
+        out, so that the caller can publish a sub suite while the rest of the IUTs are
+        still waiting for their environments.
+
+        If a checkout fails, or the caller stops iterating, the checkouts that have not
+        started are cancelled and the ones in progress are waited for, so that everything
+        checked out is known by the providers when they are checked in by :meth:`cleanup`.
+
+        :param test_runner: The test runner that the IUTs are assigned to.
+        :param iuts: IUTs, and their suites, that are assigned to the test runner.
+        :return: An iterator of IUTs, and their suites, with checked out environments.
+        """
+        for suite in iuts.values():
+            suite["sub_suite_id"] = str(uuid.uuid4())
+
+        self.bulk_checkout_executors_and_log_areas(test_runner, iuts)
+
+        remaining = {}
+        for iut, suite in iuts.items():
+            if suite.get("executor") is None or suite.get("log_area") is None:
+                remaining[iut] = suite
+            else:
+                yield iut, suite
+        if not remaining:
+            return
+
+        # Worker threads produce IUTs with checked out environments to the ready queue, which
+        # is consumed here in the order that the environments become ready.
+        ready = Queue()
+        cancelled = Event()
+        context = otel_context.get_current()
+        concurrency = max(1, min(self.etos.config.get("CHECKOUT_CONCURRENCY"), len(remaining)))
+        thread_pool = ThreadPool(processes=concurrency)
+        try:
+            for iut, suite in remaining.items():
+                thread_pool.apply_async(
+                    self.checkout_iut_resources,
+                    args=(test_runner, iut, suite, context, cancelled),
+                    callback=ready.put,
+                    error_callback=ready.put,
+                )
+            for _ in remaining:
+                result = ready.get()
+                if isinstance(result, BaseException):
+                    raise result
+                yield result
+        finally:
+            # Terminating the pool would leave the worker threads running, and checking
+            # out, after the caller has cleaned up.
+            cancelled.set()
+            thread_pool.close()
+            thread_pool.join()
 
     def checkout_timeout(self) -> int:
         """Get timeout for checkout."""
@@ -375,7 +626,9 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
         # pylint:disable=too-many-statements
         self.logger.info("Checkout environment for %r", request.spec.name, extra={"user_log": True})
         self.new_dataset(request)
-        splitter = Splitter(self.etos, request.spec.splitter)
+        splitter = Splitter(
+            self.etos, request.spec.splitter, self.dataset.get("splitter"), self.iut_provider.id
+        )
 
         # TODO: This is a hack to make the controller environment work without too many changes
         # to the original code, since we want to run them at the same time.
@@ -426,91 +679,71 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
         )
         finished = []
         timeout = self.checkout_timeout()
-        while time.time() < timeout:
-            self.set_total_test_count_and_test_runners(test_runners)
-
-            with self.tracer.start_as_current_span("request_iuts", kind=SpanKind.CLIENT) as span:
-                # Check out and assign IUTs to test runners.
-                iuts = self.iut_provider.wait_for_and_checkout_iuts(
-                    minimum_amount=request.spec.minimumAmount,
-                    # maximum_amount=request.spec.maximumAmount,
-                    # TODO: Total test count changes, must check
-                    maximum_amount=self.dataset.get(
-                        "maximum_amount",
-                        os.getenv(
-                            "ETOS_MAX_PARALLEL_IUTS",
-                            self.etos.config.get("TOTAL_TEST_COUNT"),
+        # Retry right away when another testrun releases its environment, instead of waiting
+        # for the next interval of the backoff.
+        wakeup, cancel = wake_on_release(ETCDPath("/testrun"), self.registry.testrun)
+        try:
+            for _ in Backoff(timeout, wakeup):
+                self.set_total_test_count_and_test_runners(test_runners)
+
+                with self.tracer.start_as_current_span(
+                    "request_iuts", kind=SpanKind.CLIENT
+                ) as span:
+                    # Check out and assign IUTs to test runners.
+                    iuts = self.iut_provider.wait_for_and_checkout_iuts(
+                        minimum_amount=request.spec.minimumAmount,
+                        # maximum_amount=request.spec.maximumAmount,
+                        # TODO: Total test count changes, must check
+                        maximum_amount=self.dataset.get(
+                            "maximum_amount",
+                            os.getenv(
+                                "ETOS_MAX_PARALLEL_IUTS",
+                                self.etos.config.get("TOTAL_TEST_COUNT"),
+                            ),
                         ),
-                    ),
-                )
-                splitter.assign_iuts(test_runners, iuts)
-                span.set_attribute(SemConvAttributes.IUT_DESCRIPTION, str(iuts))
-
-            for test_runner in test_runners:  # pylint:disable=consider-using-dict-items
-                self.dataset.add("test_runner", test_runner)
-
-                # No IUTs assigned to test runner
-                if not test_runners[test_runner].get("iuts"):
-                    continue
-
-                # Check out an executor and log area for each IUT.
-                for iut, suite in test_runners[test_runner].get("iuts", {}).items():
-                    self.dataset.add("iut", iut)
-                    self.dataset.add("suite", suite)
-                    suite["sub_suite_id"] = str(uuid.uuid4())
-
-                    with self.tracer.start_as_current_span(
-                        "request_execution_space", kind=SpanKind.CLIENT
-                    ) as span:
-                        span.set_attribute(SemConvAttributes.TEST_RUNNER_ID, test_runner)
-                        suite["executor"] = self.checkout_an_execution_space()
-                        self.dataset.add("executor", suite["executor"])
-
-                    with self.tracer.start_as_current_span(
-                        "request_log_area", kind=SpanKind.CLIENT
-                    ) as span:
-                        span.set_attribute(SemConvAttributes.TEST_RUNNER_ID, test_runner)
-                        suite["log_area"] = self.checkout_a_log_area()
-
-                # Split the tests into sub suites
-                splitter.split(test_runners[test_runner])
-
-                # Add sub suites to test suite structure and send environment events to the ESR.
-                for iut, suite in test_runners[test_runner].get("iuts", {}).items():
-                    sub_suite = test_suite.add(
-                        request,
-                        test_runner,
-                        iut,
-                        suite,
-                        test_runners[test_runner]["priority"],
                     )
-                    if self.environment_provider_config.etos_controller:
-                        self.send_environment_events(
-                            *self.create_environment_resource(request, sub_suite)
+                    splitter.assign_iuts(test_runners, iuts)
+                    span.set_attribute(SemConvAttributes.IUT_DESCRIPTION, str(iuts))
+
+                for test_runner in test_runners:  # pylint:disable=consider-using-dict-items
+                    self.dataset.add("test_runner", test_runner)
+
+                    # No IUTs assigned to test runner
+                    if not test_runners[test_runner].get("iuts"):
+                        continue
+
+                    # Split the tests into sub suites
+                    splitter.split(test_runners[test_runner])
+
+                    # Check out an executor and log area for each IUT and send the environment
+                    # events to the ESR for each sub suite as soon as its environment is ready.
+                    for iut, suite in self.checkout_executors_and_log_areas(
+                        test_runner, test_runners[test_runner].get("iuts", {})
+                    ):
+                        sub_suite = test_suite.add(
+                            request,
+                            test_runner,
+                            iut,
+                            suite,
+                            test_runners[test_runner]["priority"],
                         )
-                    else:
-                        self.send_environment_events(*self.upload_sub_suite(sub_suite))
-
-                    self.logger.info(
-                        "Environment for %r checked out and is ready for use",
-                        sub_suite["name"],
-                        extra={"user_log": True},
-                    )
-                finished.append(test_runner)
-
-            # Remove finished sub suites.
-            for test_runner in finished:
-                try:
-                    test_runners.pop(test_runner)
-                except KeyError:
-                    pass
-
-            # Exit only if there are no sub suites left to assign
-            if not test_runners:
-                break
-            time.sleep(5)
-        else:
-            raise TimeoutError("Could not check out an environment before timeout.")
+                        self.publish_sub_suite(request, sub_suite)
+                    finished.append(test_runner)
+
+                # Remove finished sub suites.
+                for test_runner in finished:
+                    try:
+                        test_runners.pop(test_runner)
+                    except KeyError:
+                        pass
+
+                # Exit only if there are no sub suites left to assign
+                if not test_runners:
+                    break
+            else:
+                raise TimeoutError("Could not check out an environment before timeout.")
+        finally:
+            cancel()
 
         self.logger.info(
             "All environments for test suite %r have been checked out",
@@ -586,45 +819,45 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
     def _configure_provider(self, provider_db: ETCDPath, provider_spec: dict, name: str):
         """Configure a single provider for a testrun."""
         self.logger.info("Saving provider with name %r in %r", name, provider_db)
-        provider_model = ProviderSchema.model_validate(provider_spec)
-        if provider_model.spec.jsontas:
-            ruleset = json.dumps({name: provider_model.to_jsontas()})
-        else:
-            ruleset = json.dumps({name: provider_model.to_external()})
-        provider_db.write(ruleset)
+        provider_db.write(json.dumps({name: to_ruleset(provider_spec)}))
 
-    def _configure_iut(self, provider_spec: dict):
+    def _configure_iut(self, testrun: ETCDPath, provider_spec: dict):
         """Configure iut provider for a testrun."""
-        db = self.registry.testrun.join("provider/iut")  # type: ignore
+        db = testrun.join("provider/iut")
         self._configure_provider(db, provider_spec, "iut")
 
-    def _configure_log_area(self, provider_spec: dict):
+    def _configure_log_area(self, testrun: ETCDPath, provider_spec: dict):
         """Configure log area provider for a testrun."""
-        db = self.registry.testrun.join("provider/log-area")  # type: ignore
+        db = testrun.join("provider/log-area")
         self._configure_provider(db, provider_spec, "log")
 
-    def _configure_execution_space(self, provider_spec: dict):
+    def _configure_execution_space(self, testrun: ETCDPath, provider_spec: dict):
         """Configure execution space provider for a testrun."""
-        db = self.registry.testrun.join("provider/execution-space")  # type: ignore
+        db = testrun.join("provider/execution-space")
         self._configure_provider(db, provider_spec, "execution_space")
 
-    def _configure_dataset(self, datasets: list[dict]):
+    def _configure_dataset(self, testrun: ETCDPath, datasets: list[dict]):
         """Configure dataset for a testrun."""
-        db = self.registry.testrun.join("provider/dataset")  # type: ignore
+        db = testrun.join("provider/dataset")
         db.write(json.dumps(datasets))
 
     def configure_environment_provider(self, request: EnvironmentRequestSchema):
-        """Configure the environment provider if run as a part of the ETOS kubernetes controller."""
+        """Configure the environment provider if run as a part of the ETOS kubernetes controller.
+
+        All providers are written to the database in a single transaction, so that a testrun
+        is never partially configured.
+        """
         self.logger.info("Running in an ETOS cluster - Configuring testrun")
         provider_client = Provider(self.kubernetes)
 
         iut = provider_client.get(request.spec.providers.iut.id).to_dict()  # type: ignore
-        self._configure_iut(iut)  # type: ignore
         log_area = provider_client.get(request.spec.providers.logArea.id).to_dict()  # type: ignore
-        self._configure_log_area(log_area)  # type: ignore
         provider_id = request.spec.providers.executionSpace.id  # type: ignore
         execution_space = provider_client.get(provider_id).to_dict()  # type: ignore
-        self._configure_execution_space(execution_space)  # type: ignore
+        with self.registry.testrun.transaction() as testrun:  # type: ignore
+            self._configure_iut(testrun, iut)  # type: ignore
+            self._configure_log_area(testrun, log_area)  # type: ignore
+            self._configure_execution_space(testrun, execution_space)  # type: ignore
 
     def get_environment(self) -> dict:
         """Run the environment provider.
@@ -654,6 +887,9 @@ class EnvironmentProvider:  # pylint:disable=too-many-instance-attributes
             )
             raise
         finally:
+            self.registry.close()
+            Prepare.shutdown()
+            ProviderSession.close_all()
             if self.etos.publisher is not None and not self.etos.debug.disable_sending_events:
                 self.etos.publisher.wait_for_unpublished_events()
                 self.etos.publisher.stop()
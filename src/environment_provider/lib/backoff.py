@@ -0,0 +1,158 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Retry scheduler with exponential backoff."""
+
+import logging
+import os
+import random
+import time
+from threading import Event, Thread
+from typing import Callable, Iterator, Optional
+
+from .database import ETCDPath
+
+
+class Backoff:  # pylint:disable=too-few-public-methods
+    """Schedule retries with exponential backoff and jitter until a deadline.
+
+    Iterating over a backoff yields the attempt number, starting with an immediate first
+    attempt. Between attempts the backoff waits an exponentially growing, jittered,
+    interval. If the next interval would pass the deadline, the backoff instead waits
+    until the deadline and then makes one final attempt. No attempt is made if the
+    deadline has already passed when iterating starts.
+
+    An optional wake-up event, for instance set by a thread watching for released
+    capacity in ETCD, interrupts the wait and triggers the next attempt right away. The
+    interval then restarts from the minimum.
+
+    Usage::
+
+        for _ in Backoff(time.time() + 60):
+            if try_something():
+                break
+        else:
+            raise TimeoutError("Did not succeed within 60s")
+
+    The intervals can be configured with these environment variables:
+
+        - ETOS_BACKOFF_MINIMUM: Minimum interval, in seconds, between attempts (default 1).
+        - ETOS_BACKOFF_MAXIMUM: Maximum interval, in seconds, between attempts (default 5).
+        - ETOS_BACKOFF_FACTOR: Factor to multiply the interval with per attempt (default 2).
+        - ETOS_BACKOFF_JITTER: Random jitter, as a fraction of the interval (default 0.2).
+
+    The maximum interval is the fixed 5 second sleep that the backoff replaced, so that
+    a retry is never made later than before, while the first retries are made sooner.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, end: float, wakeup: Optional[Event] = None) -> None:
+        """Initialize backoff.
+
+        :param end: Deadline, as a timestamp, after which no more attempts are made.
+        :param wakeup: Optional event that, when set, triggers the next attempt right away.
+        """
+        self.end = end
+        self.wakeup = wakeup
+        self.minimum = float(os.getenv("ETOS_BACKOFF_MINIMUM", "1"))
+        self.maximum = max(self.minimum, float(os.getenv("ETOS_BACKOFF_MAXIMUM", "5")))
+        self.factor = float(os.getenv("ETOS_BACKOFF_FACTOR", "2"))
+        self.jitter = float(os.getenv("ETOS_BACKOFF_JITTER", "0.2"))
+
+    def interval(self, retry: int) -> float:
+        """Calculate the interval to wait before a retry.
+
+        :param retry: The number of retries made, starting at 0.
+        :return: Interval in seconds, bounded by the minimum and maximum intervals.
+        """
+        interval = min(self.maximum, self.minimum * self.factor**retry)
+        interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return min(self.maximum, max(self.minimum, interval))
+
+    def wait(self, interval: float) -> bool:
+        """Wait for an interval, or until woken up.
+
+        :param interval: Interval, in seconds, to wait.
+        :return: Whether or not the wait was interrupted by the wake-up event.
+        """
+        if self.wakeup is None:
+            time.sleep(interval)
+            return False
+        woken = self.wakeup.wait(interval)
+        self.wakeup.clear()
+        return woken
+
+    def __iter__(self) -> Iterator[int]:
+        """Yield attempt numbers until the deadline has passed.
+
+        :return: An iterator of attempt numbers.
+        """
+        if time.time() >= self.end:
+            return
+        attempt = 0
+        retry = 0
+        while True:
+            yield attempt
+            attempt += 1
+            remaining = self.end - time.time()
+            if remaining <= 0:
+                return
+            interval = self.interval(retry)
+            if interval >= remaining:
+                self.logger.debug("Making a final attempt in %.1fs", remaining)
+                interval = remaining
+            if self.wait(interval):
+                # Capacity was released, restart the backoff from the minimum interval.
+                retry = 0
+            else:
+                retry += 1
+
+
+def wake_on_release(path: ETCDPath, ignore: Optional[ETCDPath] = None) -> tuple[Event, Callable]:
+    """Watch for keys being deleted below an ETCD path, to wake up a backoff on releases.
+
+    Testruns are deleted from ETCD when their environments are released, so watching
+    '/testrun' wakes up a backoff as soon as another testrun has released its IUTs.
+
+    Usage::
+
+        wakeup, cancel = wake_on_release(ETCDPath("/testrun"), ETCDPath(f"/testrun/{suite_id}"))
+        try:
+            for _ in Backoff(time.time() + 60, wakeup):
+                ...
+        finally:
+            cancel()
+
+    :param path: ETCD path to watch for deletes below.
+    :param ignore: Optional ETCD path, below the watched path, whose deletes are ignored.
+    :return: An event that is set on every delete, and a function that cancels the watch.
+    """
+    wakeup = Event()
+    events, cancel = path.watch_all()
+    prefix = f"{ignore.path}/" if ignore is not None else None
+
+    def wake() -> None:
+        """Set the wake-up event for every delete that is not ignored."""
+        for event in events:
+            if event.get("type") != "DELETE":
+                continue
+            key = event.get("kv", {}).get("key", b"").decode()
+            if prefix is not None and key.startswith(prefix):
+                continue
+            wakeup.set()
+
+    Thread(target=wake, daemon=True).start()
+    return wakeup, cancel
@@ -19,7 +19,7 @@ import logging
 import time
 import json
 import os
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from urllib3.exceptions import MaxRetryError
 from etos_lib import ETOS
@@ -39,6 +39,18 @@ from environment_provider.lib.registry import ProviderRegistry
 from .graphql import request_activity_triggered, request_artifact_created
 
 
+class RuntimeProfile(NamedTuple):
+    """Runtime profile of the environment provider, resolved once at startup.
+
+    The profile holds whether or not the environment provider is running as a part of the
+    ETOS controller and, if it is, the name of the EnvironmentRequest to provide an
+    environment for.
+    """
+
+    etos_controller: bool
+    request_name: Optional[str] = None
+
+
 class Config:
     """Environment provider configuration."""
 
@@ -57,15 +69,21 @@ class Config:
         self.kubernetes = kubernetes
         self.etos = etos
         self.ids = ids
+        self.runtime = self.resolve_runtime()
         self.load_config()
 
-    @property
-    def etos_controller(self) -> bool:
-        """Whether or not the environment provider is running as a part of the ETOS controller."""
+    def resolve_runtime(self) -> RuntimeProfile:
+        """Resolve whether or not the environment provider is running in the ETOS controller.
+
+        :return: The runtime profile of the environment provider.
+        """
+        request_name = os.getenv("REQUEST")
+        if request_name is None:
+            return RuntimeProfile(etos_controller=False)
         try:
             request = EnvironmentRequest(self.kubernetes)
-            request_name = os.getenv("REQUEST")
-            return request_name is not None and request.exists(request_name)
+            if request.exists(request_name):
+                return RuntimeProfile(etos_controller=True, request_name=request_name)
         except MaxRetryError:
             self.logger.warning(
                 "Could not initialize EnvironmentRequest client, "
@@ -73,7 +91,12 @@ class Config:
                 "in Kubernetes or that the ETOS controller system is not "
                 "deployed in this cluster."
             )
-            return False
+        return RuntimeProfile(etos_controller=False)
+
+    @property
+    def etos_controller(self) -> bool:
+        """Whether or not the environment provider is running as a part of the ETOS controller."""
+        return self.runtime.etos_controller
 
     def load_config(self) -> None:
         """Load config from environment variables."""
@@ -137,11 +160,9 @@ class Config:
         if self.__request is None:
             if self.etos_controller:
                 request_client = EnvironmentRequest(self.kubernetes)
-                request_name = os.getenv("REQUEST")
-                assert request_name is not None, "Environment variable REQUEST must be set!"
                 self.__request = [
                     EnvironmentRequestSchema.model_validate(
-                        request_client.get(request_name).to_dict()  # type: ignore
+                        request_client.get(self.runtime.request_name).to_dict()  # type: ignore
                     )
                 ]
             else:
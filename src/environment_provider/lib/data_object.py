@@ -0,0 +1,247 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact data objects for checked out provider items."""
+
+from typing import Any, Iterable, Iterator, Optional
+from uuid import uuid4
+
+
+class DataObject:
+    """Data object with attributes backed by a single dictionary.
+
+    Attributes are read from and written to the dictionary that the object was created
+    with, so that every value is stored once and the object itself carries no instance
+    dictionary.
+
+    Every data object gets a random serial number when it is created, which is kept when
+    it is copied or pickled. Data objects are equal, and hash, by their serial number, so a
+    copy of a checked out item is still the same item, also in another process. The serial
+    number is not part of the dictionary of the object, so an object created from the
+    dictionary of another, e.g. from a sub suite in ETCD, is a new item.
+
+    The object is serialized when :attr:`as_dict` is first requested and the serialization
+    is then reused until an attribute is set or updated. Every request returns a new
+    dictionary, which callers may change without changing the object, but the values in
+    it are the values of the object and are not copied.
+    """
+
+    __slots__ = ("_data", "_serialized", "_serial")
+
+    def __init__(self, **data: Any) -> None:
+        """Take a dictionary as input and use it as the attributes of the object.
+
+        :param data: Dictionary to get attributes from.
+        """
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_serialized", None)
+        object.__setattr__(self, "_serial", uuid4().int)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare data objects by their serial numbers.
+
+        :param other: Object to compare with.
+        :return: Whether or not the objects are the same item.
+        """
+        if not isinstance(other, DataObject):
+            return NotImplemented
+        return self._serial == other._serial
+
+    def __hash__(self) -> int:
+        """Hash a data object by its serial number.
+
+        :return: Hash of the serial number.
+        """
+        return hash(self._serial)
+
+    def __getattr__(self, name: str) -> Any:
+        """Get an attribute from the dictionary of the object.
+
+        :param name: Name of the attribute to get.
+        :return: Value of the attribute.
+        """
+        if name in DataObject.__slots__:
+            raise AttributeError(name)
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            ) from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute in the dictionary of the object.
+
+        :param name: Name of the attribute to set.
+        :param value: Value of the attribute.
+        """
+        self._data[name] = value
+        object.__setattr__(self, "_serialized", None)
+
+    def __delattr__(self, name: str) -> None:
+        """Remove an attribute from the dictionary of the object.
+
+        :param name: Name of the attribute to remove.
+        """
+        try:
+            del self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        object.__setattr__(self, "_serialized", None)
+
+    def __getstate__(self) -> tuple[dict, int]:
+        """Get the state of the object, for copying and pickling.
+
+        :return: The dictionary and serial number of the object.
+        """
+        return self._data, self._serial
+
+    def __setstate__(self, state: tuple[dict, int]) -> None:
+        """Restore the state of the object, when copying and unpickling.
+
+        :param state: The dictionary and serial number of the object.
+        """
+        data, serial = state
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_serialized", None)
+        object.__setattr__(self, "_serial", serial)
+
+    def __copy__(self) -> "DataObject":
+        """Copy the object, with a dictionary of its own.
+
+        :return: A copy of the object, that is the same item, with a shallow copy of the
+                 dictionary of the object.
+        """
+        copied = type(self).__new__(type(self))
+        copied.__setstate__((dict(self._data), self._serial))
+        return copied
+
+    def update(self, **dictionary: Any) -> None:
+        """Update the dictionary of the object with new data.
+
+        :param dictionary: Dictionary to update attributes from.
+        """
+        self._data.update(**dictionary)
+        object.__setattr__(self, "_serialized", None)
+
+    def serialize(self) -> dict:
+        """Create the dictionary representation of the object.
+
+        :return: A copy of the dictionary of the object.
+        """
+        return dict(self._data)
+
+    @property
+    def as_dict(self) -> dict:
+        """Represent the object as a dictionary, serializing it only when it has changed.
+
+        :return: A new dictionary representation of the object.
+        """
+        serialized: Optional[dict] = self._serialized
+        if serialized is None:
+            serialized = self.serialize()
+            object.__setattr__(self, "_serialized", serialized)
+        return dict(serialized)
+
+    def __repr__(self) -> str:
+        """Represent the object as a string.
+
+        :return: The dictionary of the object as a string.
+        """
+        return repr(self._data)
+
+
+class ItemIndex:
+    """Index of the items checked out from a provider.
+
+    Adding, removing and looking up an item takes constant time. Items are iterated in
+    the order they were added. The index remembers which items have been removed, i.e.
+    checked in, so that an item that is checked in twice can be detected.
+    """
+
+    __slots__ = ("_items", "_checked_in")
+
+    def __init__(self, items: Iterable[DataObject] = ()) -> None:
+        """Initialize an index of checked out items.
+
+        :param items: Checked out items to add to the index.
+        """
+        self._items: dict[DataObject, DataObject] = {item: item for item in items}
+        self._checked_in: set[DataObject] = set()
+
+    def add(self, item: DataObject) -> None:
+        """Add a checked out item to the index.
+
+        :param item: Item to add.
+        """
+        self._items[item] = item
+        self._checked_in.discard(item)
+
+    def remove(self, item: DataObject) -> None:
+        """Remove a checked in item from the index.
+
+        :raises ValueError: If the item is not in the index.
+
+        :param item: Item to remove.
+        """
+        try:
+            del self._items[item]
+        except KeyError:
+            raise ValueError(f"{item!r} is not in the index") from None
+        self._checked_in.add(item)
+
+    def checked_in(self, item: DataObject) -> bool:
+        """Check whether an item has been removed from the index.
+
+        :param item: Item to check.
+        :return: Whether or not the item has already been checked in.
+        """
+        return item in self._checked_in
+
+    def __contains__(self, item: object) -> bool:
+        """Check whether an item is in the index.
+
+        :param item: Item to look for.
+        :return: Whether or not the item is checked out.
+        """
+        return isinstance(item, DataObject) and item in self._items
+
+    def __iter__(self) -> Iterator[DataObject]:
+        """Iterate over the items in the index.
+
+        :return: An iterator of the items, in the order they were added.
+        """
+        return iter(list(self._items.values()))
+
+    def __reversed__(self) -> Iterator[DataObject]:
+        """Iterate over the items in the index, in reverse.
+
+        :return: An iterator of the items, in reverse order.
+        """
+        return reversed(list(self._items.values()))
+
+    def __len__(self) -> int:
+        """Count the items in the index.
+
+        :return: Number of items.
+        """
+        return len(self._items)
+
+    def __repr__(self) -> str:
+        """Represent the index as a string.
+
+        :return: The items in the index as a string.
+        """
+        return repr(list(self._items.values()))
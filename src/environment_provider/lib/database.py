@@ -15,28 +15,303 @@
 # limitations under the License.
 """ETCD helpers."""
 
+import base64
+import logging
 import os
-from threading import Event
-from typing import Any, Iterator, Optional, Union
+import time
+from contextlib import contextmanager
+from copy import copy
+from threading import BoundedSemaphore, Event, Lock
+from typing import Any, Callable, Iterator, Optional, Union
 
+import requests
 from etcd3gw import client
+from etcd3gw.lease import Lease
 from etos_lib.lib.config import Config as ETOSConfig
+from requests.adapters import HTTPAdapter
+
+
+def _range_end(prefix: str) -> bytes:
+    """Get the range end of a prefix, which is the prefix with its last byte incremented."""
+    prefix_bytes = prefix.encode()
+    return prefix_bytes[:-1] + bytes([prefix_bytes[-1] + 1])
+
+
+def _encode(data: Any) -> str:
+    """Encode data as base64, the way the ETCD gRPC gateway expects it."""
+    if not isinstance(data, bytes):
+        data = str(data).encode()
+    return base64.b64encode(data).decode()
+
+
+class Latency:
+    """Latency statistics for a single type of database operation."""
+
+    def __init__(self) -> None:
+        """Initialize empty statistics."""
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of an operation.
+
+        :param seconds: Duration, in seconds, of the operation.
+        """
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def as_dict(self) -> dict:
+        """Latency statistics as a dictionary."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.maximum,
+        }
+
+
+class Database:
+    """Database layer shared by all ETCD paths.
+
+    The database layer owns the ETCD client, which talks to the ETCD gRPC gateway over a
+    single pooled HTTP session with keep-alive. Concurrent operations are bounded by the
+    size of the pool and the latency of each type of operation is recorded. Watches are
+    streamed over an HTTP session of their own and are not bounded.
+
+    The client is stored in the ETOS library configuration, under 'database', so that it
+    can be replaced, for instance with a fake database in tests.
+
+    The pool and timeouts can be configured with these environment variables:
+
+        - ETOS_ETCD_POOL_SIZE: Number of connections to keep alive (default 10).
+        - ETOS_ETCD_CONNECT_TIMEOUT: Timeout, in seconds, for connecting (default 5).
+        - ETOS_ETCD_READ_TIMEOUT: Timeout, in seconds, for reading a response (default 30).
+    """
+
+    logger = logging.getLogger(__name__)
+    lock = Lock()
+    __shared: Optional["Database"] = None
+
+    def __init__(self, database: client, pool_size: Optional[int] = None) -> None:
+        """Initialize database layer.
+
+        :param database: ETCD client to use for all operations.
+        :param pool_size: Maximum number of concurrent operations. Defaults to
+                          ETOS_ETCD_POOL_SIZE.
+        """
+        self.client = database
+        pool_size = pool_size or int(os.getenv("ETOS_ETCD_POOL_SIZE", "10"))
+        self.__slots = BoundedSemaphore(pool_size)
+        self.__latency: dict[str, Latency] = {}
+        self.__latency_lock = Lock()
+        self.__watch_client: Optional[client] = None
+        self.__watch_lock = Lock()
+
+    @staticmethod
+    def connect() -> client:
+        """Create an ETCD client with a pooled HTTP session.
+
+        :return: An ETCD client.
+        """
+        pool_size = int(os.getenv("ETOS_ETCD_POOL_SIZE", "10"))
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        database = client(
+            host=os.getenv("ETOS_ETCD_HOST", "etcd-client"),
+            port=int(os.getenv("ETOS_ETCD_PORT", "2379")),
+            timeout=(
+                float(os.getenv("ETOS_ETCD_CONNECT_TIMEOUT", "5")),
+                float(os.getenv("ETOS_ETCD_READ_TIMEOUT", "30")),
+            ),
+        )
+        database.session = session
+        return database
+
+    @classmethod
+    def shared(cls) -> "Database":
+        """Get the database layer for the database client in the ETOS configuration.
+
+        A new ETCD client is connected if there is no client in the configuration.
+
+        :return: The shared database layer.
+        """
+        with cls.lock:
+            database = ETOSConfig().get("database")
+            if database is None:
+                database = cls.connect()
+                ETOSConfig().set("database", database)
+            if cls.__shared is None or cls.__shared.client is not database:
+                cls.__shared = cls(database)
+            return cls.__shared
+
+    def __call(self, operation: str, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Call a database client method and record its latency.
+
+        :param operation: Name of the operation, used for the latency statistics.
+        :param method: Database client method to call.
+        :return: The return value of the method.
+        """
+        with self.__slots:
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                with self.__latency_lock:
+                    self.__latency.setdefault(operation, Latency()).record(duration)
+
+    @property
+    def latency(self) -> dict[str, dict]:
+        """Latency statistics, keyed by operation."""
+        with self.__latency_lock:
+            return {operation: latency.as_dict() for operation, latency in self.__latency.items()}
+
+    def put(self, key: str, value: Any, lease: Optional[Lease] = None) -> Any:
+        """Put a value on a key in the database."""
+        return self.__call("put", self.client.put, key, value, lease)
+
+    def get(self, key: str, **kwargs: Any) -> list:
+        """Get the values of a key in the database."""
+        return self.__call("get", self.client.get, key, **kwargs)
+
+    def get_prefix(self, prefix: str) -> list:
+        """Get the values and metadata of all keys starting with a prefix."""
+        return self.__call("get_prefix", self.client.get_prefix, prefix)
+
+    def get_keys(self, prefix: str, limit: Optional[int] = None) -> list[bytes]:
+        """Get the keys, without values, of all keys starting with a prefix.
+
+        :param prefix: Prefix of the keys to get.
+        :param limit: Maximum number of keys to get.
+        :return: The keys.
+        """
+        # Versions of the ETCD client differ in whether they encode the arguments of 'get'
+        # or pass them on to the gRPC gateway as they are, so the range request is built
+        # and encoded here, like the requests of a transaction.
+        request: dict[str, Any] = {
+            "key": _encode(prefix),
+            "range_end": _encode(_range_end(prefix)),
+            "keys_only": True,
+        }
+        if limit is not None:
+            request["limit"] = limit
+        response = self.__call(
+            "get_keys", self.client.post, self.client.get_url("/kv/range"), json=request
+        )
+        return [base64.b64decode(kv["key"]) for kv in response.get("kvs", [])]
+
+    def delete(self, key: str) -> Any:
+        """Delete a key from the database."""
+        return self.__call("delete", self.client.delete, key)
+
+    def delete_prefix(self, prefix: str) -> Any:
+        """Delete all keys starting with a prefix from the database."""
+        return self.__call("delete_prefix", self.client.delete_prefix, prefix)
+
+    def lease(self, ttl: int) -> Lease:
+        """Create a lease that expires after a time to live, in seconds."""
+        return self.__call("lease", self.client.lease, ttl)
+
+    def transaction(self, txn: dict) -> dict:
+        """Process multiple requests in a single transaction."""
+        return self.__call("transaction", self.client.transaction, txn)
+
+    def __watcher(self) -> client:
+        """Get the ETCD client to stream watches with.
+
+        A watch keeps its HTTP connection for as long as it is watching, and closes it when
+        cancelled. Watches are therefore streamed by a copy of the ETCD client with an HTTP
+        session of its own, so that they never take connections from the pooled session.
+        Clients without an HTTP session, such as fake databases, are used as they are.
+
+        :return: An ETCD client for watches.
+        """
+        session = getattr(self.client, "session", None)
+        if not isinstance(session, requests.Session):
+            return self.client
+        with self.__watch_lock:
+            if self.__watch_client is None:
+                watch_session = requests.Session()
+                watch_session.verify = session.verify
+                watch_session.cert = session.cert
+                watch_client = copy(self.client)
+                watch_client.session = watch_session
+                self.__watch_client = watch_client
+            return self.__watch_client
+
+    def watch(self, key: str, **kwargs: Any) -> tuple[Iterator[dict], Callable]:
+        """Watch a key for changes.
+
+        Watches are long lived, so they are neither bounded by the pool nor streamed over
+        its HTTP session.
+        """
+        return self.__watcher().watch(key, **kwargs)
+
+
+class Transaction:
+    """Collect writes and deletes and commit them as a single ETCD transaction.
+
+    Note that ETCD limits the number of operations in a single transaction, 128 by default.
+    """
+
+    def __init__(self, database: Database) -> None:
+        """Initialize an empty transaction.
+
+        :param database: Database layer to commit the transaction with.
+        """
+        self.database = database
+        self.operations: list[dict] = []
+
+    def put(self, key: str, value: Any, lease: Optional[Lease] = None) -> None:
+        """Add a put of a value on a key to the transaction."""
+        request = {"key": _encode(key), "value": _encode(value)}
+        if lease is not None:
+            request["lease"] = lease.id
+        self.operations.append({"request_put": request})
+
+    def delete(self, key: str) -> None:
+        """Add a delete of a key to the transaction."""
+        self.operations.append({"request_delete_range": {"key": _encode(key)}})
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Add a delete of all keys starting with a prefix to the transaction."""
+        self.operations.append(
+            {
+                "request_delete_range": {
+                    "key": _encode(prefix),
+                    "range_end": _encode(_range_end(prefix)),
+                }
+            }
+        )
+
+    def commit(self) -> None:
+        """Commit all collected operations in a single transaction."""
+        if self.operations:
+            self.database.transaction({"compare": [], "success": self.operations, "failure": []})
+        self.operations = []
 
 
 class ETCDPath:
     """An ETCD path is like a filesystem path, but it works with keys in ETCD."""
 
-    def __init__(self, path: Union[str, bytes] = "/") -> None:
-        """Initialize."""
-        if ETOSConfig().get("database") is None:
-            ETOSConfig().set(
-                "database",
-                client(
-                    host=os.getenv("ETOS_ETCD_HOST", "etcd-client"),
-                    port=int(os.getenv("ETOS_ETCD_PORT", "2379")),
-                ),
-            )
-        self.database: client = ETOSConfig().get("database")
+    def __init__(
+        self,
+        path: Union[str, bytes] = "/",
+        database: Optional[Database] = None,
+        transaction: Optional[Transaction] = None,
+    ) -> None:
+        """Initialize.
+
+        :param path: Path, or key, in ETCD.
+        :param database: Database layer to use. Defaults to the shared database layer.
+        :param transaction: Transaction to add writes and deletes to, instead of executing
+                            them directly. See :meth:`transaction`.
+        """
+        self.database = database or Database.shared()
+        self.__transaction = transaction
         if isinstance(path, bytes):
             path = path.decode()
         self.path = path
@@ -48,7 +323,27 @@ class ETCDPath:
         """
         if new.startswith("/"):
             new = new[1:]
-        return ETCDPath("/".join((self.path, new)))
+        return ETCDPath("/".join((self.path, new)), self.database, self.__transaction)
+
+    @contextmanager
+    def transaction(self) -> Iterator["ETCDPath"]:
+        """Batch writes and deletes on this path, and paths joined with it, in a transaction.
+
+        Writes and deletes are collected and committed as a single ETCD transaction when the
+        context exits, and are discarded if an exception is raised. Reads are not part of the
+        transaction.
+
+        Usage::
+
+            with testrun.transaction() as batch:
+                batch.join("provider/iut").write(iut)
+                batch.join("provider/log-area").write(log_area)
+
+        :return: A view of this path that adds writes and deletes to the transaction.
+        """
+        transaction = Transaction(self.database)
+        yield ETCDPath(self.path, self.database, transaction)
+        transaction.commit()
 
     def write(self, value: Any, expire: Optional[int] = None) -> None:
         """Write a value to an ETCD path.
@@ -59,7 +354,10 @@ class ETCDPath:
         lease = None
         if expire is not None:
             lease = self.database.lease(expire)
-        self.database.put(self.path, value, lease)
+        if self.__transaction is not None:
+            self.__transaction.put(self.path, value, lease)
+        else:
+            self.database.put(self.path, value, lease)
 
     def read(self) -> Optional[bytes]:
         """Read the values from an ETCD path."""
@@ -68,25 +366,67 @@ class ETCDPath:
         except IndexError:
             return None
 
+    def read_revision(self) -> tuple[Optional[bytes], int]:
+        """Read the value from an ETCD path together with the revision it was modified at."""
+        try:
+            value, metadata = self.database.get(self.path, metadata=True)[0]
+        except IndexError:
+            return None, 0
+        return value, int(metadata.get("mod_revision", 0))
+
     def read_all(self) -> list[tuple[bytes, dict]]:
         """Read values of all keys "below" a path."""
         return self.database.get_prefix(self.path)
 
+    def read_keys(self) -> list[str]:
+        """Read the keys, without values, of all keys "below" a path."""
+        return [key.decode() for key in self.database.get_keys(self.path)]
+
     def watch(self) -> tuple[Event, Iterator[dict]]:
         """Watch an ETCD path for any changes."""
         return self.database.watch(self.path)
 
+    def exists_all(self) -> bool:
+        """Check whether any key exists "below" a path, without reading any values."""
+        return bool(self.database.get_keys(self.path, limit=1))
+
     def watch_all(self) -> tuple[Event, Iterator[dict]]:
         """Watch an ETCD path for any changes to itself or its children."""
-        return self.database.watch(self.path, range_end="\0")
+        return self.database.watch(self.path, range_end=_range_end(self.path))
 
     def delete(self) -> None:
         """Delete the ETCD path."""
-        self.database.delete(self.path)
+        if self.__transaction is not None:
+            self.__transaction.delete(self.path)
+        else:
+            self.database.delete(self.path)
+
+    def delete_if_exists(self) -> bool:
+        """Delete the ETCD path, if it exists, with a single compare and delete transaction.
+
+        Of several callers deleting the same path at the same time, only one deletes it.
+
+        :return: Whether or not the path existed and was deleted by this call.
+        """
+        key = _encode(self.path)
+        response = self.database.transaction(
+            {
+                # A key exists if it has been created at a revision greater than 0.
+                "compare": [
+                    {"key": key, "target": "CREATE", "result": "GREATER", "create_revision": 0}
+                ],
+                "success": [{"request_delete_range": {"key": key}}],
+                "failure": [],
+            }
+        )
+        return bool(response.get("succeeded", False))
 
     def delete_all(self) -> None:
         """Delete the ETCD path and paths "below"."""
-        self.database.delete_prefix(self.path)
+        if self.__transaction is not None:
+            self.__transaction.delete_prefix(self.path)
+        else:
+            self.database.delete_prefix(self.path)
 
     def __str__(self) -> str:
         """Represent the ETCD path as a string."""
@@ -193,3 +193,70 @@ def request_main_suite(etos: ETOS, main_suite_id: str) -> Optional[dict]:
                 return None
             return test_suite_started
     return None
+
+
+def request_sub_suite_started(etos: ETOS, environment_id: str) -> Optional[dict]:
+    """Request the test suite started event of the sub suite executed in an environment.
+
+    Unlike the other requests, this one is made once, without waiting for the event.
+
+    :param etos: ETOS library instance.
+    :param environment_id: ID of the environment defined event of the sub suite.
+    :return: The test suite started event, with its ID and time, or None.
+    """
+    query = """
+{
+  testSuiteStarted(last: 1, search: "{'links.type': 'ENVIRONMENT', 'links.target': '%s'}") {
+    edges {
+      node {
+        meta {
+          id
+          time
+        }
+      }
+    }
+  }
+}
+    """
+    response = etos.graphql.execute(query=query % environment_id)
+    if not response:
+        return None
+    try:
+        _, test_suite_started = next(etos.graphql.search_for_nodes(response, "testSuiteStarted"))
+    except StopIteration:
+        return None
+    return test_suite_started
+
+
+def request_test_suite_finished(etos: ETOS, test_suite_started_id: str) -> Optional[dict]:
+    """Request the test suite finished event of a test suite.
+
+    Unlike the other requests, this one is made once, without waiting for the event.
+
+    :param etos: ETOS library instance.
+    :param test_suite_started_id: ID of the test suite started event of the test suite.
+    :return: The test suite finished event, with its time, or None.
+    """
+    query = """
+{
+  testSuiteFinished(
+    last: 1, search: "{'links.type': 'TEST_SUITE_EXECUTION', 'links.target': '%s'}"
+  ) {
+    edges {
+      node {
+        meta {
+          time
+        }
+      }
+    }
+  }
+}
+    """
+    response = etos.graphql.execute(query=query % test_suite_started_id)
+    if not response:
+        return None
+    try:
+        _, test_suite_finished = next(etos.graphql.search_for_nodes(response, "testSuiteFinished"))
+    except StopIteration:
+        return None
+    return test_suite_finished
@@ -15,12 +15,17 @@
 # limitations under the License.
 """Environment provider log area handler."""
 
+import gzip
 import logging
 import os
 import traceback
+import zlib
+from contextlib import ExitStack
 from copy import deepcopy
+from functools import partial
+from io import IOBase
 from json.decoder import JSONDecodeError
-from typing import IO, Optional, Union
+from typing import IO, Iterable, Iterator, Optional, Union
 from urllib3.util import Retry
 
 from cryptography.fernet import Fernet
@@ -37,6 +42,7 @@ from requests.exceptions import HTTPError
 MAX_RETRIES = (
     10  # With 1 as backoff_factor, the total wait time between retries will be 1023 seconds
 )
+CHUNK_SIZE = 64 * 1024
 HTTP_RETRY_PARAMETERS = Retry(
     total=None,
     read=MAX_RETRIES,
@@ -63,11 +69,24 @@ class LogArea:  # pylint:disable=too-few-public-methods
         self.suite_name = sub_suite.get("name").replace(" ", "-")
         self.log_area = sub_suite.get("log_area")
         self.http = Http(retry=HTTP_RETRY_PARAMETERS)
+        self.stream_http = Http(retry=Retry(total=0, read=False))
 
-    def upload(self, log: str, name: str, main_suite_id: str, sub_suite_id: str) -> str:
+    def upload(
+        self,
+        log: Union[str, bytes, Iterable[bytes]],
+        name: str,
+        main_suite_id: str,
+        sub_suite_id: str,
+    ) -> str:
         """Upload log to a storage location.
 
-        :param log: Path to the log to upload.
+        The log can be a path to a file, the log itself as bytes or an iterable of encoded
+        chunks of the log. Chunks are streamed using chunked transfer encoding and, since
+        they can only be consumed once, are not retried on failures.
+        If 'compress' is set in the upload configuration of the log area, the log is
+        uploaded with gzip content encoding.
+
+        :param log: Path to, bytes of or iterable of chunks of the log to upload.
         :param name: Name of file to upload.
         :param main_suite_id: First part of folder to upload to.
         :param sub_suite_id: Second part of folder to upload to.
@@ -83,28 +102,53 @@ class LogArea:  # pylint:disable=too-few-public-methods
         upload["timeout"] = upload.get("timeout", 30)
         if upload.get("auth"):
             upload["auth"] = self.__auth(**upload["auth"])
-
-        with open(log, "rb") as log_file:
+        compress = upload.pop("compress", False)
+        if compress:
+            upload["headers"] = {**upload.get("headers", {}), "Content-Encoding": "gzip"}
+
+        with ExitStack() as stack:
+            if isinstance(log, str):
+                log = stack.enter_context(open(log, "rb"))  # pylint:disable=consider-using-with
+            if compress and isinstance(log, bytes):
+                log = gzip.compress(log)
+            elif compress:
+                if isinstance(log, IOBase):
+                    log = iter(partial(log.read, CHUNK_SIZE), b"")
+                log = self.__gzip(log)
             try:
-                response = self.__upload(log_file=log_file, **upload)
+                response = self.__upload(body=log, **upload)
                 self.logger.debug("%r", response)
                 if not upload.get("as_json", True):
                     self.logger.debug("%r", response.text)
-                self.logger.info("Uploaded log %r.", log)
+                self.logger.info("Uploaded log %r.", name)
                 self.logger.info("Upload URI          %r", upload["url"])
                 self.logger.info("Data:               %r", data)
             except Exception as error:
                 self.logger.error("%r", traceback.format_exc())
                 self.logger.error("Failed to upload log!")
-                self.logger.error("Attempted upload of %r", log)
+                self.logger.error("Attempted upload of %r", name)
                 raise error
         return upload["url"]
 
+    @staticmethod
+    def __gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Compress chunks of a log using gzip.
+
+        :param chunks: Chunks to compress.
+        :return: An iterator of gzip compressed chunks.
+        """
+        compressor = zlib.compressobj(wbits=31)  # 31 gives a gzip header and trailer.
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
     def __upload(
         self,
         verb: str,
         url: str,
-        log_file: IO,
+        body: Union[bytes, IO, Iterator[bytes]],
         timeout: Optional[int] = None,
         as_json: bool = True,
         **requests_kwargs: dict,
@@ -114,7 +158,7 @@ class LogArea:  # pylint:disable=too-few-public-methods
         :param verb: Which HTTP verb to use. GET, PUT, POST
                      (DELETE omitted)
         :param url: URL to retry upload request
-        :param log_file: Opened log file to upload.
+        :param body: Bytes, opened log file or iterator of chunks to upload.
         :param timeout: How long, in seconds, to retry request.
         :param as_json: Whether or not to return json instead of response.
         :param request_kwargs: Keyword arguments for the requests command.
@@ -124,9 +168,14 @@ class LogArea:  # pylint:disable=too-few-public-methods
             timeout = self.etos.debug.default_http_timeout
         self.logger.debug("Retrying URL %s for %d seconds with a %s request.", url, timeout, verb)
 
-        method = getattr(self.http, verb.lower())
+        http = self.http
+        if not isinstance(body, (bytes, IOBase)):
+            # Chunks are consumed by the first attempt and cannot be sent again.
+            http = self.stream_http
+            body = iter(body)
+        method = getattr(http, verb.lower())
         try:
-            response = method(url, data=log_file, timeout=timeout, **requests_kwargs)
+            response = method(url, data=body, timeout=timeout, **requests_kwargs)
             response.raise_for_status()
             if as_json:
                 return response.json()
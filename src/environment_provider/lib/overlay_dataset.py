@@ -0,0 +1,117 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Copy-on-write JSONTas datasets for concurrent evaluation of rulesets.
+
+JSONTas resolves every lookup and addition using a private dictionary of the dataset,
+'_Dataset__dataset', and has no public API for iterating over or replacing it. JSONTas is
+therefore pinned to its 1.4 minor version, and importing this module fails if the installed
+JSONTas does not store its datasets in that dictionary. Raising the pin means re-checking
+that '_Dataset__dataset' is still the dictionary that JSONTas resolves lookups with.
+"""
+
+from collections import ChainMap
+from typing import Any, Mapping, MutableMapping
+
+import jsontas
+from jsontas.dataset import Dataset
+
+DATASET_ATTRIBUTE = "_Dataset__dataset"
+
+
+def dataset_dictionary(dataset: Dataset) -> MutableMapping[str, Any]:
+    """Get the dictionary that a JSONTas dataset resolves lookups and additions with.
+
+    :raises TypeError: If the dataset does not have a dictionary, i.e. the JSONTas version
+                       is not supported.
+
+    :param dataset: Dataset to get the dictionary of.
+    :return: The dictionary of the dataset.
+    """
+    dictionary = vars(dataset).get(DATASET_ATTRIBUTE)
+    if not isinstance(dictionary, MutableMapping):
+        raise TypeError(f"{type(dataset).__name__} has no {DATASET_ATTRIBUTE!r} dictionary")
+    return dictionary
+
+
+def check_dataset_dictionary() -> None:
+    """Check that the installed JSONTas stores its datasets in the dictionary overlays replace.
+
+    :raises ImportError: If the installed JSONTas version is not supported.
+    """
+    try:
+        dataset_dictionary(Dataset())
+    except TypeError as exception:
+        raise ImportError(
+            f"JSONTas {getattr(jsontas, '__version__', '(unknown version)')} is not supported "
+            f"by OverlayDataset, its datasets have no {DATASET_ATTRIBUTE!r} dictionary. "
+            "Install the JSONTas version pinned in the requirements."
+        ) from exception
+
+
+check_dataset_dictionary()
+
+
+class OverlayDataset(Dataset):
+    """JSONTas dataset that reads from a shared snapshot and writes to a local layer.
+
+    Copying a dataset deep copies everything in it, such as the TERCC, the identity and
+    all checked out IUTs. An overlay dataset instead shares a snapshot of another dataset
+    and keeps everything added to it, e.g. the IUT of a single preparation, in a thin
+    layer of its own. Neither the snapshot nor the other overlays see these additions.
+
+    Only the keys of the dataset are copied on write. The values in a snapshot are shared
+    by all of its overlays and must be treated as read-only by the rulesets evaluated on
+    them. Use :meth:`Dataset.copy`, which copies all values, for rulesets that modify
+    values in place.
+
+    Usage::
+
+        snapshot = OverlayDataset.snapshot(jsontas.dataset)
+        for iut in iuts:
+            dataset = OverlayDataset(snapshot)
+            dataset.add("iut", iut)
+            JsonTas(dataset=dataset).run(ruleset)
+    """
+
+    def __init__(self, snapshot: Mapping[str, Any]) -> None:
+        """Initialize an overlay dataset on top of a snapshot.
+
+        :param snapshot: Snapshot of a dataset, from :meth:`snapshot`.
+        """
+        super().__init__()
+        dataset_dictionary(self)
+        setattr(self, DATASET_ATTRIBUTE, ChainMap({}, snapshot))
+
+    @staticmethod
+    def snapshot(dataset: Dataset) -> Mapping[str, Any]:
+        """Take a snapshot of the keys and values in a dataset.
+
+        Values added to the dataset after the snapshot was taken are not part of it.
+        Overlays never write to their snapshot, so it can be shared between threads.
+
+        :param dataset: Dataset to take a snapshot of.
+        :return: A shallow copy of the dataset.
+        """
+        return dict(dataset_dictionary(dataset))
+
+    @classmethod
+    def over(cls, dataset: Dataset) -> "OverlayDataset":
+        """Create an overlay dataset on top of a snapshot of another dataset.
+
+        :param dataset: Dataset to take a snapshot of.
+        :return: A new overlay dataset.
+        """
+        return cls(cls.snapshot(dataset))
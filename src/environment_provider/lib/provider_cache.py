@@ -0,0 +1,254 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Process-wide cache of provider rulesets from Kubernetes."""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock, Thread
+from typing import NamedTuple, Optional
+
+from etos_lib.kubernetes import Provider
+from etos_lib.kubernetes.schemas import Provider as ProviderSchema
+from kubernetes.watch import Watch
+
+
+class CacheEntry(NamedTuple):
+    """A provider ruleset, the resource version it was parsed from and when it expires."""
+
+    resource_version: Optional[str]
+    ruleset: dict
+    expires: float
+
+
+# Annotations on a Provider resource for ruleset settings that the Provider spec lacks.
+ANNOTATION_PREFIX = "etos.eiffel-community.github.io"
+STATUS_PROTOCOL_ANNOTATION = f"{ANNOTATION_PREFIX}/status-protocol"
+STATUS_WAIT_ANNOTATION = f"{ANNOTATION_PREFIX}/status-wait"
+CONCURRENCY_ANNOTATION = f"{ANNOTATION_PREFIX}/concurrency"
+
+
+def to_ruleset(provider: dict) -> dict:
+    """Convert a Provider resource to a provider ruleset.
+
+    Settings that the Provider spec cannot describe are read from the annotations of the
+    resource instead:
+
+        - etos.eiffel-community.github.io/concurrency: Items to check out and in at the same
+          time, for JSONTas providers.
+        - etos.eiffel-community.github.io/status-protocol: 'poll' or 'long-poll', for
+          external providers.
+        - etos.eiffel-community.github.io/status-wait: Seconds to hold a long-poll request,
+          for external providers.
+
+    :param provider: Provider resource, as a dictionary, to convert.
+    :return: The provider ruleset, either a JSONTas or an external ruleset.
+    """
+    provider_model = ProviderSchema.model_validate(provider)
+    annotations = provider.get("metadata", {}).get("annotations") or {}
+    if provider_model.spec.jsontas:
+        ruleset = provider_model.to_jsontas()
+        if CONCURRENCY_ANNOTATION in annotations:
+            ruleset["concurrency"] = int(annotations[CONCURRENCY_ANNOTATION])
+        return ruleset
+    ruleset = provider_model.to_external()
+    if STATUS_PROTOCOL_ANNOTATION in annotations:
+        ruleset["status"]["protocol"] = annotations[STATUS_PROTOCOL_ANNOTATION]
+    if STATUS_WAIT_ANNOTATION in annotations:
+        ruleset["status"]["wait"] = int(annotations[STATUS_WAIT_ANNOTATION])
+    return ruleset
+
+
+class ProviderCache:
+    """Cache of provider rulesets, keyed by namespace and name.
+
+    Within the TTL of an entry the provider is not requested from Kubernetes at all.
+    When the TTL has passed the provider is requested again, but it is only validated
+    and converted to a ruleset again if its resource version differs from the one that
+    the cached ruleset was parsed from. The least
+    recently used entries are evicted when the cache is full.
+
+    With a watch enabled, the cache is refreshed by Kubernetes events instead, which
+    means that a changed or deleted provider is never served from the cache.
+
+    The cache can be configured with these environment variables:
+
+        - ETOS_PROVIDER_CACHE_TTL: Seconds until a cached provider is checked again (default 60).
+        - ETOS_PROVIDER_CACHE_SIZE: Maximum number of cached providers (default 128).
+        - ETOS_PROVIDER_CACHE_WATCH: Refresh the cache by watching providers (default false).
+    """
+
+    logger = logging.getLogger(__name__)
+    lock = Lock()
+    __shared = None
+
+    def __init__(self, ttl: Optional[float] = None, size: Optional[int] = None) -> None:
+        """Initialize an empty provider cache.
+
+        :param ttl: Seconds until a cached provider is checked again.
+        :param size: Maximum number of cached providers.
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv("ETOS_PROVIDER_CACHE_TTL", "60"))
+        self.size = size if size is not None else int(os.getenv("ETOS_PROVIDER_CACHE_SIZE", "128"))
+        self.hits = 0
+        self.misses = 0
+        self.__entries: OrderedDict[tuple[str, str], CacheEntry] = OrderedDict()
+        self.__lock = Lock()
+        self.__watcher: Optional[Watch] = None
+
+    @classmethod
+    def shared(cls) -> "ProviderCache":
+        """Get the provider cache shared by the whole process.
+
+        :return: The shared provider cache.
+        """
+        with cls.lock:
+            if cls.__shared is None:
+                cls.__shared = cls()
+            return cls.__shared
+
+    def __store(self, key: tuple[str, str], resource_version: Optional[str], ruleset: dict) -> None:
+        """Store a provider ruleset, evicting the least recently used entries if full.
+
+        :param key: Namespace and name of the provider.
+        :param resource_version: Resource version that the ruleset was parsed from.
+        :param ruleset: Provider ruleset to store.
+        """
+        with self.__lock:
+            self.__entries[key] = CacheEntry(resource_version, ruleset, time.monotonic() + self.ttl)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
+
+    def __lookup(self, key: tuple[str, str]) -> Optional[CacheEntry]:
+        """Look up a provider in the cache, marking it as recently used.
+
+        :param key: Namespace and name of the provider.
+        :return: The cache entry of the provider, if it is cached.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+            return entry
+
+    def __count(self, hit: bool) -> None:
+        """Count a cache hit or miss.
+
+        :param hit: Whether the provider ruleset was served from the cache.
+        """
+        with self.__lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, provider_client: Provider, provider_id: str) -> dict:
+        """Get the ruleset of a provider, from the cache if possible.
+
+        :param provider_client: Kubernetes client for providers.
+        :param provider_id: ID of the provider to get.
+        :return: A copy of the provider ruleset.
+        """
+        if self.__watcher is None and os.getenv("ETOS_PROVIDER_CACHE_WATCH", "false") == "true":
+            self.watch(provider_client)
+        key = (provider_client.namespace, provider_id)
+        entry = self.__lookup(key)
+        if entry is not None and (self.__watcher is not None or entry.expires > time.monotonic()):
+            self.__count(hit=True)
+            return deepcopy(entry.ruleset)
+
+        provider = provider_client.get(provider_id)
+        assert provider is not None, f"Could not find a provider with ID {provider_id!r}"
+        provider = provider.to_dict()
+        resource_version = provider["metadata"].get("resourceVersion")
+        if entry is not None and resource_version == entry.resource_version:
+            self.__count(hit=True)
+            ruleset = entry.ruleset
+        else:
+            self.__count(hit=False)
+            ruleset = to_ruleset(provider)
+        self.__store(key, resource_version, ruleset)
+        return deepcopy(ruleset)
+
+    def invalidate(self, namespace: str, provider_id: str) -> None:
+        """Remove a provider from the cache.
+
+        :param namespace: Namespace of the provider.
+        :param provider_id: ID of the provider to remove.
+        """
+        with self.__lock:
+            self.__entries.pop((namespace, provider_id), None)
+
+    def clear(self) -> None:
+        """Remove all providers from the cache."""
+        with self.__lock:
+            self.__entries.clear()
+
+    def watch(self, provider_client: Provider) -> None:
+        """Start refreshing the cache by watching providers in Kubernetes.
+
+        :param provider_client: Kubernetes client for providers.
+        """
+        with self.__lock:
+            if self.__watcher is not None:
+                return
+            watcher = self.__watcher = Watch()
+        Thread(target=self.__refresh, args=(provider_client, watcher), daemon=True).start()
+
+    def __refresh(self, provider_client: Provider, watcher: Watch) -> None:
+        """Refresh cached providers from Kubernetes events until the watch is stopped.
+
+        :param provider_client: Kubernetes client for providers.
+        :param watcher: Watcher of the provider events.
+        """
+        namespace = provider_client.namespace
+        try:
+            for event in provider_client.client.watch(  # type: ignore
+                namespace=namespace, watcher=watcher
+            ):
+                provider = event["raw_object"]
+                key = (namespace, provider["metadata"]["name"])
+                if event["type"] == "DELETED" or self.__lookup(key) is None:
+                    self.invalidate(*key)
+                    continue
+                try:
+                    ruleset = to_ruleset(provider)
+                except Exception:  # pylint:disable=broad-exception-caught
+                    self.logger.exception("Failed to parse provider %r", key[1])
+                    self.invalidate(*key)
+                    continue
+                self.__store(key, provider["metadata"].get("resourceVersion"), ruleset)
+        except Exception:  # pylint:disable=broad-exception-caught
+            self.logger.exception("Provider watch failed, falling back to the TTL of the cache")
+        finally:
+            with self.__lock:
+                if self.__watcher is watcher:
+                    self.__watcher = None
+                    # Without the watch, cached entries may be outdated.
+                    self.__entries.clear()
+
+    def close(self) -> None:
+        """Stop watching providers."""
+        with self.__lock:
+            watcher = self.__watcher
+            self.__watcher = None
+            # Without the watch, cached entries may be outdated.
+            self.__entries.clear()
+        if watcher is not None:
+            watcher.stop()
@@ -0,0 +1,235 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pooled HTTP sessions and the status protocol of external providers."""
+
+import os
+import time
+from threading import Lock
+from typing import Any, NamedTuple, Optional
+
+import requests
+from etos_lib.lib.http import TimeoutHTTPAdapter
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Interval, in seconds, between status requests to providers that do not long-poll.
+POLL_INTERVAL = 2
+
+
+class ProviderSession:
+    """Keep-alive HTTP session, with a pool of connections, for an external provider.
+
+    The start, status and stop requests to an external provider all share the same pool
+    of connections, so that polling the status of a provider does not open a new
+    connection for every request.
+
+    Requests sent with `retry=True` are retried by the session, with the retry policy
+    of the provider. Other requests, like status polls and checkins, are retried by
+    their callers and are sent as they are.
+
+    Shared sessions are kept per kind of provider and provider ID, until they are closed
+    with :meth:`close_all` when the process is done with its providers.
+
+    The pool can be configured with this environment variable:
+
+        - ETOS_PROVIDER_POOL_SIZE: Number of connections to keep per host (default 10).
+    """
+
+    lock = Lock()
+    __sessions: dict[tuple[str, str], "ProviderSession"] = {}
+
+    def __init__(self, retry: Retry, pool_size: Optional[int] = None) -> None:
+        """Initialize a session with a connection pool.
+
+        :param retry: Retry policy for requests sent with `retry=True`.
+        :param pool_size: Number of connections to keep per host.
+        """
+        pool_size = pool_size or int(os.getenv("ETOS_PROVIDER_POOL_SIZE", "10"))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        retry_adapter = TimeoutHTTPAdapter(
+            max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        # Both adapters send their requests using the same pool of connections.
+        retry_adapter.poolmanager = adapter.poolmanager
+        self.poolmanager = adapter.poolmanager
+        # Like the adapter of the etos_lib Http client, so that the retry policy can be tuned.
+        self.adapter = retry_adapter
+        self.__session = self.__mount(adapter)
+        self.__retry_session = self.__mount(retry_adapter)
+
+    @staticmethod
+    def __mount(adapter: HTTPAdapter) -> requests.Session:
+        """Create a requests session using an adapter.
+
+        :param adapter: Adapter to send HTTP and HTTPS requests with.
+        :return: A requests session.
+        """
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @classmethod
+    def shared(cls, kind: str, provider_id: str, retry: Retry) -> "ProviderSession":
+        """Get the session shared by all provider instances of the same kind and ID.
+
+        IUT, log area and execution space providers may have the same ID, but have retry
+        policies of their own, so they do not share sessions.
+
+        :param kind: Kind of provider, e.g. 'iut', 'log_area' or 'execution_space'.
+        :param provider_id: ID of the provider to get a session for.
+        :param retry: Retry policy for requests sent with `retry=True`, if a new session
+                      is created.
+        :return: The shared session of the provider.
+        """
+        with cls.lock:
+            key = (kind, provider_id)
+            if key not in cls.__sessions:
+                cls.__sessions[key] = cls(retry)
+            return cls.__sessions[key]
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close all shared sessions and their connections.
+
+        The shared sessions are used by every provider in the process, so this is done
+        when the process is done with its providers. Providers created after this get
+        new sessions.
+        """
+        with cls.lock:
+            sessions = list(cls.__sessions.values())
+            cls.__sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def close(self) -> None:
+        """Close the session and the connections in its pool."""
+        self.__session.close()
+        self.__retry_session.close()
+
+    def get(self, url: str, retry: bool = False, **kwargs: Any) -> requests.Response:
+        """Send a GET request using the connection pool.
+
+        :param url: URL to send the request to.
+        :param retry: Whether or not the session shall retry the request.
+        :return: The response.
+        """
+        session = self.__retry_session if retry else self.__session
+        return session.get(url, **kwargs)
+
+    def post(self, url: str, retry: bool = False, **kwargs: Any) -> requests.Response:
+        """Send a POST request using the connection pool.
+
+        :param url: URL to send the request to.
+        :param retry: Whether or not the session shall retry the request.
+        :return: The response.
+        """
+        session = self.__retry_session if retry else self.__session
+        return session.post(url, **kwargs)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Count the requests sent, connections opened and connections reused.
+
+        Only the connection pools that are still kept by the session are counted.
+
+        :return: Number of requests, connections and reused connections.
+        """
+        sent = 0
+        opened = 0
+        for key in self.poolmanager.pools.keys():
+            pool = self.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            sent += pool.num_requests
+            opened += pool.num_connections
+        return {"requests": sent, "connections": opened, "reused": max(0, sent - opened)}
+
+
+class StatusProtocol(NamedTuple):
+    """Protocol used to wait for the status of an external provider.
+
+    By default the status of a provider is polled every 2 seconds. Providers that support
+    long-polling can advertise it in the status part of their ruleset::
+
+        {
+            "status": {
+                "host": "host to status endpoint",
+                "protocol": "long-poll",
+                "wait": 30
+            }
+        }
+
+    The status requests of a long-polling provider carry a 'wait' parameter, e.g. 'wait=30s',
+    and the provider holds the request until the status changes or the wait has passed.
+    Status requests are then sent back to back, but never more often than the poll interval
+    in case a provider returns early.
+
+    Provider resources in Kubernetes advertise long-polling with annotations instead, see
+    :func:`environment_provider.lib.provider_cache.to_ruleset`.
+    """
+
+    long_poll: bool = False
+    wait: int = 30
+
+    @classmethod
+    def from_ruleset(cls, ruleset: dict) -> "StatusProtocol":
+        """Get the status protocol advertised by a provider ruleset.
+
+        :param ruleset: Ruleset of the external provider.
+        :return: The status protocol of the provider.
+        """
+        status = ruleset.get("status", {})
+        if status.get("protocol") == "long-poll":
+            return cls(long_poll=True, wait=int(status.get("wait", 30)))
+        return cls()
+
+    def params(self, provider_id: str, remaining: float) -> dict:
+        """Get the query parameters of a status request.
+
+        :param provider_id: The ID of the external provider request.
+        :param remaining: Seconds remaining until the wait for the provider times out.
+        :return: Query parameters for the status request.
+        """
+        params = {"id": provider_id}
+        if self.long_poll:
+            params["wait"] = f"{max(1, min(self.wait, int(remaining)))}s"
+        return params
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """Timeout of a status request, leaving long-polling providers time to respond.
+
+        :return: Timeout, in seconds, or None for no timeout.
+        """
+        if self.long_poll:
+            return self.wait + 10
+        return None
+
+    def pace(self, previous: Optional[float]) -> None:
+        """Sleep until the next status request can be sent.
+
+        The first status request is sent right away.
+
+        :param previous: When the previous status request was sent, or None if this is the
+                         first request.
+        """
+        if previous is None:
+            return
+        if self.long_poll:
+            time.sleep(max(0.0, POLL_INTERVAL - (time.time() - previous)))
+        else:
+            time.sleep(POLL_INTERVAL)
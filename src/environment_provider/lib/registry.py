@@ -18,7 +18,9 @@
 import json
 import logging
 from collections import OrderedDict
-from typing import Optional
+from copy import deepcopy
+from threading import Event, Lock, Thread
+from typing import Callable, Optional
 
 import jsonschema
 from etos_lib.etos import ETOS
@@ -31,7 +33,7 @@ from log_area_provider import LogAreaProvider
 from .database import ETCDPath
 
 
-class ProviderRegistry:
+class ProviderRegistry:  # pylint:disable=too-many-instance-attributes
     """Environment provider registry."""
 
     logger = logging.getLogger("Registry")
@@ -53,18 +55,145 @@ class ProviderRegistry:
             self.testrun = None
         self.providers = ETCDPath("/environment/provider")
         self.etos.config.set("PROVIDERS", [])
+        self.__cache: dict[str, tuple[int, dict]] = {}
+        self.__revisions: dict[str, int] = {}
+        self.__lock = Lock()
+        self.__cancel: Optional[Callable] = None
+
+    def __watch(self) -> None:
+        """Start watching the provider configuration in ETCD, if not already watching.
+
+        Any change to a provider invalidates its cached ruleset. Cached rulesets are only
+        used while the configuration is being watched, and rulesets are read directly from
+        ETCD if the configuration cannot be watched.
+        """
+        # Checked and started under the lock, so that getters called from several threads
+        # start only one watch, which is the one that 'close' cancels.
+        with self.__lock:
+            if self.__cancel is not None:
+                return
+            try:
+                events, cancel = self.testrun.join("provider").watch_all()
+            except Exception:  # pylint:disable=broad-except
+                self.logger.warning(
+                    "Could not watch the provider configuration, reading it without a cache",
+                    exc_info=True,
+                )
+                return
+            self.__cancel = cancel
+        thread = Thread(target=self.__invalidate, args=(events, cancel), daemon=True)
+        thread.start()
+
+    def __invalidate(self, events, cancel: Callable) -> None:
+        """Invalidate cached rulesets for all changes to the provider configuration.
+
+        The watch may stop, because it was cancelled or because its stream died, after which
+        changes can no longer be seen. All cached rulesets are then invalidated, and the
+        next getter reads the configuration from ETCD and starts a new watch.
+
+        :param events: Watch events from ETCD.
+        :param cancel: Function that cancels the watch that the events are from.
+        """
+        try:
+            for event in events:
+                key = event.get("kv", {}).get("key", b"").decode()
+                revision = int(event.get("kv", {}).get("mod_revision", 0))
+                with self.__lock:
+                    self.__revisions[key] = max(self.__revisions.get(key, 0), revision)
+                    self.__cache.pop(key, None)
+        except Exception:  # pylint:disable=broad-except
+            self.logger.warning("Watch of the provider configuration failed", exc_info=True)
+        finally:
+            with self.__lock:
+                # A new watch may already have replaced this one after 'close'.
+                if self.__cancel is cancel:
+                    self.__cancel = None
+                    self.__cache.clear()
+
+    def close(self) -> None:
+        """Stop watching the provider configuration and clear the cached rulesets."""
+        with self.__lock:
+            if self.__cancel is not None:
+                self.__cancel()
+                self.__cancel = None
+            self.__cache.clear()
+
+    def __provider(self, name: str) -> Optional[dict]:
+        """Read a provider ruleset for the testrun, through a cache of parsed rulesets.
+
+        The cache is keyed by the ETCD revision of the ruleset, and a ruleset that has been
+        modified at a later revision than the cached one is read again. Rulesets are
+        modified in place by JSONTas and the providers, so every caller gets a copy.
+
+        :param name: Name of the provider, 'iut', 'log-area' or 'execution-space'.
+        :return: Provider JSON or None.
+        """
+        path = self.testrun.join(f"provider/{name}")
+        self.__watch()
+        with self.__lock:
+            watching = self.__cancel
+            cached = self.__cache.get(str(path))
+        if cached is not None:
+            return deepcopy(cached[1])
+        provider, revision = path.read_revision()
+        if not provider:
+            return None
+        ruleset = json.loads(provider, object_pairs_hook=OrderedDict)
+        with self.__lock:
+            # Do not cache the ruleset if it was modified while we were reading it, or if the
+            # watch stopped, and changes could have been missed, while we were reading it.
+            if (
+                watching is not None
+                and self.__cancel is watching
+                and revision >= self.__revisions.get(str(path), 0)
+            ):
+                self.__cache[str(path)] = (revision, deepcopy(ruleset))
+        return ruleset
 
     def is_configured(self) -> bool:
         """Check that there is a configuration for the given suite ID.
 
         :return: Whether or not a configuration exists for the suite ID.
         """
-        configuration = self.testrun.join("provider").read_all()
-        return bool(configuration)
+        return self.testrun.join("provider").exists_all()
 
     def wait_for_configuration(self) -> bool:
         """Wait for ProviderRegistry to become configured.
 
+        Watches the configuration of the suite ID and returns as soon as a provider has been
+        configured. If the configuration cannot be watched, the configuration is polled.
+
+        :return: Whether or not a configuration exists for the suite ID.
+        """
+        configuration = self.testrun.join("provider")
+        try:
+            events, cancel = configuration.watch_all()
+        except Exception:  # pylint:disable=broad-except
+            self.logger.warning("Could not watch the configuration, polling it instead")
+            return self.__poll_for_configuration()
+
+        configured = Event()
+
+        def wait_for_put() -> None:
+            for event in events:
+                key = event.get("kv", {}).get("key", b"").decode()
+                if event.get("type") != "DELETE" and key.startswith(f"{configuration}/"):
+                    configured.set()
+                    return
+
+        thread = Thread(target=wait_for_put, daemon=True)
+        thread.start()
+        try:
+            # Checked after starting the watch, so that no configuration is missed.
+            if self.is_configured():
+                return True
+            return configured.wait(self.etos.debug.default_wait_timeout)
+        finally:
+            cancel()
+
+    def __poll_for_configuration(self) -> bool:
+        """Poll for ProviderRegistry to become configured.
+
         :return: Whether or not a configuration exists for the suite ID.
         """
         generator = self.etos.utils.wait(self.is_configured)
@@ -97,10 +226,7 @@ class ProviderRegistry:
                 "Could not retrieve log area provider from database, testrun is not set."
             )
             return None
-        provider = self.testrun.join("provider/log-area").read()
-        if provider:
-            return json.loads(provider, object_pairs_hook=OrderedDict)
-        return None
+        return self.__provider("log-area")
 
     def get_iut_provider(self) -> Optional[dict]:
         """Get IUT provider for testrun from the ETOS Database.
@@ -110,10 +236,7 @@ class ProviderRegistry:
         if self.testrun is None:
             self.logger.error("Could not retrieve IUT provider from database, testrun is not set.")
             return None
-        provider = self.testrun.join("provider/iut").read()
-        if provider:
-            return json.loads(provider, object_pairs_hook=OrderedDict)
-        return None
+        return self.__provider("iut")
 
     def get_execution_space_provider(self) -> Optional[dict]:
         """Get execution space provider by name from the ETOS Database.
@@ -125,22 +248,17 @@ class ProviderRegistry:
                 "Could not retrieve execution space provider from database, testrun is not set."
             )
             return None
-        provider = self.testrun.join("provider/execution-space").read()
-        if provider:
-            return json.loads(provider, object_pairs_hook=OrderedDict)
-        return None
+        return self.__provider("execution-space")
 
     def execution_space_provider(self) -> Optional[ExecutionSpaceProvider]:
         """Get the execution space provider configured to suite ID.
 
         :return: Execution space provider object.
         """
-        provider_json = self.testrun.join("provider/execution-space").read()
+        provider_json = self.__provider("execution-space")
         if provider_json:
             provider = ExecutionSpaceProvider(
-                self.etos,
-                self.jsontas,
-                json.loads(provider_json, object_pairs_hook=OrderedDict).get("execution_space"),
+                self.etos, self.jsontas, provider_json.get("execution_space")
             )
             self.etos.config.get("PROVIDERS").append(provider)
             return provider
@@ -151,13 +269,9 @@ class ProviderRegistry:
 
         :return: IUT provider object.
         """
-        provider_json = self.testrun.join("provider/iut").read()
+        provider_json = self.__provider("iut")
         if provider_json:
-            provider = IutProvider(
-                self.etos,
-                self.jsontas,
-                json.loads(provider_json, object_pairs_hook=OrderedDict).get("iut"),
-            )
+            provider = IutProvider(self.etos, self.jsontas, provider_json.get("iut"))
             self.etos.config.get("PROVIDERS").append(provider)
             return provider
         return None
@@ -167,13 +281,9 @@ class ProviderRegistry:
 
         :return: Log area provider object.
         """
-        provider_json = self.testrun.join("provider/log-area").read()
+        provider_json = self.__provider("log-area")
         if provider_json:
-            provider = LogAreaProvider(
-                self.etos,
-                self.jsontas,
-                json.loads(provider_json, object_pairs_hook=OrderedDict).get("log"),
-            )
+            provider = LogAreaProvider(self.etos, self.jsontas, provider_json.get("log"))
             self.etos.config.get("PROVIDERS").append(provider)
             return provider
         return None
@@ -17,11 +17,17 @@
 
 import os
 import logging
+import time
+from multiprocessing import TimeoutError  # pylint:disable=redefined-builtin
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Optional
 from jsontas.jsontas import JsonTas
+from kubernetes.dynamic.exceptions import NotFoundError
+from opentelemetry import context as otel_context
 from opentelemetry import trace
 from pydantic import ValidationError
 from etos_lib.kubernetes.schemas import Environment as EnvironmentSchema
-from etos_lib.kubernetes.schemas import Provider as ProviderSchema
 from etos_lib.kubernetes import Kubernetes, Environment, Provider
 from etos_lib import ETOS
 from execution_space_provider import ExecutionSpaceProvider
@@ -34,6 +40,8 @@ from log_area_provider import LogAreaProvider
 from log_area_provider.exceptions import LogAreaCheckinFailed
 from log_area_provider.log_area import LogArea as LogAreaSpec
 from .otel_tracing import get_current_context
+from .provider_cache import ProviderCache
+from ..splitter.timings import record_released_sub_suite
 
 TRACER = trace.get_tracer(__name__)
 
@@ -42,6 +50,23 @@ class ReleaseError(Exception):
     """Error when releasing environment."""
 
 
+class ReleaseTimeout(Exception):
+    """Releases did not finish in time, so whether they succeeded or failed is unknown."""
+
+
+def provider_ruleset(provider_client: Provider, provider_id: str) -> dict:
+    """Get the ruleset of a provider by ID from Kubernetes.
+
+    Providers are cached by the process-wide provider cache, since the same providers
+    are used by every environment of a testrun.
+
+    :param provider_client: Kubernetes client for providers.
+    :param provider_id: ID of the provider to get.
+    :return: The provider ruleset, either a JSONTas or an external ruleset.
+    """
+    return ProviderCache.shared().get(provider_client, provider_id)
+
+
 class Releaser:
     """Releaser is a tool for releasing environments that have been checked out by ETOS."""
 
@@ -57,12 +82,7 @@ class Releaser:
 
     def provider(self, provider_id: str) -> dict:
         """Get a provider by ID from Kubernetes or a database."""
-        provider = self.provider_client.get(provider_id)
-        assert provider is not None, f"Could not find a provider with ID {provider_id!r}"
-        provider_model = ProviderSchema.model_validate(provider.to_dict())
-        if provider_model.spec.jsontas:
-            return provider_model.to_jsontas()
-        return provider_model.to_external()
+        return provider_ruleset(self.provider_client, provider_id)
 
     def run(self) -> None:
         """Run a release task for ETOS."""
@@ -268,23 +288,42 @@ class EnvironmentReleaser:
             )
             return
         etos.config.set("SUITE_ID", environment.spec.suite_id)
+        # Record the durations of the tests, if the sub suite has finished, before checking in.
+        record_released_sub_suite(etos, environment.spec.model_dump())
         tasks = [
             Iut(etos, environment),
             LogArea(etos, environment),
             Executor(etos, environment),
         ]
 
-        exceptions = []
-        for task in tasks:
-            self.logger.info("Running release task on %r", type(task).__name__)
-            try:
-                task.run()
-            except Exception as exception:  # pylint:disable=broad-exception-caught
-                self.logger.error("Task %r failed", type(task).__name__)
-                exceptions.append(exception)
+        # The release tasks are independent of each other, run them all at the same time so
+        # that the release takes as long as the slowest provider.
+        context = otel_context.get_current()
+        with ThreadPool(processes=len(tasks)) as thread_pool:
+            results = thread_pool.starmap(self._run_task, [(task, context) for task in tasks])
+        exceptions = [exception for exception in results if exception is not None]
         if exceptions:
             raise ReleaseError("Some or all release tasks failed")
 
+    def _run_task(self, task: Releaser, context: otel_context.Context) -> Optional[Exception]:
+        """Run a single release task.
+
+        :param task: The release task to run.
+        :param context: OpenTelemetry context to run the task in, so that its span is created
+                        as a child of the release span.
+        :return: The exception raised by the task, if any.
+        """
+        self.logger.info("Running release task on %r", type(task).__name__)
+        token = otel_context.attach(context)
+        try:
+            task.run()
+        except Exception as exception:  # pylint:disable=broad-exception-caught
+            self.logger.error("Task %r failed", type(task).__name__)
+            return exception
+        finally:
+            otel_context.detach(token)
+        return None
+
     def _run_with_span(self, environment_id: str):
         """Run the release with an attached span."""
         with trace.get_tracer(__name__).start_as_current_span(
@@ -299,3 +338,244 @@ class EnvironmentReleaser:
             self._run_with_span(environment_id)
         else:
             self._run(environment_id)
+
+
+class BatchReleaser:
+    """Release many environments, checked out by ETOS, at once.
+
+    Instead of releasing each environment by itself, the IUTs, log areas and executors of
+    all environments are grouped by their provider and testrun, and each provider is
+    requested once per testrun, identified by the suite ID of the testrun. External
+    providers get a single checkin carrying all of their items, JSONTas providers check
+    the items in one by one. Environments that lack a provider for any of their items are
+    logged and skipped.
+
+    Releases that have not finished at the deadline are left running, and are reported as
+    neither released nor failed, see :class:`ReleaseTimeout`.
+
+    The releaser can be configured with these environment variables:
+
+        - ETOS_RELEASE_CONCURRENCY: Number of providers to release at the same time (default 10).
+        - ETOS_RELEASE_TIMEOUT: Deadline, in seconds, for the whole release (default 3600).
+    """
+
+    logger = logging.getLogger(__name__)
+    lock = Lock()
+    # Kind of item and the field of the environment spec that it is stored in.
+    fields = {"iut": "iut", "log_area": "log_area", "execution_space": "executor"}
+    spans = {
+        "iut": "stop_iuts",
+        "log_area": "stop_log_area",
+        "execution_space": "stop_execution_space",
+    }
+
+    def __init__(self, concurrency: Optional[int] = None, timeout: Optional[int] = None) -> None:
+        """Initialize the batch releaser.
+
+        :param concurrency: Number of providers to release at the same time.
+        :param timeout: Deadline, in seconds, for the whole release.
+        """
+        self.concurrency = max(1, concurrency or int(os.getenv("ETOS_RELEASE_CONCURRENCY", "10")))
+        self.timeout = timeout or int(os.getenv("ETOS_RELEASE_TIMEOUT", "3600"))
+        self.etos = ETOS("", "", "")
+        self.kubernetes = Kubernetes()
+        self.provider_client = Provider(self.kubernetes)
+
+    def __get(self, client: Environment, environment_id: str):
+        """Get an environment from Kubernetes by ID, logging it if it cannot be found.
+
+        :param client: Kubernetes client for environments.
+        :param environment_id: Name of the environment to get.
+        :return: The environment resource or None if it could not be found.
+        """
+        try:
+            return client.get(environment_id)
+        except NotFoundError:
+            self.logger.error(
+                "Could not find Environment with id %r in Kubernetes. "
+                "Trying to release something that's already released?",
+                environment_id,
+            )
+            return None
+
+    def environments(
+        self, environment_ids: Optional[list[str]] = None, label_selector: Optional[str] = None
+    ) -> list[EnvironmentSchema]:
+        """Get environments from Kubernetes, by ID or with a single list request.
+
+        Environments requested by ID are fetched one by one, and only those. Environments
+        that cannot be found, e.g. because they have already been released, are logged and
+        skipped. Without IDs, all environments matching the label selector are listed.
+
+        :param environment_ids: Names of the environments to get.
+        :param label_selector: Label selector of the environments to get, if no IDs are given.
+        :return: The environments.
+        """
+        client = Environment(self.kubernetes)
+        if environment_ids is not None:
+            if not environment_ids:
+                return []
+            with ThreadPool(min(self.concurrency, len(environment_ids))) as thread_pool:
+                resources = thread_pool.map(
+                    lambda environment_id: self.__get(client, environment_id), environment_ids
+                )
+            found = [resource.to_dict() for resource in resources if resource is not None]
+        else:
+            response = client.client.get(  # type: ignore
+                namespace=client.namespace, label_selector=label_selector
+            )
+            found = [item.to_dict() for item in response.items]
+        environments = []
+        for environment in found:
+            try:
+                environments.append(EnvironmentSchema.model_validate(environment))
+            except ValidationError:
+                self.logger.exception(
+                    "The schema of Environment with id %r could not be validated",
+                    environment["metadata"]["name"],
+                )
+        return environments
+
+    def group(self, environments: list[EnvironmentSchema]) -> dict[tuple[str, str, str], list]:
+        """Group the IUTs, log areas and executors of environments by provider and testrun.
+
+        :param environments: Environments to group.
+        :return: Rulesets of the items to release, keyed by the kind of item, the provider ID
+                 and the suite ID of the testrun that checked them out.
+        """
+        groups: dict[tuple[str, str, str], list] = {}
+        for environment in environments:
+            rulesets = {
+                kind: getattr(environment.spec, field) for kind, field in self.fields.items()
+            }
+            missing = [
+                kind
+                for kind, ruleset in rulesets.items()
+                if not isinstance(ruleset, dict) or not ruleset.get("provider_id")
+            ]
+            if missing:
+                self.logger.error(
+                    "Environment %r has no provider for its %s, skipping it",
+                    environment.metadata.name,
+                    ", ".join(missing),
+                )
+                continue
+            for kind, ruleset in rulesets.items():
+                key = (kind, ruleset["provider_id"], environment.spec.suite_id)
+                groups.setdefault(key, []).append(ruleset)
+        return groups
+
+    def release(
+        self,
+        kind: str,
+        provider_id: str,
+        suite_id: str,
+        items: list,
+        context: otel_context.Context,
+    ) -> Optional[Exception]:
+        """Release all items that a testrun has checked out from a single provider.
+
+        :param kind: Kind of items, 'iut', 'log_area' or 'execution_space'.
+        :param provider_id: ID of the provider to release the items with.
+        :param suite_id: Suite ID of the testrun, sent to external providers as X-ETOS-ID.
+        :param items: Rulesets of the items to release.
+        :param context: OpenTelemetry context to create the release span in.
+        :return: The exception raised by the release, if any.
+        """
+        provider_class, spec = {
+            "iut": (IutProvider, IutSpec),
+            "log_area": (LogAreaProvider, LogAreaSpec),
+            "execution_space": (ExecutionSpaceProvider, ExecutionSpace),
+        }[kind]
+        with TRACER.start_as_current_span(
+            self.spans[kind], kind=trace.SpanKind.CLIENT, context=context
+        ) as span:
+            try:
+                ruleset = provider_ruleset(self.provider_client, provider_id)
+                # Providers read the identifier of the testrun from the ETOS configuration,
+                # which is shared by all groups, when they are created.
+                with self.lock:
+                    self.etos.config.set("SUITE_ID", suite_id)
+                    provider = provider_class(self.etos, JsonTas(), ruleset)
+                self.logger.info(
+                    "Releasing %d %s of testrun %r with provider %r",
+                    len(items),
+                    kind,
+                    suite_id,
+                    provider_id,
+                )
+                if ruleset.get("type", "jsontas") == "external":
+                    provider.checkin([spec(**item) for item in items])
+                else:
+                    for item in items:
+                        provider.checkin(spec(**item))
+            except Exception as exception:  # pylint:disable=broad-exception-caught
+                self.logger.exception("Failed to release %s with provider %r", kind, provider_id)
+                span.record_exception(exception)
+                span.set_status(trace.Status(trace.StatusCode.ERROR))
+                return exception
+        return None
+
+    def run(
+        self, environment_ids: Optional[list[str]] = None, label_selector: Optional[str] = None
+    ) -> None:
+        """Release environments by ID or label selector.
+
+        :param environment_ids: Names of the environments to release.
+        :param label_selector: Label selector of the environments to release.
+        """
+        with TRACER.start_as_current_span("release_environments", context=get_current_context()):
+            environments = self.environments(environment_ids, label_selector)
+            self.logger.info("Releasing %d environments", len(environments))
+            # The checkin of the external providers retries until these timeouts.
+            for timeout in (
+                "WAIT_FOR_IUT_TIMEOUT",
+                "WAIT_FOR_LOG_AREA_TIMEOUT",
+                "WAIT_FOR_EXECUTION_SPACE_TIMEOUT",
+            ):
+                self.etos.config.set(timeout, self.timeout)
+            if environments:
+                # Record the durations of the tests, if the sub suites have finished, before
+                # checking in, like the environment releaser does.
+                with ThreadPool(min(self.concurrency, len(environments))) as thread_pool:
+                    thread_pool.starmap(
+                        record_released_sub_suite,
+                        [
+                            (self.etos, environment.spec.model_dump())
+                            for environment in environments
+                        ],
+                    )
+            groups = self.group(environments)
+            if not groups:
+                return
+            context = otel_context.get_current()
+            thread_pool = ThreadPool(processes=min(self.concurrency, len(groups)))
+            results = {
+                key: thread_pool.apply_async(self.release, (*key, items, context))
+                for key, items in groups.items()
+            }
+            # Releases still running at the deadline cannot be interrupted, and are abandoned.
+            # The threads of the pool are daemon threads, so they do not keep the process
+            # alive, and the outcome of these releases is reported as unknown.
+            thread_pool.close()
+            deadline = time.time() + self.timeout
+            exceptions = []
+            unfinished = []
+            for key, result in results.items():
+                try:
+                    exception = result.get(max(0.0, deadline - time.time()))
+                except TimeoutError:
+                    unfinished.append(key)
+                    continue
+                if exception is not None:
+                    exceptions.append(exception)
+            if exceptions:
+                raise ReleaseError("Some or all release tasks failed")
+            if unfinished:
+                raise ReleaseTimeout(
+                    f"Releases did not finish within {self.timeout}s, their outcome is unknown: "
+                    + ", ".join(
+                        f"{kind} with provider {provider_id!r} of testrun {suite_id!r}"
+                        for kind, provider_id, suite_id in unfinished
+                    )
+                )
@@ -15,57 +15,94 @@
 # limitations under the License.
 """ETOS Environment Provider splitter module."""
 
-import time
-from copy import deepcopy
-from typing import Any, Iterable, Iterator
+import heapq
+import logging
+from typing import Optional
 
 from etos_lib import ETOS
 from etos_lib.kubernetes.schemas.environment_request import Splitter as SplitterSchema
 
 from iut_provider.iut import Iut
 
+from .strategies import STRATEGIES, round_robin
+from .timings import TimingStore
+
 
 class Splitter:
     """Environment provider test suite splitter."""
 
-    def __init__(self, etos: ETOS, config: SplitterSchema) -> None:
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        etos: ETOS,
+        config: SplitterSchema,
+        strategy: Optional[str] = None,
+        scope: Optional[str] = None,
+    ) -> None:
         """Initialize with etos library and splitter ruleset.
 
         :param etos: ETOS library instance.
         :param ruleset: JSONTas ruleset for handling splitter algorithms.
+        :param strategy: Name of the splitter strategy to use. Defaults to the SPLITTER
+                         configuration or 'round-robin'.
+        :param scope: ID of the IUT provider, to get historical test durations for.
         """
         self.etos = etos
         self.config = config
         self.unsplit_tests = self.config.tests
+        self.strategy = strategy or self.etos.config.get("SPLITTER") or "round-robin"
+        if self.strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown splitter strategy {self.strategy!r}, "
+                f"available strategies are {sorted(STRATEGIES)}"
+            )
+        self.timings = TimingStore(self.etos.config.get("TEST_TIMINGS_FILE"), scope)
 
     @staticmethod
-    def _iterator(iterable: Iterable) -> Iterator[Any]:
-        """Create a generator from iterable."""
-        yield from iterable
-
-    def splitter(self, test_suite: dict) -> None:
+    def splitter(test_suite: dict) -> None:
         """Iterate through all IUTs and assign a recipe in a round-robin fashion.
 
         :param test_suite: Test suite to iterate IUTs for.
         """
-        test_list = self._iterator(deepcopy(test_suite.get("unsplit_recipes")))
-        while True:
-            try:
-                for _, iut_dict in test_suite.get("iuts").items():
-                    test = next(test_list)
-                    iut_dict["recipes"].append(test)
-                    test_suite["unsplit_recipes"].remove(test)
-            except StopIteration:
-                break
+        round_robin(test_suite, None)
 
     def split(self, test_suite: dict) -> None:
-        """Will only call the splitter of this object.
-
-        In the future this might be where other splitter algorithms are evaluated.
+        """Split the tests of a test suite over its IUTs using the configured strategy.
 
         :param test_suite: Test suite to attach tests to.
         """
-        self.splitter(test_suite)
+        self.logger.debug("Splitting tests using the %r strategy", self.strategy)
+        STRATEGIES[self.strategy](test_suite, self.timings)
+
+    @staticmethod
+    def apportion(weights: list[int], amount: int) -> list[int]:
+        """Apportion an amount of IUTs over test runners, weighted by their number of tests.
+
+        Uses the D'Hondt (highest averages) method, seeded with one IUT per test runner, so
+        that every test runner gets at least one IUT as long as there are IUTs left and
+        never more IUTs than it has tests. The result always sums to the number of IUTs
+        that can be used and ties are resolved by test runner order, which makes the
+        apportionment deterministic.
+
+        :param weights: Number of tests for each test runner.
+        :param amount: Number of IUTs to apportion.
+        :return: Number of IUTs for each test runner, in the same order as weights.
+        """
+        seats = [0] * len(weights)
+        target = min(amount, sum(weights))
+        # When there are fewer IUTs than test runners, the first test runners get one each.
+        seeded = [index for index, weight in enumerate(weights) if weight > 0][:target]
+        for index in seeded:
+            seats[index] = 1
+        heap = [(-weights[index] / 2, index) for index in seeded if weights[index] > 1]
+        heapq.heapify(heap)
+        for _ in range(target - len(seeded)):
+            _, index = heapq.heappop(heap)
+            seats[index] += 1
+            if seats[index] < weights[index]:
+                heapq.heappush(heap, (-weights[index] / (seats[index] + 1), index))
+        return seats
 
     def assign_iuts(self, test_runners: dict, iuts: list[Iut]) -> list[Iut]:
         """Assign IUTs to test runners.
@@ -74,34 +111,17 @@ class Splitter:
         :param iuts: List of IUTs that need test runners.
         :return: Any unassigned IUT.
         """
-        iuts = deepcopy(iuts)
-        for test_runner in test_runners.values():
-            test_runner["iuts"] = {}
-            test_runner["percentage_of_tests"] = len(
-                test_runner.get("unsplit_recipes")
-            ) / self.etos.config.get("TOTAL_TEST_COUNT")
-            number_of_iuts = round(len(iuts) * test_runner["percentage_of_tests"])
-            if not number_of_iuts:
-                number_of_iuts = 1
-
-            number_of_tests = len(test_runner.get("unsplit_recipes"))
-            number_of_iuts = number_of_tests if number_of_tests < number_of_iuts else number_of_iuts
-            test_runner["number_of_iuts"] = number_of_iuts
+        weights = [len(test_runner.get("unsplit_recipes")) for test_runner in test_runners.values()]
+        total = sum(weights)
+        seats = self.apportion(weights, len(iuts))
 
-        while True:
-            time.sleep(0.01)
-            try:
-                for test_runner in test_runners.values():
-                    if len(test_runner.get("iuts")) >= test_runner["number_of_iuts"]:
-                        continue
-                    test_runner["iuts"][iuts.pop(0)] = {"recipes": [], "executor": None}
-                unfinished = [
-                    test_runner
-                    for test_runner in test_runners.values()
-                    if len(test_runner.get("iuts")) != test_runner["number_of_iuts"]
-                ]
-                if not unfinished:
-                    break
-            except IndexError:
-                break
-        return iuts
+        start = 0
+        for test_runner, weight, number_of_iuts in zip(test_runners.values(), weights, seats):
+            test_runner["percentage_of_tests"] = weight / total if total else 0
+            test_runner["number_of_iuts"] = number_of_iuts
+            test_runner["iuts"] = {
+                iut: {"recipes": [], "executor": None}
+                for iut in iuts[start : start + number_of_iuts]
+            }
+            start += number_of_iuts
+        return iuts[start:]
@@ -0,0 +1,103 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Splitter strategies for distributing tests over the IUTs of a test runner.
+
+A strategy is a function that takes a test suite, with 'iuts' and 'unsplit_recipes', and a
+timing store, and moves all unsplit recipes into the 'recipes' of the IUTs. Strategies are
+registered by name with :func:`register` and selected with the 'splitter' key in the
+dataset or the ETOS_SPLITTER environment variable.
+"""
+
+import heapq
+from typing import Any, Callable
+
+from .timings import TimingStore
+
+Strategy = Callable[[dict, TimingStore], None]
+STRATEGIES: dict[str, Strategy] = {}
+
+
+def register(name: str) -> Callable[[Strategy], Strategy]:
+    """Register a splitter strategy by name.
+
+    :param name: Name of the strategy, used to select it.
+    :return: Decorator registering the strategy.
+    """
+
+    def decorator(strategy: Strategy) -> Strategy:
+        STRATEGIES[name] = strategy
+        return strategy
+
+    return decorator
+
+
+def test_case_id(test: Any) -> str:
+    """Get the test case ID of a test, either a Test model or a recipe dictionary.
+
+    :param test: Test to get test case ID from.
+    :return: The test case ID.
+    """
+    if isinstance(test, dict):
+        return test["testCase"]["id"]
+    return test.testCase.id
+
+
+@register("round-robin")
+def round_robin(test_suite: dict, _: TimingStore) -> None:
+    """Iterate through all IUTs and assign a recipe in a round-robin fashion.
+
+    The round-robin is done by striding over the recipes, so that IUT number N of M gets
+    recipes N, N+M, N+2M and so on, and the unsplit recipes are cleared once all have been
+    assigned.
+
+    :param test_suite: Test suite to iterate IUTs for.
+    """
+    iuts = list(test_suite.get("iuts").values())
+    if not iuts:
+        return
+    recipes = test_suite.get("unsplit_recipes")
+    for index, iut_dict in enumerate(iuts):
+        iut_dict["recipes"].extend(recipes[index :: len(iuts)])
+    recipes.clear()
+
+
+@register("lpt")
+def longest_processing_time(test_suite: dict, timings: TimingStore) -> None:
+    """Balance the expected duration of each IUT using longest processing time first.
+
+    Recipes are sorted by their expected duration, longest first, and each recipe is
+    assigned to the IUT with the shortest expected duration so far. The recipes of each IUT
+    are kept in the same order as in the test suite.
+
+    :param test_suite: Test suite to iterate IUTs for.
+    :param timings: Store of historical test durations.
+    """
+    iuts = list(test_suite.get("iuts").values())
+    if not iuts:
+        return
+    recipes = test_suite.get("unsplit_recipes")
+    durations = timings.durations([test_case_id(recipe) for recipe in recipes])
+    order = sorted(range(len(recipes)), key=lambda index: (-durations[index], index))
+
+    loads = [(0.0, index) for index in range(len(iuts))]
+    assigned: list[list[int]] = [[] for _ in iuts]
+    for recipe in order:
+        load, iut = heapq.heappop(loads)
+        assigned[iut].append(recipe)
+        heapq.heappush(loads, (load + durations[recipe], iut))
+    for iut_dict, indices in zip(iuts, assigned):
+        iut_dict["recipes"].extend(recipes[index] for index in sorted(indices))
+    recipes.clear()
@@ -0,0 +1,299 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Historical test timings used by duration-aware splitter strategies."""
+
+import json
+import logging
+import os
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Optional
+
+from etos_lib import ETOS
+
+from environment_provider.lib.database import ETCDPath
+from environment_provider.lib.graphql import request_sub_suite_started, request_test_suite_finished
+
+# ETCD limits the number of operations in a single transaction, 128 by default.
+MAX_TRANSACTION_SIZE = 128
+
+# Locks of the JSON files of timing stores, by path. Stores are created per sub suite, so
+# the locks are shared by all stores in the process.
+_FILE_LOCKS: dict[Path, Lock] = {}
+_FILE_LOCKS_LOCK = Lock()
+
+
+def _file_lock(path: Path) -> Lock:
+    """Get the lock of a JSON file of timing stores.
+
+    :param path: Path to the JSON file.
+    :return: The lock that all timing stores in the process use for the file.
+    """
+    with _FILE_LOCKS_LOCK:
+        return _FILE_LOCKS.setdefault(path.resolve(), Lock())
+
+
+class TimingStore:
+    """Store of historical test durations, in seconds, keyed by test case ID.
+
+    Durations are kept in ETCD under '/environment/timings/<scope>/<testCase.id>' unless
+    a JSON file is given, in which case the file is a JSON object mapping test case IDs
+    to durations. The scope is the ID of the IUT provider, since the same test can take
+    very different time on different kinds of IUTs.
+    Each new duration is folded into an exponential moving average so that a single slow
+    run does not dominate the expected duration of a test.
+
+    Durations are recorded when the environment of a sub suite is released, from the time
+    between its test suite started and finished events, see :meth:`record_sub_suite`, and
+    only the durations of the tests being split are read.
+    """
+
+    logger = logging.getLogger(__name__)
+    smoothing = 0.5
+
+    def __init__(self, path: Optional[str] = None, scope: Optional[str] = None) -> None:
+        """Initialize timing store.
+
+        :param path: Optional path to a JSON file to use instead of ETCD.
+        :param scope: ID of the IUT provider that the tests are executed on.
+        """
+        self.path = Path(path) if path else None
+        self.scope = scope or "default"
+        self.database = None if self.path else ETCDPath("/environment/timings").join(self.scope)
+        # Durations that have been read, None for test cases that have never been timed.
+        self.__timings: dict[str, Optional[float]] = {}
+        self.__lock = Lock()
+
+    @staticmethod
+    def unrecorded(testrun: ETCDPath, test_suite_started_id: str, environment_id: str) -> ETCDPath:
+        """Get the path to the flag marking a sub suite whose durations are not yet recorded.
+
+        The flag is written when the environment of the sub suite is published and removed
+        when its durations are recorded, so that they are only recorded once.
+
+        :param testrun: Path to the testrun in ETCD.
+        :param test_suite_started_id: ID of the main suite that the sub suite belongs to.
+        :param environment_id: ID of the environment of the sub suite.
+        :return: Path to the flag in ETCD.
+        """
+        return testrun.join(f"suite/{test_suite_started_id}/subsuite/{environment_id}/unrecorded")
+
+    def load(self, test_case_ids: list[str]) -> dict[str, float]:
+        """Load the durations of test cases from the store.
+
+        :param test_case_ids: IDs of the test cases to load durations for.
+        :return: Durations keyed by test case ID, for the test cases that have been timed.
+        """
+        if not test_case_ids:
+            return {}
+        if self.path is not None:
+            timings = self.__read_file()
+            return {key: timings[key] for key in test_case_ids if key in timings}
+        paths = [self.database.join(test_case_id) for test_case_id in test_case_ids]
+        # The reads are bounded by the connection pool of the database.
+        with ThreadPool(min(len(paths), 10)) as thread_pool:
+            values = thread_pool.map(ETCDPath.read, paths)
+        return {
+            test_case_id: float(value)
+            for test_case_id, value in zip(test_case_ids, values)
+            if value is not None
+        }
+
+    def __read_file(self) -> dict[str, float]:
+        """Read all durations from the JSON file of the store.
+
+        :return: Durations keyed by test case ID.
+        """
+        if not self.path.exists():
+            return {}
+        with self.path.open(encoding="UTF-8") as timings_file:
+            return {key: float(value) for key, value in json.load(timings_file).items()}
+
+    def __write_file(self, timings: dict[str, float]) -> None:
+        """Replace the JSON file of the store, so that readers never see a partial file.
+
+        :param timings: Durations keyed by test case ID.
+        """
+        with NamedTemporaryFile(
+            "w", encoding="UTF-8", dir=self.path.parent, prefix=f".{self.path.name}.", delete=False
+        ) as timings_file:
+            json.dump(timings, timings_file)
+        try:
+            os.replace(timings_file.name, self.path)
+        except OSError:
+            os.unlink(timings_file.name)
+            raise
+
+    def __lookup(self, test_case_ids: list[str]) -> list[Optional[float]]:
+        """Look up durations, loading the test cases that have not been read before.
+
+        :param test_case_ids: IDs of the test cases to look up.
+        :return: Durations, or None, in the same order as the test case IDs.
+        """
+        with self.__lock:
+            missing = list(dict.fromkeys(key for key in test_case_ids if key not in self.__timings))
+        if missing:
+            loaded = self.load(missing)
+            with self.__lock:
+                for test_case_id in missing:
+                    self.__timings.setdefault(test_case_id, loaded.get(test_case_id))
+        with self.__lock:
+            return [self.__timings[test_case_id] for test_case_id in test_case_ids]
+
+    def duration(self, test_case_id: str) -> Optional[float]:
+        """Get the expected duration of a test case.
+
+        :param test_case_id: ID of the test case to get duration for.
+        :return: Duration in seconds or None if the test case has never been timed.
+        """
+        return self.__lookup([test_case_id])[0]
+
+    def durations(self, test_case_ids: list[str]) -> list[float]:
+        """Get the expected durations of test cases.
+
+        Test cases that have never been timed are expected to take the average duration
+        of the test cases that have, or 1 second if none of them have been timed.
+
+        :param test_case_ids: IDs of the test cases to get durations for.
+        :return: Durations in seconds, in the same order as the test case IDs.
+        """
+        if not test_case_ids:
+            return []
+        durations = self.__lookup(test_case_ids)
+        known = [duration for duration in durations if duration is not None]
+        default = sum(known) / len(known) if known else 1.0
+        return [default if duration is None else duration for duration in durations]
+
+    def record(self, test_case_id: str, duration: float) -> None:
+        """Record a new duration for a test case.
+
+        :param test_case_id: ID of the test case that was timed.
+        :param duration: Duration, in seconds, of the test case.
+        """
+        self.record_all({test_case_id: duration})
+
+    def record_all(self, durations: dict[str, float]) -> None:
+        """Record new durations for test cases, with as few writes as possible.
+
+        :param durations: Durations, in seconds, keyed by the ID of the test case timed.
+        """
+        previous = self.__lookup(list(durations))
+        averages = {}
+        for (test_case_id, duration), average in zip(durations.items(), previous):
+            if average is not None:
+                duration = self.smoothing * duration + (1 - self.smoothing) * average
+            averages[test_case_id] = duration
+        with self.__lock:
+            self.__timings.update(averages)
+        if self.path is not None:
+            with _file_lock(self.path):
+                timings = self.__read_file()
+                timings.update(averages)
+                self.__write_file(timings)
+            return
+        items = list(averages.items())
+        for start in range(0, len(items), MAX_TRANSACTION_SIZE):
+            with self.database.transaction() as batch:
+                for test_case_id, duration in items[start : start + MAX_TRANSACTION_SIZE]:
+                    batch.join(test_case_id).write(duration)
+
+    def record_sub_suite(
+        self, unrecorded: ETCDPath, test_case_ids: list[str], duration: float
+    ) -> None:
+        """Record the durations of the tests of a sub suite that has finished.
+
+        The duration of the sub suite is divided over its tests in proportion to their
+        expected durations, so that the relative durations of the tests are kept. The
+        durations are only recorded by the caller that removes the unrecorded flag of the
+        sub suite, so that they are recorded once, even if its environment is released
+        several times at once.
+
+        :param unrecorded: Path to the unrecorded flag of the sub suite, see
+                           :meth:`unrecorded`.
+        :param test_case_ids: IDs of the test cases of the sub suite.
+        :param duration: Duration, in seconds, of the sub suite.
+        """
+        if not test_case_ids or not unrecorded.delete_if_exists():
+            return
+        expected = self.durations(test_case_ids)
+        total = sum(expected)
+        self.record_all(
+            {
+                test_case_id: duration * expectation / total
+                for test_case_id, expectation in zip(test_case_ids, expected)
+            }
+        )
+
+
+def sub_suite_duration(etos: ETOS, environment_id: str) -> Optional[float]:
+    """Get the duration of a sub suite from its test suite started and finished events.
+
+    :param etos: ETOS library instance.
+    :param environment_id: ID of the environment defined event of the sub suite.
+    :return: Duration in seconds, or None if the sub suite has not started and finished.
+    """
+    started = request_sub_suite_started(etos, environment_id)
+    if started is None:
+        return None
+    finished = request_test_suite_finished(etos, started["meta"]["id"])
+    if finished is None:
+        return None
+    # Eiffel event times are in milliseconds since the epoch.
+    return (int(finished["meta"]["time"]) - int(started["meta"]["time"])) / 1000
+
+
+def record_released_sub_suite(etos: ETOS, sub_suite: dict) -> None:
+    """Record the test durations of a sub suite whose environment is being released.
+
+    The duration is taken from the test suite started and finished events of the sub suite,
+    so that neither provisioning nor the time until the release is included. Sub suites
+    without a finished event, e.g. those released at the end of a testrun that was
+    aborted, are not recorded.
+
+    Durations are recorded in the JSON file given by ETOS_TEST_TIMINGS_FILE, like the
+    splitter reads them, or in ETCD if it is not set. Failures are logged, never raised,
+    since they must not stop the release.
+
+    :param etos: ETOS library instance.
+    :param sub_suite: The sub suite, or the spec of its Environment resource.
+    """
+    try:
+        environment_id = sub_suite["executor"]["instructions"]["environment"]["ENVIRONMENT_ID"]
+        unrecorded = TimingStore.unrecorded(
+            ETCDPath(f"/testrun/{sub_suite['suite_id']}"),
+            sub_suite["test_suite_started_id"],
+            environment_id,
+        )
+        if unrecorded.read() is None:
+            return
+        duration = sub_suite_duration(etos, environment_id)
+        if duration is None:
+            TimingStore.logger.info(
+                "Sub suite %r has not finished, not recording its test durations",
+                sub_suite.get("name"),
+            )
+            return
+        test_case_ids = [recipe["testCase"]["id"] for recipe in sub_suite.get("recipes", [])]
+        store = TimingStore(
+            os.getenv("ETOS_TEST_TIMINGS_FILE"), sub_suite["iut"].get("provider_id")
+        )
+        store.record_sub_suite(unrecorded, test_case_ids, duration)
+    except Exception:  # pylint:disable=broad-exception-caught
+        TimingStore.logger.exception(
+            "Failed to record the test durations of sub suite %r", sub_suite.get("name")
+        )
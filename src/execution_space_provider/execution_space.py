@@ -15,53 +15,10 @@
 # limitations under the License.
 """Execution space data module."""
 
-from typing import Any
+from environment_provider.lib.data_object import DataObject
 
 
-class ExecutionSpace:
+class ExecutionSpace(DataObject):
     """Execution space data object."""
 
-    _execution_space_dictionary = None
-
-    def __init__(self, **execution_space: dict) -> None:
-        """Take a dictionary as input and setattr on instance.
-
-        :param execution_space: Dictionary to set attributes from.
-        """
-        self._execution_space_dictionary = execution_space
-        for key, value in execution_space.items():
-            setattr(self, key, value)
-
-    def __setattr__(self, name: str, value: Any) -> None:
-        """Set execution space parameters to dict and object.
-
-        :param name: Name of parameter to set.
-        :param value: Value of parameter.
-        """
-        if self._execution_space_dictionary is not None:
-            self._execution_space_dictionary[name] = value
-        super().__setattr__(name, value)
-
-    def update(self, **dictionary: dict) -> None:
-        """Update execution space dictionary with new data.
-
-        :param dictionary: Dictionary to update attributes from.
-        """
-        self._execution_space_dictionary.update(**dictionary)
-        for key, value in dictionary.items():
-            setattr(self, key, value)
-
-    @property
-    def as_dict(self) -> dict:
-        """Represent execution space as dictionary.
-
-        :return: Execution space dictionary.
-        """
-        return self._execution_space_dictionary
-
-    def __repr__(self) -> str:
-        """Represent execution space as string.
-
-        :return: Execution space dictionary as string.
-        """
-        return repr(self._execution_space_dictionary)
+    __slots__ = ()
@@ -16,9 +16,15 @@
 """Execution space check in module."""
 
 import logging
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Optional
 
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..exceptions import ExecutionSpaceCheckinFailed
 from ..execution_space import ExecutionSpace
 
@@ -27,16 +33,31 @@ class Checkin:
     """Handle checking in execution spaces to an execution space provider."""
 
     logger = logging.getLogger("ExecutionSpaceProvider - Checkin")
+    lock = Lock()
 
-    def __init__(self, jsontas: JsonTas, checkin_ruleset: dict) -> None:
+    def __init__(self, jsontas: JsonTas, checkin_ruleset: dict, concurrency: int = 1) -> None:
         """Initialize execution space checkin handler.
 
         :param jsontas: JSONTas instance used to evaluate the ruleset.
         :param checkin_ruleset: JSONTas ruleset for checking in execution spaces.
+        :param concurrency: Number of execution spaces to check in at the same time.
         """
         self.checkin_ruleset = checkin_ruleset
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
+        self.concurrency = concurrency
+
+    def already_checked_in(self, execution_space: ExecutionSpace) -> bool:
+        """Check whether an execution space has already been checked in, warning if it has.
+
+        :param execution_space: Execution space to check.
+        :return: Whether or not the execution space has already been checked in.
+        """
+        checked_out = self.dataset.get("execution_spaces")
+        if isinstance(checked_out, ItemIndex) and checked_out.checked_in(execution_space):
+            self.logger.warning("Execution space %r has already been checked in.", execution_space)
+            return True
+        return False
 
     def checkin(self, execution_space: ExecutionSpace) -> None:
         """Check in a single execution space, returning it to the execution space provider.
@@ -51,6 +72,9 @@ class Checkin:
             self.logger.info("No defined checkin rule.")
             return
 
+        if self.already_checked_in(execution_space):
+            return
+
         self.logger.info("Checking in execution space %r", execution_space)
         self.dataset.add("execution_space", execution_space)
         verified = self.jsontas.run(self.checkin_ruleset)
@@ -61,11 +85,43 @@ class Checkin:
         except ValueError:
             pass
 
+    def run_checkin_ruleset(
+        self, execution_space: ExecutionSpace
+    ) -> Optional[ExecutionSpaceCheckinFailed]:
+        """Run the checkin ruleset for an execution space, on an overlay of the dataset.
+
+        :param execution_space: Execution space to checkin.
+        :return: The reason for the failure, if the checkin failed.
+        """
+        if self.already_checked_in(execution_space):
+            return None
+        self.logger.info("Checking in execution space %r", execution_space)
+        with self.lock:
+            dataset = OverlayDataset.over(self.dataset)
+        dataset.add("execution_space", execution_space)
+        if not JsonTas(dataset=dataset).run(self.checkin_ruleset):
+            return ExecutionSpaceCheckinFailed(f"Unable to checkin {execution_space}")
+        return None
+
     def checkin_all(self) -> None:
         """Checkin all checked out execution spaces."""
         self.logger.info("Checking in all checked out execution spaces.")
-        for execution_space in reversed(self.dataset.get("execution_spaces", [])):
+        execution_spaces = list(reversed(self.dataset.get("execution_spaces", [])))
+        if self.checkin_ruleset is None or self.concurrency <= 1 or len(execution_spaces) <= 1:
+            for execution_space in execution_spaces:
+                try:
+                    self.checkin(execution_space)
+                except ExecutionSpaceCheckinFailed as exception:
+                    self.logger.error("%r", exception)
+            return
+
+        with ThreadPool(min(self.concurrency, len(execution_spaces))) as thread_pool:
+            failures = thread_pool.map(self.run_checkin_ruleset, execution_spaces)
+        for execution_space, failure in zip(execution_spaces, failures):
+            if failure is not None:
+                self.logger.error("%r", failure)
+                continue
             try:
-                self.checkin(execution_space)
-            except ExecutionSpaceCheckinFailed as exception:
-                self.logger.error("%r", exception)
+                self.dataset.get("execution_spaces", []).remove(execution_space)
+            except ValueError:
+                pass
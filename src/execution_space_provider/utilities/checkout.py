@@ -17,9 +17,15 @@
 
 import logging
 from copy import deepcopy
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Union
 
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..exceptions import ExecutionSpaceCheckoutFailed
 from ..execution_space import ExecutionSpace
 
@@ -28,16 +34,30 @@ class Checkout:  # pylint:disable=too-few-public-methods
     """Handle checking out execution spaces from an execution space provider."""
 
     logger = logging.getLogger("ExecutionSpaceProvider - Checkout")
+    lock = Lock()
 
-    def __init__(self, jsontas: JsonTas, checkout_ruleset: dict) -> None:
+    def __init__(self, jsontas: JsonTas, checkout_ruleset: dict, concurrency: int = 1) -> None:
         """Initialize execution space checkout handler.
 
         :param jsontas: JSONTas instance used to evaluate the ruleset.
         :param checkout_ruleset: JSONTas ruleset for checking out execution spaces.
+        :param concurrency: Number of execution spaces to check out at the same time.
         """
         self.checkout_ruleset = checkout_ruleset
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
+        self.concurrency = concurrency
+
+    def run_checkout_ruleset(self, execution_space: ExecutionSpace) -> Union[dict, str]:
+        """Run the checkout ruleset for an execution space, on an overlay of the dataset.
+
+        :param execution_space: Execution space to checkout.
+        :return: The response of the checkout ruleset.
+        """
+        with self.lock:
+            dataset = OverlayDataset.over(self.dataset)
+        dataset.add("execution_space", execution_space)
+        return JsonTas(dataset=dataset).run(self.checkout_ruleset)
 
     def checkout(self, execution_spaces: list[ExecutionSpace]) -> list[ExecutionSpace]:
         """Checkout a number of execution spaces from an execution space provider.
@@ -51,21 +71,36 @@ class Checkout:  # pylint:disable=too-few-public-methods
         # Definition does not have the 'checkout' key. Just return execution spaces provided.
         if not self.checkout_ruleset:
             self.logger.info("No defined checkout rule.")
-            self.dataset.add("execution_spaces", execution_spaces)
+            self.dataset.add("execution_spaces", ItemIndex(execution_spaces))
             return execution_spaces
 
+        responses = {}
+        if self.concurrency > 1 and len(execution_spaces) > 1:
+            self.logger.debug(
+                "Checking out %d execution spaces, %d at a time.",
+                len(execution_spaces),
+                self.concurrency,
+            )
+            with ThreadPool(min(self.concurrency, len(execution_spaces))) as thread_pool:
+                responses = dict(
+                    enumerate(thread_pool.map(self.run_checkout_ruleset, execution_spaces))
+                )
+
         fail_message = ""
-        for execution_space in reversed(execution_spaces):
-            self.logger.debug("Checking out execution space %r.", execution_space)
-            self.dataset.add("execution_space", execution_space)
-            response = self.jsontas.run(self.checkout_ruleset)
+        for index, execution_space in reversed(list(enumerate(execution_spaces))):
+            if index in responses:
+                response = responses[index]
+            else:
+                self.logger.debug("Checking out execution space %r.", execution_space)
+                self.dataset.add("execution_space", execution_space)
+                response = self.jsontas.run(self.checkout_ruleset)
             if isinstance(response, dict):
                 execution_space.update(**response)
             else:
                 fail_message = response
                 self.logger.error("Unable to checkout %r.", execution_space)
-                execution_spaces.remove(execution_space)
-        self.dataset.add("execution_spaces", deepcopy(execution_spaces))
+                del execution_spaces[index]
+        self.dataset.add("execution_spaces", ItemIndex(deepcopy(execution_spaces)))
         if not execution_spaces:
             raise ExecutionSpaceCheckoutFailed(
                 f"All ExecutionSpaces failed checkout. {fail_message}"
@@ -28,13 +28,15 @@ from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapProp
 
 import requests
 from etos_lib import ETOS
-from etos_lib.lib.http import Http
 from jsontas.jsontas import JsonTas
 from packageurl import PackageURL
 from requests.exceptions import HTTPError, ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout as RequestsTimeout
 from urllib3.util import Retry
 
+from environment_provider.lib.data_object import ItemIndex
 from environment_provider.lib.encrypt import encrypt
+from environment_provider.lib.provider_session import ProviderSession, StatusProtocol
 
 from ..exceptions import (
     ExecutionSpaceCheckinFailed,
@@ -60,6 +62,10 @@ class ExternalProvider:
             "host": "host to stop endpoint"
         }
     }
+
+    Providers that support long-polling of their status can advertise it with
+    `"protocol": "long-poll"` in the status part of the ruleset, see
+    :obj:`environment_provider.lib.provider_session.StatusProtocol`.
     """
 
     logger = logging.getLogger("External ExecutionSpaceProvider")
@@ -78,7 +84,9 @@ class ExternalProvider:
         self.id = self.ruleset.get("id")  # pylint:disable=invalid-name
         self.context = self.etos.config.get("environment_provider_context")
         self.identifier = self.etos.config.get("SUITE_ID")
-        self.http = Http(
+        self.http = ProviderSession.shared(
+            "execution_space",
+            self.id,
             retry=Retry(
                 total=None,
                 read=0,
@@ -88,7 +96,7 @@ class ExternalProvider:
                 other=0,
                 allowed_methods=["POST", "GET"],
                 status_forcelist=Retry.RETRY_AFTER_STATUS_CODES,  # 413, 429, 503
-            )
+            ),
         )
         self.logger.info("Initialized external execution space provider %r", self.id)
 
@@ -143,9 +151,10 @@ class ExternalProvider:
             else:
                 time.sleep(2)
             try:
-                response = requests.post(host, json=execution_spaces, headers=headers)
+                response = self.http.post(host, json=execution_spaces, headers=headers)
                 span.set_attribute(SpanAttributes.HTTP_RESPONSE_STATUS_CODE, response.status_code)
                 if response.status_code == requests.codes["no_content"]:
+                    self._checked_in(execution_space)
                     return
                 response = response.json()
                 if isinstance(response, str):
@@ -173,13 +182,27 @@ class ExternalProvider:
         self._record_exception(exc)
         raise exc
 
+    def _checked_in(self, execution_spaces: list[ExecutionSpace]) -> None:
+        """Remove checked in execution spaces from the index of checked out execution spaces.
+
+        :param execution_spaces: Execution spaces that were checked in.
+        """
+        checked_out = self.dataset.get("execution_spaces")
+        if not isinstance(checked_out, ItemIndex):
+            return
+        for execution_space in execution_spaces:
+            try:
+                checked_out.remove(execution_space)
+            except ValueError:
+                pass
+
     def checkin_all(self) -> None:
         """Check in all execution spaces.
 
         This method does the same as 'checkin'. It exists for API consistency.
         """
         self.logger.debug("Checking in all checked out execution spaces")
-        self.checkin(self.dataset.get("execution_spaces", []))
+        self.checkin(list(self.dataset.get("execution_spaces", [])))
 
     def start(self, minimum_amount: int, maximum_amount: int) -> str:
         """Send a start request to an external execution space provider.
@@ -249,6 +272,7 @@ class ExternalProvider:
                 host,
                 json=data,
                 headers=headers,
+                retry=True,
             )
             span.set_attribute(SpanAttributes.HTTP_RESPONSE_STATUS_CODE, response.status_code)
             response.raise_for_status()
@@ -271,30 +295,33 @@ class ExternalProvider:
 
         host = self.ruleset.get("status", {}).get("host")
         timeout = time.time() + self.etos.config.get("WAIT_FOR_EXECUTION_SPACE_TIMEOUT")
-        params = {"id": provider_id}
+        protocol = StatusProtocol.from_ruleset(self.ruleset)
+        params = protocol.params(provider_id, timeout - time.time())
         response = None
-        first_iteration = True
         headers = {"X-ETOS-ID": self.identifier}
         TraceContextTextMapPropagator().inject(headers)
         span = opentelemetry.trace.get_current_span()
         span.set_attribute("http.request.params", json.dumps(params))
         span.set_attribute(SpanAttributes.HTTP_HOST, host)
+        sent = None
         while time.time() < timeout:
-            if first_iteration:
-                first_iteration = False
-            else:
-                time.sleep(2)
+            protocol.pace(sent)
+            sent = time.time()
             try:
-                response = requests.get(
+                response = self.http.get(
                     host,
-                    params=params,
+                    params=protocol.params(provider_id, timeout - time.time()),
                     headers=headers,
+                    timeout=protocol.timeout,
                 )
                 self.check_error(response)
                 response = response.json()
             except ConnectionError:
                 self.logger.exception("Error connecting to %r", host)
                 continue
+            except RequestsTimeout:
+                self.logger.warning("Status request to %r timed out", host)
+                continue
 
             if response.get("status") == "FAILED":
                 exc = ExecutionSpaceCheckoutFailed(response.get("description"))
@@ -309,6 +336,7 @@ class ExternalProvider:
             )
             self._record_exception(exc)
             raise exc
+        self.logger.debug("Connections to provider %r: %r", self.id, self.http.stats)
         return response
 
     def check_error(self, response: dict) -> None:
@@ -384,7 +412,7 @@ class ExternalProvider:
                 execution_spaces = execution_spaces[:maximum_amount]
                 for execution_space in extra:
                     self.checkin(execution_space)
-            self.dataset.add("execution_spaces", deepcopy(execution_spaces))
+            self.dataset.add("execution_spaces", ItemIndex(deepcopy(execution_spaces)))
         except:  # pylint:disable=bare-except
             self.checkin_all()
             raise
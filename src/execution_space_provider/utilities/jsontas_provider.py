@@ -16,11 +16,14 @@
 """Execution space provider utilizing JSONTas."""
 
 import logging
+import os
 import time
 
 from etos_lib import ETOS
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.backoff import Backoff
+
 from ..exceptions import (
     ExecutionSpaceCheckoutFailed,
     ExecutionSpaceNotAvailable,
@@ -50,6 +53,10 @@ class JSONTasProvider:
         self.etos.config.set("execution_spaces", [])
         self.ruleset = ruleset
         self.id = self.ruleset.get("id")  # pylint:disable=invalid-name
+        # Number of execution spaces to check out and check in at the same time.
+        self.concurrency = int(
+            self.ruleset.get("concurrency", os.getenv("ETOS_JSONTAS_CONCURRENCY", "1"))
+        )
         self.context = self.etos.config.get("environment_provider_context")
         self.logger.info("Initialized execution space provider %r", self.id)
 
@@ -59,7 +66,9 @@ class JSONTasProvider:
         :param available_execution_spaces: Execution spaces to checkout.
         :return: Checked out execution spaces.
         """
-        checkout_execution_spaces = Checkout(self.jsontas, self.ruleset.get("checkout"))
+        checkout_execution_spaces = Checkout(
+            self.jsontas, self.ruleset.get("checkout"), self.concurrency
+        )
         return checkout_execution_spaces.checkout(available_execution_spaces)
 
     def list_execution_spaces(self, amount: int) -> list[ExecutionSpace]:
@@ -73,7 +82,9 @@ class JSONTasProvider:
 
     def checkin_all(self) -> None:
         """Check in all checked out execution spaces."""
-        checkin_execution_spaces = Checkin(self.jsontas, self.ruleset.get("checkin"))
+        checkin_execution_spaces = Checkin(
+            self.jsontas, self.ruleset.get("checkin"), self.concurrency
+        )
         checkin_execution_spaces.checkin_all()
 
     def checkin(self, execution_space: ExecutionSpace) -> None:
@@ -81,7 +92,9 @@ class JSONTasProvider:
 
         :param execution_space: Execution space to checkin.
         """
-        checkin_execution_spaces = Checkin(self.jsontas, self.ruleset.get("checkin"))
+        checkin_execution_spaces = Checkin(
+            self.jsontas, self.ruleset.get("checkin"), self.concurrency
+        )
         checkin_execution_spaces.checkin(execution_space)
 
     def _wait_for_and_checkout_execution_spaces(
@@ -97,12 +110,7 @@ class JSONTasProvider:
         :return: List of checked out execution spaces.
         """
         timeout = time.time() + self.etos.config.get("WAIT_FOR_EXECUTION_SPACE_TIMEOUT")
-        first_iteration = True
-        while time.time() < timeout:
-            if first_iteration:
-                first_iteration = False
-            else:
-                time.sleep(5)
+        for _ in Backoff(timeout):
             try:
                 available_execution_spaces = self.list_execution_spaces(maximum_amount)
                 self.logger.info("Available execution spaces:")
@@ -15,50 +15,20 @@
 # limitations under the License.
 """IUT provider data module."""
 
-from copy import deepcopy
-from typing import Any
+from environment_provider.lib.data_object import DataObject
 
 
-class Iut:
+class Iut(DataObject):
     """Item under test (IUT) data object."""
 
-    _iut_dictionary = None
+    __slots__ = ()
 
-    def __init__(self, **iut: dict) -> None:
-        """Take a dictionary as input and setattr on instance.
-
-        :param iut: Dictionary to set attributes from.
-        """
-        self._iut_dictionary = iut
-        for key, value in iut.items():
-            setattr(self, key, value)
-
-    def __setattr__(self, name: str, value: Any) -> None:
-        """Set IUT parameters to dict and object.
-
-        :param name: Name of parameter to set.
-        :param value: Value of parameter.
-        """
-        if self._iut_dictionary is not None:
-            self._iut_dictionary[name] = value
-        super().__setattr__(name, value)
-
-    def update(self, **dictionary: dict) -> None:
-        """Update IUT dictionary with new data.
-
-        :param dictionary: Dictionary to update attributes from.
-        """
-        self._iut_dictionary.update(**dictionary)
-        for key, value in dictionary.items():
-            setattr(self, key, value)
-
-    @property
-    def as_dict(self) -> dict:
-        """Represent IUT as dictionary.
+    def serialize(self) -> dict:
+        """Represent IUT as dictionary, with its identity as a string.
 
         :return: IUT dictionary.
         """
-        iut_dictionary = deepcopy(self._iut_dictionary)
+        iut_dictionary = super().serialize()
         if iut_dictionary.get("identity") and not isinstance(iut_dictionary.get("identity"), str):
             iut_dictionary["identity"] = iut_dictionary["identity"].to_string()
         return iut_dictionary
@@ -69,6 +39,6 @@ class Iut:
         :return: IUT identity as a string or Unknown.
         """
         try:
-            return self._iut_dictionary.get("identity").to_string()
+            return self._data.get("identity").to_string()
         except:  # noqa pylint:disable=bare-except
             return "Unknown"
@@ -16,9 +16,15 @@
 """IUT provider check in module."""
 
 import logging
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Optional
 
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..exceptions import IutCheckinFailed
 from ..iut import Iut
 
@@ -27,16 +33,31 @@ class Checkin:
     """Handle checking in IUTs to an IUT provider."""
 
     logger = logging.getLogger("IUTProvider - Checkin")
+    lock = Lock()
 
-    def __init__(self, jsontas: JsonTas, checkin_ruleset: dict) -> None:
+    def __init__(self, jsontas: JsonTas, checkin_ruleset: dict, concurrency: int = 1) -> None:
         """Initialize IUT checkin handler.
 
         :param jsontas: JSONTas instance used to evaluate the ruleset.
         :param checkin_ruleset: JSONTas ruleset for checking in IUTs.
+        :param concurrency: Number of IUTs to check in at the same time.
         """
         self.checkin_ruleset = checkin_ruleset
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
+        self.concurrency = concurrency
+
+    def already_checked_in(self, iut: Iut) -> bool:
+        """Check whether an IUT has already been checked in, warning if it has.
+
+        :param iut: IUT to check.
+        :return: Whether or not the IUT has already been checked in.
+        """
+        checked_out = self.dataset.get("iuts")
+        if isinstance(checked_out, ItemIndex) and checked_out.checked_in(iut):
+            self.logger.warning("IUT %r has already been checked in.", iut)
+            return True
+        return False
 
     def checkin(self, iut: Iut) -> None:
         """Check in a single IUT, returning it to the IUT provider.
@@ -51,6 +72,9 @@ class Checkin:
             self.logger.info("No defined checkin rule.")
             return
 
+        if self.already_checked_in(iut):
+            return
+
         self.logger.info("Checking in IUT %r", iut)
         self.dataset.add("iut", iut)
         verified = self.jsontas.run(self.checkin_ruleset)
@@ -62,11 +86,41 @@ class Checkin:
         except ValueError:
             pass
 
+    def run_checkin_ruleset(self, iut: Iut) -> Optional[IutCheckinFailed]:
+        """Run the checkin ruleset for an IUT, on an overlay of the dataset.
+
+        :param iut: IUT to checkin.
+        :return: The reason for the failure, if the checkin failed.
+        """
+        if self.already_checked_in(iut):
+            return None
+        self.logger.info("Checking in IUT %r", iut)
+        with self.lock:
+            dataset = OverlayDataset.over(self.dataset)
+        dataset.add("iut", iut)
+        if not JsonTas(dataset=dataset).run(self.checkin_ruleset):
+            return IutCheckinFailed(f"Unable to checkin {iut}")
+        return None
+
     def checkin_all(self) -> None:
         """Checkin all checked out IUTs."""
         self.logger.info("Checking in all checked out IUTs.")
-        for iut in reversed(self.dataset.get("iuts", [])):
+        iuts = list(reversed(self.dataset.get("iuts", [])))
+        if self.checkin_ruleset is None or self.concurrency <= 1 or len(iuts) <= 1:
+            for iut in iuts:
+                try:
+                    self.checkin(iut)
+                except IutCheckinFailed as exception:
+                    self.logger.error("%r", exception)
+            return
+
+        with ThreadPool(min(self.concurrency, len(iuts))) as thread_pool:
+            failures = thread_pool.map(self.run_checkin_ruleset, iuts)
+        for iut, failure in zip(iuts, failures):
+            if failure is not None:
+                self.logger.error("%r", failure)
+                continue
             try:
-                self.checkin(iut)
-            except IutCheckinFailed as exception:
-                self.logger.error("%r", exception)
+                self.dataset.get("iuts", []).remove(iut)
+            except ValueError:
+                pass
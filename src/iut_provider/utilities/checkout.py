@@ -17,9 +17,15 @@
 
 import logging
 from copy import deepcopy
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Union
 
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..exceptions import IutCheckoutFailed
 from ..iut import Iut
 
@@ -28,16 +34,30 @@ class Checkout:  # pylint:disable=too-few-public-methods
     """Handle checking out IUTs from an IUT provider."""
 
     logger = logging.getLogger("IUTProvider - Checkout")
+    lock = Lock()
 
-    def __init__(self, jsontas: JsonTas, checkout_ruleset: dict) -> None:
+    def __init__(self, jsontas: JsonTas, checkout_ruleset: dict, concurrency: int = 1) -> None:
         """Initialize IUT checkout handler.
 
         :param jsontas: JSONTas instance used to evaluate the ruleset.
         :param checkout_ruleset: JSONTas ruleset for checking out IUTs.
+        :param concurrency: Number of IUTs to check out at the same time.
         """
         self.checkout_ruleset = checkout_ruleset
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
+        self.concurrency = concurrency
+
+    def run_checkout_ruleset(self, iut: Iut) -> Union[dict, str]:
+        """Run the checkout ruleset for an IUT, on an overlay of the dataset.
+
+        :param iut: IUT to checkout.
+        :return: The response of the checkout ruleset.
+        """
+        with self.lock:
+            dataset = OverlayDataset.over(self.dataset)
+        dataset.add("iut", iut)
+        return JsonTas(dataset=dataset).run(self.checkout_ruleset)
 
     def checkout(self, iuts: list[Iut]) -> list[Iut]:
         """Checkout a number of IUTs from an IUT provider.
@@ -51,21 +71,34 @@ class Checkout:  # pylint:disable=too-few-public-methods
         # Definition does not have the 'checkout' key. Just return IUTs provided.
         if not self.checkout_ruleset:
             self.logger.info("No defined checkout rule.")
-            self.dataset.add("iuts", iuts)
+            self.dataset.add("iuts", ItemIndex(iuts))
             return iuts
 
+        responses = {}
+        if self.concurrency > 1 and len(iuts) > 1:
+            self.logger.debug(
+                "Checking out %d IUTs, %d at a time.",
+                len(iuts),
+                self.concurrency,
+            )
+            with ThreadPool(min(self.concurrency, len(iuts))) as thread_pool:
+                responses = dict(enumerate(thread_pool.map(self.run_checkout_ruleset, iuts)))
+
         fail_message = ""
-        for iut in reversed(iuts):
-            self.logger.debug("Checking out IUT %r.", iut)
-            self.dataset.add("iut", iut)
-            response = self.jsontas.run(self.checkout_ruleset)
+        for index, iut in reversed(list(enumerate(iuts))):
+            if index in responses:
+                response = responses[index]
+            else:
+                self.logger.debug("Checking out IUT %r.", iut)
+                self.dataset.add("iut", iut)
+                response = self.jsontas.run(self.checkout_ruleset)
             if isinstance(response, dict):
                 iut.update(**response)
             else:
                 fail_message = response
                 self.logger.error("Unable to checkout %r Reason %r.", iut, fail_message)
-                iuts.remove(iut)
-        self.dataset.add("iuts", deepcopy(iuts))
+                del iuts[index]
+        self.dataset.add("iuts", ItemIndex(deepcopy(iuts)))
         if not iuts:
             raise IutCheckoutFailed(f"All IUTs failed checkout. {fail_message}")
         return iuts
@@ -27,12 +27,15 @@ from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapProp
 from opentelemetry.semconv.trace import SpanAttributes
 import requests
 from etos_lib import ETOS
-from etos_lib.lib.http import Http
 from jsontas.jsontas import JsonTas
 from packageurl import PackageURL
 from requests.exceptions import HTTPError, ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout as RequestsTimeout
 from urllib3.util import Retry
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.provider_session import ProviderSession, StatusProtocol
+
 from ..exceptions import IutCheckinFailed, IutCheckoutFailed, IutNotAvailable
 from ..iut import Iut
 
@@ -53,6 +56,10 @@ class ExternalProvider:
             "host": "host to stop endpoint"
         }
     }
+
+    Providers that support long-polling of their status can advertise it with
+    `"protocol": "long-poll"` in the status part of the ruleset, see
+    :obj:`environment_provider.lib.provider_session.StatusProtocol`.
     """
 
     logger = logging.getLogger("External IUTProvider")
@@ -71,7 +78,9 @@ class ExternalProvider:
         self.id = self.ruleset.get("id")  # pylint:disable=invalid-name
         self.context = self.etos.config.get("environment_provider_context")
         self.identifier = self.etos.config.get("SUITE_ID")
-        self.http = Http(
+        self.http = ProviderSession.shared(
+            "iut",
+            self.id,
             retry=Retry(
                 total=None,
                 read=0,
@@ -81,7 +90,7 @@ class ExternalProvider:
                 other=0,
                 allowed_methods=["POST", "GET"],
                 status_forcelist=Retry.RETRY_AFTER_STATUS_CODES,  # 413, 429, 503
-            )
+            ),
         )
         self.logger.info("Initialized external IUT provider %r", self.id)
 
@@ -136,8 +145,9 @@ class ExternalProvider:
             else:
                 time.sleep(2)
             try:
-                response = requests.post(host, json=iuts, headers=headers)
+                response = self.http.post(host, json=iuts, headers=headers)
                 if response.status_code == requests.codes["no_content"]:
+                    self._checked_in(iut)
                     return
                 response = response.json()
                 if response.get("error") is not None:
@@ -157,13 +167,27 @@ class ExternalProvider:
         self._record_exception(exc)
         raise exc
 
+    def _checked_in(self, iuts: list[Iut]) -> None:
+        """Remove checked in IUTs from the index of checked out IUTs.
+
+        :param iuts: IUTs that were checked in.
+        """
+        checked_out = self.dataset.get("iuts")
+        if not isinstance(checked_out, ItemIndex):
+            return
+        for iut in iuts:
+            try:
+                checked_out.remove(iut)
+            except ValueError:
+                pass
+
     def checkin_all(self) -> None:
         """Check in all IUTs.
 
         This method does the same as 'checkin'. It exists for API consistency.
         """
         self.logger.debug("Checking in all checked out IUTs")
-        self.checkin(self.dataset.get("iuts", []))
+        self.checkin(list(self.dataset.get("iuts", [])))
 
     def start(self, minimum_amount: int, maximum_amount: int) -> str:
         """Send a start request to an external IUT provider.
@@ -197,6 +221,7 @@ class ExternalProvider:
                 host,
                 json=data,
                 headers=headers,
+                retry=True,
             )
             response.raise_for_status()
             return response.json().get("id")
@@ -218,16 +243,20 @@ class ExternalProvider:
         host = self.ruleset.get("status", {}).get("host")
         timeout = time.time() + self.etos.config.get("WAIT_FOR_IUT_TIMEOUT")
 
+        protocol = StatusProtocol.from_ruleset(self.ruleset)
         response = None
         headers = {"X-ETOS-ID": self.identifier}
         TraceContextTextMapPropagator().inject(headers)
+        sent = None
         while time.time() < timeout:
-            time.sleep(2)
+            protocol.pace(sent)
+            sent = time.time()
             try:
-                response = requests.get(
+                response = self.http.get(
                     host,
-                    params={"id": provider_id},
+                    params=protocol.params(provider_id, timeout - time.time()),
                     headers=headers,
+                    timeout=protocol.timeout,
                 )
                 self.check_error(response)
                 response = response.json()
@@ -237,6 +266,9 @@ class ExternalProvider:
             except ConnectionError:
                 self.logger.error("Error connecting to %r", host)
                 continue
+            except RequestsTimeout:
+                self.logger.warning("Status request to %r timed out", host)
+                continue
 
             if response.get("status") == "FAILED":
                 raise IutCheckoutFailed(response.get("description"))
@@ -246,6 +278,7 @@ class ExternalProvider:
             raise TimeoutError(
                 f"Status request timed out after {self.etos.config.get('WAIT_FOR_IUT_TIMEOUT')}s"
             )
+        self.logger.debug("Connections to provider %r: %r", self.id, self.http.stats)
         return response
 
     def check_error(self, response: dict) -> None:
@@ -312,7 +345,7 @@ class ExternalProvider:
                 iuts = iuts[:maximum_amount]
                 for iut in extra:
                     self.checkin(iut)
-            self.dataset.add("iuts", deepcopy(iuts))
+            self.dataset.add("iuts", ItemIndex(deepcopy(iuts)))
         except:  # pylint:disable=bare-except
             self.checkin_all()
             raise
@@ -16,12 +16,15 @@
 """IUT provider utilizing JSONTas."""
 
 import logging
+import os
 import time
 
 from etos_lib import ETOS
 from jsontas.jsontas import JsonTas
 from packageurl import PackageURL
 
+from environment_provider.lib.backoff import Backoff
+
 from ..exceptions import IutCheckoutFailed, IutNotAvailable, NoIutFound, NotEnoughIutsAvailable
 from ..iut import Iut
 from .checkin import Checkin
@@ -47,6 +50,10 @@ class JSONTasProvider:
         self.jsontas = jsontas
         self.ruleset = ruleset
         self.id = self.ruleset.get("id")  # pylint:disable=invalid-name
+        # Number of IUTs to check out and check in at the same time.
+        self.concurrency = int(
+            self.ruleset.get("concurrency", os.getenv("ETOS_JSONTAS_CONCURRENCY", "1"))
+        )
         self.context = self.etos.config.get("environment_provider_context")
         self.logger.info("Initialized IUT provider %r", self.id)
 
@@ -64,7 +71,7 @@ class JSONTasProvider:
         :param available_iuts: IUTs to checkout.
         :return: Checked out IUTs.
         """
-        checkout_iuts = Checkout(self.jsontas, self.ruleset.get("checkout"))
+        checkout_iuts = Checkout(self.jsontas, self.ruleset.get("checkout"), self.concurrency)
         return checkout_iuts.checkout(available_iuts)
 
     def list_iuts(self, amount: int) -> list[Iut]:
@@ -78,7 +85,7 @@ class JSONTasProvider:
 
     def checkin_all(self) -> None:
         """Check in all checked out IUTs."""
-        checkin_iuts = Checkin(self.jsontas, self.ruleset.get("checkin"))
+        checkin_iuts = Checkin(self.jsontas, self.ruleset.get("checkin"), self.concurrency)
         checkin_iuts.checkin_all()
 
     def checkin(self, iut: Iut) -> None:
@@ -86,7 +93,7 @@ class JSONTasProvider:
 
         :param iut: IUT to checkin.
         """
-        checkin_iuts = Checkin(self.jsontas, self.ruleset.get("checkin"))
+        checkin_iuts = Checkin(self.jsontas, self.ruleset.get("checkin"), self.concurrency)
         checkin_iuts.checkin(iut)
 
     def prepare(self, iuts: list[Iut]) -> list[Iut]:
@@ -129,12 +136,7 @@ class JSONTasProvider:
         timeout = time.time() + self.etos.config.get("WAIT_FOR_IUT_TIMEOUT")
         last_exception = None
         prepared_iuts = []
-        first_iteration = True
-        while time.time() < timeout:
-            if first_iteration:
-                first_iteration = False
-            else:
-                time.sleep(5)
+        for _ in Backoff(timeout):
             try:
                 available_iuts = self.list_iuts(maximum_amount)
                 self.logger.info("Available IUTs:")
@@ -16,22 +16,51 @@
 """IUT provider prepare module."""
 
 import logging
+import os
+import time
 from collections import OrderedDict
 from copy import deepcopy
 from multiprocessing.pool import ThreadPool
-from threading import Lock
+from threading import Event, Lock, Thread
+from typing import Optional
+from weakref import WeakSet
 
 from etos_lib.logging.logger import FORMAT_CONFIG
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..iut import Iut
 
 
-class Prepare:  # pylint:disable=too-few-public-methods
-    """Prepare and add preparation configuration for ETR to use to item under test (IUT)."""
+class Prepare:
+    """Prepare and add preparation configuration for ETR to use to item under test (IUT).
+
+    IUTs are prepared on a thread pool that is shared by all preparations, and by all
+    retries of a checkout, until it is shut down with :meth:`shutdown`.
+
+    IUTs are prepared on copies, which replace the IUTs once they have been prepared. A
+    preparation step cannot be interrupted, so an IUT that times out keeps its thread
+    until its current step returns, after which its remaining steps are skipped. Its copy
+    is discarded, so that the failed IUT is not changed by the hung preparation. The pool
+    is replaced when this happens, so that hung IUTs do not take threads from the IUTs
+    that are prepared after them. IUTs that are still waiting for a thread in the replaced
+    pool are cancelled there and moved to the new pool. Replaced pools are joined in the
+    background, and waited for by :meth:`shutdown`.
+
+    The preparation can be configured with these environment variables:
+
+        - ETOS_PREPARE_CONCURRENCY: Number of IUTs to prepare at the same time (default 10).
+        - ETOS_PREPARE_TIMEOUT: Maximum time, in seconds, to prepare an IUT (default 3600).
+    """
 
     logger = logging.getLogger("IUTProvider - Prepare")
     lock = Lock()
+    pool_lock = Lock()
+    __pool: Optional[ThreadPool] = None
+    __retired: WeakSet = WeakSet()
+    __reapers: list[Thread] = []
 
     def __init__(self, jsontas: JsonTas, prepare_ruleset: dict) -> None:
         """Initialize IUT preparation handler.
@@ -43,25 +72,103 @@ class Prepare:  # pylint:disable=too-few-public-methods
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
         self.suite_id = self.dataset.get("config", {}).get("SUITE_ID")
+        self.timeout = float(os.getenv("ETOS_PREPARE_TIMEOUT", "3600"))
+        # Durations, in seconds, of each executed preparation step.
+        self.step_durations: dict[str, list[float]] = {}
+        # Guards the start of a preparation against it being moved to another pool.
+        self.start_lock = Lock()
+
+    @classmethod
+    def pool(cls) -> ThreadPool:
+        """Get the thread pool that IUTs are prepared on, creating it if necessary.
 
-    def execute_preparation_steps(self, iut: Iut, preparation_steps: dict) -> tuple[bool, Iut]:
+        :return: The thread pool for preparing IUTs.
+        """
+        with cls.pool_lock:
+            if cls.__pool is None:
+                cls.__pool = ThreadPool(int(os.getenv("ETOS_PREPARE_CONCURRENCY", "10")))
+            return cls.__pool
+
+    @classmethod
+    def retire(cls, pool: ThreadPool) -> None:
+        """Replace a thread pool that has a thread occupied by a timed out preparation.
+
+        The next preparation gets a new thread pool. The retired pool is closed, so that
+        its threads exit as their current preparations return, and joined in the background.
+
+        :param pool: The thread pool to retire.
+        """
+        with cls.pool_lock:
+            if cls.__pool is pool:
+                cls.__pool = None
+            if pool in cls.__retired:
+                return
+            cls.__retired.add(pool)
+            pool.close()
+            reaper = Thread(target=pool.join, daemon=True)
+            reaper.start()
+            cls.__reapers.append(reaper)
+
+    @classmethod
+    def retired(cls, pool: ThreadPool) -> bool:
+        """Check whether a thread pool has been retired by :meth:`retire`.
+
+        :param pool: The thread pool to check.
+        :return: Whether or not the thread pool has been retired.
+        """
+        with cls.pool_lock:
+            return pool in cls.__retired
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Shut down the thread pool that IUTs are prepared on.
+
+        The thread pool is shared by every preparation in the process, so this abandons
+        all preparations that are still running, not only those of the caller. The pools
+        retired by timed out preparations are waited for, for at most ETOS_PREPARE_TIMEOUT.
+        """
+        with cls.pool_lock:
+            pool, cls.__pool = cls.__pool, None
+            reapers, cls.__reapers = cls.__reapers, []
+        if pool is not None:
+            pool.terminate()
+        deadline = time.monotonic() + float(os.getenv("ETOS_PREPARE_TIMEOUT", "3600"))
+        for reaper in reapers:
+            reaper.join(max(0.0, deadline - time.monotonic()))
+            if reaper.is_alive():
+                cls.logger.warning("A timed out preparation is still running, not waiting for it")
+
+    def execute_preparation_steps(
+        self, iut: Iut, preparation_steps: dict, cancelled: Optional[Event] = None
+    ) -> tuple[bool, Iut]:
         """Execute the preparation steps for the environment provider on an IUT.
 
         :param iut: IUT to prepare for execution.
         :param preparation_steps: Steps to execute to prepare an IUT.
+        :param cancelled: Optional event that is set when the preparation is cancelled.
         """
+        if cancelled is None:
+            cancelled = Event()
         FORMAT_CONFIG.identifier = self.suite_id
         try:
             with self.lock:
-                dataset = self.dataset.copy()
+                dataset = OverlayDataset.over(self.dataset)
             jsontas = JsonTas(dataset=dataset)
             steps = {}
             dataset.add("iut", iut)
             dataset.add("steps", steps)
             for step, definition in preparation_steps.items():
+                if cancelled.is_set():
+                    self.logger.error("Preparation of %r cancelled before step %r", iut, step)
+                    return False, iut
                 definition = OrderedDict(**definition)
                 self.logger.info("Executing step %r", step)
+                start = time.monotonic()
                 step_result = jsontas.run(json_data=definition)
+                duration = time.monotonic() - start
+                with self.lock:
+                    self.step_durations.setdefault(step, []).append(duration)
+                self.logger.info("Step %r finished in %.2fs", step, duration)
                 self.logger.info("%r", step_result)
                 setattr(iut, step, step_result)
                 if not step_result:
@@ -74,6 +181,102 @@ class Prepare:  # pylint:disable=too-few-public-methods
             return False, iut
         return True, iut
 
+    def __prepare_iut(
+        self,
+        iut: Iut,
+        preparation_steps: dict,
+        started: dict[int, float],
+        index: int,
+        cancelled: Event,
+    ) -> tuple[bool, Iut]:
+        """Record when the preparation of an IUT starts and execute its preparation steps.
+
+        :param iut: IUT to prepare for execution.
+        :param preparation_steps: Steps to execute to prepare an IUT.
+        :param started: When the preparation of each IUT started, by index.
+        :param index: Index of the IUT being prepared.
+        :param cancelled: Event that is set when the preparation of the IUT times out, or
+                          when it has been moved to another thread pool.
+        :return: Whether or not the preparation was successful and the IUT.
+        """
+        with self.start_lock:
+            if cancelled.is_set():
+                return False, iut
+            started[index] = time.monotonic()
+        return self.execute_preparation_steps(iut, preparation_steps, cancelled)
+
+    def __submit(
+        self, preparation: dict, preparation_steps: dict, started: dict[int, float]
+    ) -> None:
+        """Submit the preparation of an IUT to the current thread pool.
+
+        :param preparation: Preparation of an IUT, with its 'index' and 'iut'. The thread
+                            pool, result and cancellation event are added to it. The IUT
+                            is prepared on a copy.
+        :param preparation_steps: Steps to execute to prepare an IUT.
+        :param started: When the preparation of each IUT started, by index.
+        """
+        preparation["pool"] = self.pool()
+        preparation["cancelled"] = Event()
+        preparation["result"] = preparation["pool"].apply_async(
+            self.__prepare_iut,
+            args=(
+                deepcopy(preparation["iut"]),
+                deepcopy(preparation_steps),
+                started,
+                preparation["index"],
+                preparation["cancelled"],
+            ),
+        )
+
+    def __resubmit(
+        self, preparation: dict, preparation_steps: dict, started: dict[int, float]
+    ) -> None:
+        """Move the preparation of an IUT, that has not started, off a retired thread pool.
+
+        An IUT that is queued on a retired thread pool waits behind the hung preparations
+        that retired it, so it is cancelled there and submitted to the current pool.
+
+        :param preparation: Preparation of an IUT that is queued on a retired thread pool.
+        :param preparation_steps: Steps to execute to prepare an IUT.
+        :param started: When the preparation of each IUT started, by index.
+        """
+        with self.start_lock:
+            if preparation["index"] in started:
+                return
+            preparation["cancelled"].set()
+            self.logger.info("Moving preparation of %r to a new thread pool", preparation["iut"])
+            self.__submit(preparation, preparation_steps, started)
+
+    def __wait(
+        self, preparation: dict, preparation_steps: dict, started: dict[int, float]
+    ) -> tuple[bool, Iut]:
+        """Wait for the preparation of an IUT, until it has been running for too long.
+
+        The timeout of an IUT starts when its preparation starts, and not while it is
+        waiting for a thread in the pool. An IUT that is still waiting for a thread when
+        its pool is retired is moved to the current pool.
+
+        :param preparation: Preparation of an IUT, as submitted by :meth:`__submit`.
+        :param preparation_steps: Steps to execute to prepare an IUT.
+        :param started: When the preparation of each IUT started, by index.
+        :return: Whether or not the preparation was successful and the prepared copy of the
+                 IUT, or the IUT itself if the preparation timed out.
+        """
+        iut = preparation["iut"]
+        while not preparation["result"].ready():
+            start = started.get(preparation["index"])
+            if start is None and self.retired(preparation["pool"]):
+                self.__resubmit(preparation, preparation_steps, started)
+                continue
+            if start is not None and time.monotonic() - start >= self.timeout:
+                self.logger.error("Preparation of %r timed out after %ds", iut, self.timeout)
+                preparation["cancelled"].set()
+                return False, iut
+            remaining = self.timeout if start is None else self.timeout - (time.monotonic() - start)
+            preparation["result"].wait(min(1.0, max(0.0, remaining)))
+        return preparation["result"].get()
+
     def prepare(self, iuts: list[Iut]) -> tuple[list[Iut], list[Iut]]:
         """Prepare IUTs.
 
@@ -85,26 +288,43 @@ class Prepare:  # pylint:disable=too-few-public-methods
         if not self.prepare_ruleset:
             self.logger.info("No defined preparation rule.")
             return iuts, []
-        thread_pool = ThreadPool()
 
         stages = self.prepare_ruleset.get("stages", {})
         steps = stages.get("environment_provider", {}).get("steps", {})
-        results = []
-        for iut in reversed(iuts):
+        preparations = []
+        started: dict[int, float] = {}
+        for index, iut in enumerate(reversed(iuts)):
             self.logger.info("Preparing IUT %r", iut)
-            results.append(
-                thread_pool.apply_async(
-                    self.execute_preparation_steps,
-                    args=(iut, deepcopy(steps)),
-                )
-            )
-        for result in results:
-            success, iut = result.get()
+            preparation = {"index": index, "iut": iut}
+            self.__submit(preparation, steps, started)
+            preparations.append(preparation)
+        for preparation in preparations:
+            success, iut = self.__wait(preparation, steps, started)
+            if preparation["cancelled"].is_set():
+                self.retire(preparation["pool"])
             if not success:
                 self.logger.error("Unable to prepare %r.", iut)
                 iuts.remove(iut)
                 failed_iuts.append(iut)
             else:
+                # The prepared copy is the same IUT, see DataObject.
+                iuts[iuts.index(iut)] = iut
                 iut.update(**deepcopy(stages))
-        self.dataset.add("iuts", deepcopy(iuts))
+        self.dataset.add("iuts", ItemIndex(deepcopy(iuts)))
+        self.log_step_durations()
         return iuts, failed_iuts
+
+    def log_step_durations(self) -> None:
+        """Log the number of executions, and the mean and maximum duration, of each step."""
+        with self.lock:
+            step_durations = {
+                step: list(durations) for step, durations in self.step_durations.items()
+            }
+        for step, durations in step_durations.items():
+            self.logger.info(
+                "Step %r executed %d times, mean %.2fs, max %.2fs",
+                step,
+                len(durations),
+                sum(durations) / len(durations),
+                max(durations),
+            )
@@ -16,9 +16,15 @@
 """Log area provider check in module."""
 
 import logging
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Optional
 
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..exceptions import LogAreaCheckinFailed
 from ..log_area import LogArea
 
@@ -27,16 +33,31 @@ class Checkin:
     """Handle checking in log areas to an log area provider."""
 
     logger = logging.getLogger("LogAreaProvider - Checkin")
+    lock = Lock()
 
-    def __init__(self, jsontas: JsonTas, checkin_ruleset: dict) -> None:
+    def __init__(self, jsontas: JsonTas, checkin_ruleset: dict, concurrency: int = 1) -> None:
         """Initialize log area checkin handler.
 
         :param jsontas: JSONTas instance used to evaluate the ruleset.
         :param checkin_ruleset: JSONTas ruleset for checking in log areas.
+        :param concurrency: Number of log areas to check in at the same time.
         """
         self.checkin_ruleset = checkin_ruleset
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
+        self.concurrency = concurrency
+
+    def already_checked_in(self, log_area: LogArea) -> bool:
+        """Check whether a log area has already been checked in, warning if it has.
+
+        :param log_area: Log area to check.
+        :return: Whether or not the log area has already been checked in.
+        """
+        checked_out = self.dataset.get("log_areas")
+        if isinstance(checked_out, ItemIndex) and checked_out.checked_in(log_area):
+            self.logger.warning("Log area %r has already been checked in.", log_area)
+            return True
+        return False
 
     def checkin(self, log_area: LogArea) -> None:
         """Check in a single log area, returning it to the log area provider.
@@ -51,6 +72,9 @@ class Checkin:
             self.logger.info("No defined checkin rule.")
             return
 
+        if self.already_checked_in(log_area):
+            return
+
         self.logger.info("Checking in log area %r", log_area)
         self.dataset.add("log_area", log_area)
         verified = self.jsontas.run(self.checkin_ruleset)
@@ -61,11 +85,41 @@ class Checkin:
         except ValueError:
             pass
 
+    def run_checkin_ruleset(self, log_area: LogArea) -> Optional[LogAreaCheckinFailed]:
+        """Run the checkin ruleset for a log area, on an overlay of the dataset.
+
+        :param log_area: Log area to checkin.
+        :return: The reason for the failure, if the checkin failed.
+        """
+        if self.already_checked_in(log_area):
+            return None
+        self.logger.info("Checking in log area %r", log_area)
+        with self.lock:
+            dataset = OverlayDataset.over(self.dataset)
+        dataset.add("log_area", log_area)
+        if not JsonTas(dataset=dataset).run(self.checkin_ruleset):
+            return LogAreaCheckinFailed(f"Unable to checkin {log_area}")
+        return None
+
     def checkin_all(self) -> None:
         """Checkin all checked out log areas."""
         self.logger.info("Checking in all checked out log areas.")
-        for log_area in reversed(self.dataset.get("log_areas", [])):
+        log_areas = list(reversed(self.dataset.get("log_areas", [])))
+        if self.checkin_ruleset is None or self.concurrency <= 1 or len(log_areas) <= 1:
+            for log_area in log_areas:
+                try:
+                    self.checkin(log_area)
+                except LogAreaCheckinFailed as exception:
+                    self.logger.error("%r", exception)
+            return
+
+        with ThreadPool(min(self.concurrency, len(log_areas))) as thread_pool:
+            failures = thread_pool.map(self.run_checkin_ruleset, log_areas)
+        for log_area, failure in zip(log_areas, failures):
+            if failure is not None:
+                self.logger.error("%r", failure)
+                continue
             try:
-                self.checkin(log_area)
-            except LogAreaCheckinFailed as exception:
-                self.logger.error("%r", exception)
+                self.dataset.get("log_areas", []).remove(log_area)
+            except ValueError:
+                pass
@@ -17,9 +17,15 @@
 
 import logging
 from copy import deepcopy
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+from typing import Union
 
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.overlay_dataset import OverlayDataset
+
 from ..exceptions import LogAreaCheckoutFailed
 from ..log_area import LogArea
 
@@ -28,16 +34,30 @@ class Checkout:  # pylint:disable=too-few-public-methods
     """Handle checking out log areas from an log area provider."""
 
     logger = logging.getLogger("LogAreaProvider - Checkout")
+    lock = Lock()
 
-    def __init__(self, jsontas: JsonTas, checkout_ruleset: dict) -> None:
+    def __init__(self, jsontas: JsonTas, checkout_ruleset: dict, concurrency: int = 1) -> None:
         """Initialize log area checkout handler.
 
         :param jsontas: JSONTas instance used to evaluate the ruleset.
         :param checkin_ruleset: JSONTas ruleset for checking out log areas.
+        :param concurrency: Number of log areas to check out at the same time.
         """
         self.checkout_ruleset = checkout_ruleset
         self.jsontas = jsontas
         self.dataset = self.jsontas.dataset
+        self.concurrency = concurrency
+
+    def run_checkout_ruleset(self, log_area: LogArea) -> Union[dict, str]:
+        """Run the checkout ruleset for a log area, on an overlay of the dataset.
+
+        :param log_area: Log area to checkout.
+        :return: The response of the checkout ruleset.
+        """
+        with self.lock:
+            dataset = OverlayDataset.over(self.dataset)
+        dataset.add("log_area", log_area)
+        return JsonTas(dataset=dataset).run(self.checkout_ruleset)
 
     def checkout(self, log_areas: list[LogArea]) -> list[LogArea]:
         """Checkout a number of log areas from an log area provider.
@@ -51,21 +71,34 @@ class Checkout:  # pylint:disable=too-few-public-methods
         # Definition does not have the 'checkout' key. Just return log areas provided.
         if not self.checkout_ruleset:
             self.logger.info("No defined checkout rule.")
-            self.dataset.add("log_areas", log_areas)
+            self.dataset.add("log_areas", ItemIndex(log_areas))
             return log_areas
 
+        responses = {}
+        if self.concurrency > 1 and len(log_areas) > 1:
+            self.logger.debug(
+                "Checking out %d log areas, %d at a time.",
+                len(log_areas),
+                self.concurrency,
+            )
+            with ThreadPool(min(self.concurrency, len(log_areas))) as thread_pool:
+                responses = dict(enumerate(thread_pool.map(self.run_checkout_ruleset, log_areas)))
+
         fail_message = ""
-        for log_area in reversed(log_areas):
-            self.logger.debug("Checking out log area %r.", log_area)
-            self.dataset.add("log_area", log_area)
-            response = self.jsontas.run(self.checkout_ruleset)
+        for index, log_area in reversed(list(enumerate(log_areas))):
+            if index in responses:
+                response = responses[index]
+            else:
+                self.logger.debug("Checking out log area %r.", log_area)
+                self.dataset.add("log_area", log_area)
+                response = self.jsontas.run(self.checkout_ruleset)
             if isinstance(response, dict):
                 log_area.update(**response)
             else:
                 fail_message = response
                 self.logger.error("Unable to checkout %r.", log_area)
-                log_areas.remove(log_area)
-        self.dataset.add("log_areas", deepcopy(log_areas))
+                del log_areas[index]
+        self.dataset.add("log_areas", ItemIndex(deepcopy(log_areas)))
         if not log_areas:
             raise LogAreaCheckoutFailed(f"All LogAreas failed checkout. {fail_message}")
         return log_areas
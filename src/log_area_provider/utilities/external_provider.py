@@ -27,12 +27,15 @@ from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapProp
 from opentelemetry.semconv.trace import SpanAttributes
 import requests
 from etos_lib import ETOS
-from etos_lib.lib.http import Http
 from jsontas.jsontas import JsonTas
 from packageurl import PackageURL
 from requests.exceptions import HTTPError, ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout as RequestsTimeout
 from urllib3.util import Retry
 
+from environment_provider.lib.data_object import ItemIndex
+from environment_provider.lib.provider_session import ProviderSession, StatusProtocol
+
 from ..exceptions import LogAreaCheckinFailed, LogAreaCheckoutFailed, LogAreaNotAvailable
 from ..log_area import LogArea
 
@@ -53,6 +56,10 @@ class ExternalProvider:
             "host": "host to stop endpoint"
         }
     }
+
+    Providers that support long-polling of their status can advertise it with
+    `"protocol": "long-poll"` in the status part of the ruleset, see
+    :obj:`environment_provider.lib.provider_session.StatusProtocol`.
     """
 
     logger = logging.getLogger("External LogAreaProvider")
@@ -71,7 +78,9 @@ class ExternalProvider:
         self.id = self.ruleset.get("id")  # pylint:disable=invalid-name
         self.context = self.etos.config.get("environment_provider_context")
         self.identifier = self.etos.config.get("SUITE_ID")
-        self.http = Http(
+        self.http = ProviderSession.shared(
+            "log_area",
+            self.id,
             retry=Retry(
                 total=None,
                 read=0,
@@ -81,7 +90,7 @@ class ExternalProvider:
                 other=0,
                 allowed_methods=["POST", "GET"],
                 status_forcelist=Retry.RETRY_AFTER_STATUS_CODES,  # 413, 429, 503
-            )
+            ),
         )
         self.logger.info("Initialized external log area provider %r", self.id)
 
@@ -136,8 +145,9 @@ class ExternalProvider:
             else:
                 time.sleep(2)
             try:
-                response = requests.post(host, json=log_areas, headers=headers)
+                response = self.http.post(host, json=log_areas, headers=headers)
                 if response.status_code == requests.codes["no_content"]:
+                    self._checked_in(log_area)
                     return
                 response = response.json()
                 if response.get("error") is not None:
@@ -159,13 +169,27 @@ class ExternalProvider:
         self._record_exception(exc)
         raise exc
 
+    def _checked_in(self, log_areas: list[LogArea]) -> None:
+        """Remove checked in log areas from the index of checked out log areas.
+
+        :param log_areas: Log areas that were checked in.
+        """
+        checked_out = self.dataset.get("logs")
+        if not isinstance(checked_out, ItemIndex):
+            return
+        for log_area in log_areas:
+            try:
+                checked_out.remove(log_area)
+            except ValueError:
+                pass
+
     def checkin_all(self) -> None:
         """Check in all log areas.
 
         This method does the same as 'checkin'. It exists for API consistency.
         """
         self.logger.debug("Checking in all checked out log areas")
-        self.checkin(self.dataset.get("logs", []))
+        self.checkin(list(self.dataset.get("logs", [])))
 
     def start(self, minimum_amount: int, maximum_amount: int) -> str:
         """Send a start request to an external log area provider.
@@ -199,6 +223,7 @@ class ExternalProvider:
                 host,
                 json=data,
                 headers=headers,
+                retry=True,
             )
             response.raise_for_status()
             return response.json().get("id")
@@ -222,26 +247,29 @@ class ExternalProvider:
         host = self.ruleset.get("status", {}).get("host")
         timeout = time.time() + self.etos.config.get("WAIT_FOR_LOG_AREA_TIMEOUT")
 
+        protocol = StatusProtocol.from_ruleset(self.ruleset)
         response = None
-        first_iteration = True
         headers = {"X-ETOS-ID": self.identifier}
         TraceContextTextMapPropagator().inject(headers)
+        sent = None
         while time.time() < timeout:
-            if first_iteration:
-                first_iteration = False
-            else:
-                time.sleep(2)
+            protocol.pace(sent)
+            sent = time.time()
             try:
-                response = requests.get(
+                response = self.http.get(
                     host,
-                    params={"id": provider_id},
+                    params=protocol.params(provider_id, timeout - time.time()),
                     headers=headers,
+                    timeout=protocol.timeout,
                 )
                 self.check_error(response)
                 response = response.json()
             except ConnectionError:
                 self.logger.error("Error connecting to %r", host)
                 continue
+            except RequestsTimeout:
+                self.logger.warning("Status request to %r timed out", host)
+                continue
 
             if response.get("status") == "FAILED":
                 exc = LogAreaCheckoutFailed(response.get("description"))
@@ -256,6 +284,7 @@ class ExternalProvider:
             )
             self._record_exception(exc)
             raise exc
+        self.logger.debug("Connections to provider %r: %r", self.id, self.http.stats)
         return response
 
     def check_error(self, response: dict) -> None:
@@ -322,7 +351,7 @@ class ExternalProvider:
                 log_areas = log_areas[:maximum_amount]
                 for log_area in extra:
                     self.checkin(log_area)
-            self.dataset.add("logs", deepcopy(log_areas))
+            self.dataset.add("logs", ItemIndex(deepcopy(log_areas)))
         except:  # pylint:disable=bare-except
             self.checkin_all()
             raise
@@ -16,11 +16,14 @@
 """Log area provider utilizing JSONTas."""
 
 import logging
+import os
 import time
 
 from etos_lib import ETOS
 from jsontas.jsontas import JsonTas
 
+from environment_provider.lib.backoff import Backoff
+
 from ..exceptions import (
     LogAreaCheckoutFailed,
     LogAreaNotAvailable,
@@ -50,6 +53,10 @@ class JSONTasProvider:
         self.etos.config.set("logs", [])
         self.ruleset = ruleset
         self.id = self.ruleset.get("id")  # pylint:disable=invalid-name
+        # Number of log areas to check out and check in at the same time.
+        self.concurrency = int(
+            self.ruleset.get("concurrency", os.getenv("ETOS_JSONTAS_CONCURRENCY", "1"))
+        )
         self.context = self.etos.config.get("environment_provider_context")
         self.logger.info("Initialized log area provider %r", self.id)
 
@@ -59,7 +66,7 @@ class JSONTasProvider:
         :param available_log_areas: Log areas to checkout.
         :return: Checked out log areas.
         """
-        checkout_log_areas = Checkout(self.jsontas, self.ruleset.get("checkout"))
+        checkout_log_areas = Checkout(self.jsontas, self.ruleset.get("checkout"), self.concurrency)
         return checkout_log_areas.checkout(available_log_areas)
 
     def list_log_areas(self, amount: int) -> list[LogArea]:
@@ -73,7 +80,7 @@ class JSONTasProvider:
 
     def checkin_all(self) -> None:
         """Check in all checked out log areas."""
-        checkin_log_areas = Checkin(self.jsontas, self.ruleset.get("checkin"))
+        checkin_log_areas = Checkin(self.jsontas, self.ruleset.get("checkin"), self.concurrency)
         checkin_log_areas.checkin_all()
 
     def checkin(self, log_area: LogArea) -> None:
@@ -81,7 +88,7 @@ class JSONTasProvider:
 
         :param log_area: Log area to checkin.
         """
-        checkin_log_areas = Checkin(self.jsontas, self.ruleset.get("checkin"))
+        checkin_log_areas = Checkin(self.jsontas, self.ruleset.get("checkin"), self.concurrency)
         checkin_log_areas.checkin(log_area)
 
     def _wait_for_and_checkout_log_areas(
@@ -96,12 +103,7 @@ class JSONTasProvider:
         :return: List of checked out log areas.
         """
         timeout = time.time() + self.etos.config.get("WAIT_FOR_LOG_AREA_TIMEOUT")
-        first_iteration = True
-        while time.time() < timeout:
-            if first_iteration:
-                first_iteration = False
-            else:
-                time.sleep(5)
+        for _ in Backoff(timeout):
             try:
                 available_log_areas = self.list_log_areas(maximum_amount)
                 self.logger.info("Available log areas:")
@@ -0,0 +1,230 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the retry scheduler with exponential backoff."""
+
+import logging
+import os
+import unittest
+
+from etos_lib.lib.config import Config
+from mock import patch
+
+from environment_provider.lib.backoff import Backoff, wake_on_release
+from environment_provider.lib.database import ETCDPath
+from tests.library.fake_database import FakeDatabase
+
+
+class FakeClock:
+    """Fake clock, where sleeping moves time forward instantly."""
+
+    def __init__(self) -> None:
+        """Start the clock at 0."""
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self) -> float:
+        """Get the current time of the clock."""
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Move the clock forward."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeEvent:
+    """Fake wake-up event, where waiting moves the fake clock forward instantly."""
+
+    def __init__(self, clock: FakeClock) -> None:
+        """Initialize an unset event on a fake clock."""
+        self.clock = clock
+        self.flag = False
+
+    def set(self) -> None:
+        """Set the event."""
+        self.flag = True
+
+    def clear(self) -> None:
+        """Clear the event."""
+        self.flag = False
+
+    def wait(self, timeout: float) -> bool:
+        """Wait for the event to be set, moving the clock forward if it is not."""
+        if not self.flag:
+            self.clock.sleep(timeout)
+        return self.flag
+
+
+class TestBackoff(unittest.TestCase):
+    """Test the retry scheduler with exponential backoff."""
+
+    logger = logging.getLogger(__name__)
+
+    def setUp(self) -> None:
+        """Replace the clock of the backoff with a fake clock, and remove the jitter."""
+        self.clock = FakeClock()
+        patches = [
+            patch("environment_provider.lib.backoff.time.time", self.clock.time),
+            patch("environment_provider.lib.backoff.time.sleep", self.clock.sleep),
+            patch.dict(os.environ, {"ETOS_BACKOFF_JITTER": "0"}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_backoff_intervals(self) -> None:
+        """Test that the interval between attempts grows exponentially up to the maximum.
+
+        Approval criteria:
+            - The first attempt shall be made right away.
+            - The interval shall double for each attempt, from 1 second up to 5 seconds.
+
+        Test steps::
+            1. Iterate over a backoff with a deadline in 20 seconds.
+            2. Verify that the attempts were made with exponentially growing intervals.
+        """
+        self.logger.info("STEP: Iterate over a backoff with a deadline in 20 seconds.")
+        attempts = [(attempt, self.clock.now) for attempt in Backoff(20)]
+
+        self.logger.info(
+            "STEP: Verify that the attempts were made with exponentially growing intervals."
+        )
+        self.assertListEqual(attempts, [(0, 0), (1, 1), (2, 3), (3, 7), (4, 12), (5, 17), (6, 20)])
+        self.assertListEqual(self.clock.sleeps, [1, 2, 4, 5, 5, 3])
+
+    def test_backoff_deadline(self) -> None:
+        """Test that a final attempt is made at the deadline, and none after it.
+
+        Approval criteria:
+            - The backoff shall wait until the deadline when the next interval passes it.
+            - A final attempt shall be made at the deadline.
+            - No attempt shall be made if the deadline has already passed.
+
+        Test steps::
+            1. Iterate over a backoff with a deadline in 2.5 seconds.
+            2. Verify that a final attempt was made at the deadline.
+            3. Iterate over a backoff with a deadline that has passed.
+            4. Verify that no attempt was made.
+        """
+        self.logger.info("STEP: Iterate over a backoff with a deadline in 2.5 seconds.")
+        attempts = [self.clock.now for _ in Backoff(2.5)]
+
+        self.logger.info("STEP: Verify that a final attempt was made at the deadline.")
+        self.assertListEqual(attempts, [0, 1, 2.5])
+        self.assertListEqual(self.clock.sleeps, [1, 1.5])
+
+        self.logger.info("STEP: Iterate over a backoff with a deadline that has passed.")
+        attempts = list(Backoff(self.clock.now))
+
+        self.logger.info("STEP: Verify that no attempt was made.")
+        self.assertListEqual(attempts, [])
+
+    def test_backoff_jitter(self) -> None:
+        """Test that jittered intervals stay within the minimum and maximum intervals.
+
+        Approval criteria:
+            - A jittered interval shall never be below the minimum or above the maximum.
+
+        Test steps::
+            1. Calculate intervals with the lowest and highest jitter.
+            2. Verify that the intervals are within the minimum and maximum intervals.
+        """
+        with patch.dict(os.environ, {"ETOS_BACKOFF_JITTER": "0.2"}):
+            backoff = Backoff(60)
+
+        self.logger.info("STEP: Calculate intervals with the lowest and highest jitter.")
+        with patch("environment_provider.lib.backoff.random.uniform", side_effect=min):
+            lowest = [backoff.interval(retry) for retry in range(5)]
+        with patch("environment_provider.lib.backoff.random.uniform", side_effect=max):
+            highest = [backoff.interval(retry) for retry in range(5)]
+
+        self.logger.info(
+            "STEP: Verify that the intervals are within the minimum and maximum intervals."
+        )
+        for interval, expected in zip(lowest, [1, 1.6, 3.2, 4, 4]):
+            self.assertAlmostEqual(interval, expected)
+        for interval, expected in zip(highest, [1.2, 2.4, 4.8, 5, 5]):
+            self.assertAlmostEqual(interval, expected)
+
+    def test_backoff_wakeup(self) -> None:
+        """Test that the wake-up event triggers the next attempt right away.
+
+        Approval criteria:
+            - An attempt shall be made right away when the wake-up event is set.
+            - The interval shall restart from the minimum after a wake-up.
+
+        Test steps::
+            1. Iterate over a backoff, setting the wake-up event after the third attempt.
+            2. Verify that the next attempt was made right away.
+            3. Verify that the interval restarted from the minimum.
+        """
+        wakeup = FakeEvent(self.clock)
+
+        self.logger.info(
+            "STEP: Iterate over a backoff, setting the wake-up event after the third attempt."
+        )
+        attempts = []
+        for attempt in Backoff(20, wakeup):
+            attempts.append(self.clock.now)
+            if attempt == 2:
+                wakeup.set()
+            if attempt == 5:
+                break
+
+        self.logger.info("STEP: Verify that the next attempt was made right away.")
+        self.assertListEqual(attempts[:4], [0, 1, 3, 3])
+        self.assertFalse(wakeup.flag)
+
+        self.logger.info("STEP: Verify that the interval restarted from the minimum.")
+        self.assertListEqual(attempts[4:], [4, 6])
+        self.assertListEqual(self.clock.sleeps, [1, 2, 1, 2])
+
+    def test_wake_on_release(self) -> None:
+        """Test that the wake-up event is set when another testrun is released.
+
+        Approval criteria:
+            - The wake-up event shall be set when keys of another testrun are deleted.
+            - The wake-up event shall not be set when keys are written.
+            - The wake-up event shall not be set when keys of the ignored testrun are deleted.
+
+        Test steps::
+            1. Watch for releases, ignoring the testrun of the watcher.
+            2. Write and delete keys of the testrun of the watcher.
+            3. Verify that the wake-up event was not set.
+            4. Delete the keys of another testrun.
+            5. Verify that the wake-up event was set.
+        """
+        Config().set("database", FakeDatabase())
+        testrun = ETCDPath("/testrun/mine")
+        other = ETCDPath("/testrun/other")
+        other.join("subsuites/1").write("value")
+
+        self.logger.info("STEP: Watch for releases, ignoring the testrun of the watcher.")
+        wakeup, cancel = wake_on_release(ETCDPath("/testrun"), testrun)
+        self.addCleanup(cancel)
+
+        self.logger.info("STEP: Write and delete keys of the testrun of the watcher.")
+        testrun.join("subsuites/1").write("value")
+        testrun.delete_all()
+
+        self.logger.info("STEP: Verify that the wake-up event was not set.")
+        self.assertFalse(wakeup.wait(0.5))
+
+        self.logger.info("STEP: Delete the keys of another testrun.")
+        other.delete_all()
+
+        self.logger.info("STEP: Verify that the wake-up event was set.")
+        self.assertTrue(wakeup.wait(5))
@@ -0,0 +1,378 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for checking out execution spaces and log areas for the IUTs of a test runner."""
+
+import logging
+import threading
+import time
+import unittest
+from typing import Any, Optional
+
+from etos_lib import ETOS
+from etos_lib.lib.config import Config
+from jsontas.jsontas import JsonTas
+from mock import patch
+from opentelemetry import trace
+
+from environment_provider.environment_provider import EnvironmentProvider
+from execution_space_provider.exceptions import ExecutionSpaceNotAvailable
+from execution_space_provider.execution_space import ExecutionSpace
+from iut_provider.iut import Iut
+from log_area_provider.exceptions import LogAreaNotAvailable
+from log_area_provider.log_area import LogArea
+from tests.library.fake_database import FakeDatabase
+
+
+class FakeProvider:
+    """Fake execution space and log area provider, recording what is checked out and in.
+
+    The ruleset decides the type of the provider, the IUTs that it fails to check out
+    items for, how long a checkout takes for each IUT and, optionally, how many items it
+    returns for a bulk checkout regardless of how many were requested.
+    """
+
+    lock = threading.Lock()
+    requests: list[tuple[str, int]] = []
+    checked_out: list[Any] = []
+    checked_in: list[Any] = []
+
+    def __init__(self, etos: ETOS, jsontas: JsonTas, ruleset: dict) -> None:
+        """Initialize the fake provider.
+
+        :param etos: ETOS library instance.
+        :param jsontas: JSONTas instance, with the dataset to look up the IUT in.
+        :param ruleset: Ruleset of the fake provider.
+        """
+        self.etos = etos
+        self.jsontas = jsontas
+        self.ruleset = ruleset
+        self.id = ruleset.get("id")  # pylint:disable=invalid-name
+        self.items = []
+
+    @classmethod
+    def reset(cls) -> None:
+        """Forget all requests, checkouts and checkins."""
+        cls.requests = []
+        cls.checked_out = []
+        cls.checked_in = []
+
+    def __checkout(self, item_type: type, exception: type, amount: int) -> list[Any]:
+        """Check out items, failing or delaying the checkout as the ruleset says.
+
+        :param item_type: Type of the items to check out.
+        :param exception: Exception to raise if the checkout fails.
+        :param amount: The number of items requested.
+        :return: The checked out items.
+        """
+        iut: Optional[Iut] = self.jsontas.dataset.get("iut")
+        iut_id = None if iut is None else iut.id
+        time.sleep(self.ruleset.get("delay", {}).get(iut_id, 0))
+        with self.lock:
+            self.requests.append((self.id, amount))
+        if iut_id in self.ruleset.get("fail", []):
+            raise exception(f"{self.id} failed to check out for IUT {iut_id}")
+        if iut_id is None:
+            amount = self.ruleset.get("amount", amount)
+        items = [item_type(provider_id=self.id, iut=iut_id) for _ in range(amount)]
+        with self.lock:
+            self.items.extend(items)
+            self.checked_out.extend(items)
+        return items
+
+    def wait_for_and_checkout_execution_spaces(
+        self, minimum_amount: int, maximum_amount: int  # pylint:disable=unused-argument
+    ) -> list[ExecutionSpace]:
+        """Check out execution spaces.
+
+        :param minimum_amount: Minimum amount of execution spaces to check out.
+        :param maximum_amount: Maximum amount of execution spaces to check out.
+        :return: The checked out execution spaces.
+        """
+        return self.__checkout(ExecutionSpace, ExecutionSpaceNotAvailable, maximum_amount)
+
+    def wait_for_and_checkout_log_areas(
+        self, minimum_amount: int, maximum_amount: int  # pylint:disable=unused-argument
+    ) -> list[LogArea]:
+        """Check out log areas.
+
+        :param minimum_amount: Minimum amount of log areas to check out.
+        :param maximum_amount: Maximum amount of log areas to check out.
+        :return: The checked out log areas.
+        """
+        return self.__checkout(LogArea, LogAreaNotAvailable, maximum_amount)
+
+    def checkin(self, items: Any) -> None:
+        """Check in one or several items.
+
+        :param items: An item, or a list of items, to check in.
+        """
+        if not isinstance(items, list):
+            items = [items]
+        with self.lock:
+            for item in items:
+                self.items.remove(item)
+                self.checked_in.append(item)
+
+    def checkin_all(self) -> None:
+        """Check in all items checked out from this provider."""
+        self.checkin(list(self.items))
+
+
+class TestCheckout(unittest.TestCase):
+    """Test checking out execution spaces and log areas for the IUTs of a test runner."""
+
+    logger = logging.getLogger(__name__)
+
+    def setUp(self) -> None:
+        """Set up a fake database and forget all checkouts of the fake providers."""
+        Config().set("database", FakeDatabase())
+        FakeProvider.reset()
+        for name in ("ExecutionSpaceProvider", "LogAreaProvider"):
+            patcher = patch(f"environment_provider.environment_provider.{name}", FakeProvider)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def environment_provider(
+        execution_space_ruleset: dict, log_area_ruleset: dict
+    ) -> EnvironmentProvider:
+        """Create an environment provider with fake execution space and log area providers.
+
+        :param execution_space_ruleset: Ruleset of the fake execution space provider.
+        :param log_area_ruleset: Ruleset of the fake log area provider.
+        :return: An environment provider, without a configured environment request.
+        """
+        # The environment request and provider registry are not needed for checkouts.
+        provider = EnvironmentProvider.__new__(EnvironmentProvider)
+        provider.etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        provider.etos.config.set("CHECKOUT_CONCURRENCY", 4)
+        provider.suite_id = "suite_id"
+        provider.tracer = trace.get_tracer(__name__)
+        provider.jsontas = JsonTas()
+        provider.dataset = provider.jsontas.dataset
+        provider.execution_space_provider = FakeProvider(
+            provider.etos, provider.jsontas, execution_space_ruleset
+        )
+        provider.log_area_provider = FakeProvider(provider.etos, provider.jsontas, log_area_ruleset)
+        provider.etos.config.set(
+            "PROVIDERS", [provider.execution_space_provider, provider.log_area_provider]
+        )
+        return provider
+
+    def test_checkout_partial_failure(self) -> None:
+        """Test that everything checked out is checked in when one IUT fails checkout.
+
+        Approval criteria:
+            - IUTs shall be yielded as soon as their environments are checked out.
+            - A failed checkout, for a single IUT, shall be raised.
+            - All execution spaces and log areas checked out for the other IUTs shall be
+              checked in by the cleanup.
+
+        Test steps::
+            1. Check out environments for 4 IUTs, where the execution space of one fails.
+            2. Verify that the other IUTs were yielded before the failure was raised.
+            3. Clean up the environment provider.
+            4. Verify that all execution spaces and log areas were checked in.
+        """
+        provider = self.environment_provider(
+            {"id": "execution_space", "type": "jsontas", "fail": ["2"], "delay": {"2": 0.5}},
+            {"id": "log_area", "type": "jsontas"},
+        )
+        iuts = {Iut(id=str(index)): {} for index in range(4)}
+
+        self.logger.info(
+            "STEP: Check out environments for 4 IUTs, where the execution space of one fails."
+        )
+        yielded = []
+        with self.assertRaises(ExecutionSpaceNotAvailable):
+            for iut, suite in provider.checkout_executors_and_log_areas("runner", iuts):
+                yielded.append(iut.id)
+                self.assertIsInstance(suite["executor"], ExecutionSpace)
+                self.assertIsInstance(suite["log_area"], LogArea)
+
+        self.logger.info(
+            "STEP: Verify that the other IUTs were yielded before the failure was raised."
+        )
+        self.assertEqual(sorted(yielded), ["0", "1", "3"])
+        self.assertEqual(len(FakeProvider.checked_out), 6)
+
+        self.logger.info("STEP: Clean up the environment provider.")
+        provider.cleanup()
+
+        self.logger.info("STEP: Verify that all execution spaces and log areas were checked in.")
+        self.assertCountEqual(FakeProvider.checked_in, FakeProvider.checked_out)
+
+    def test_bulk_checkout(self) -> None:
+        """Test that external providers are checked out once for all IUTs.
+
+        Approval criteria:
+            - External providers shall be requested once for all IUTs.
+            - Every IUT shall get an execution space and a log area of its own.
+            - No per-IUT providers shall be created for external providers.
+
+        Test steps::
+            1. Check out environments for 3 IUTs from external providers.
+            2. Verify that each provider was requested once, for 3 items.
+            3. Verify that every IUT got an execution space and a log area of its own.
+        """
+        provider = self.environment_provider(
+            {"id": "execution_space", "type": "external"},
+            {"id": "log_area", "type": "external"},
+        )
+        iuts = {Iut(id=str(index)): {} for index in range(3)}
+
+        self.logger.info("STEP: Check out environments for 3 IUTs from external providers.")
+        checked_out = list(provider.checkout_executors_and_log_areas("runner", iuts))
+
+        self.logger.info("STEP: Verify that each provider was requested once, for 3 items.")
+        self.assertCountEqual(FakeProvider.requests, [("execution_space", 3), ("log_area", 3)])
+        self.assertEqual(len(provider.etos.config.get("PROVIDERS")), 2)
+
+        self.logger.info(
+            "STEP: Verify that every IUT got an execution space and a log area of its own."
+        )
+        self.assertEqual(len(checked_out), 3)
+        self.assertEqual(len({id(suite["executor"]) for _, suite in checked_out}), 3)
+        self.assertEqual(len({id(suite["log_area"]) for _, suite in checked_out}), 3)
+
+    def test_bulk_checkout_fallback(self) -> None:
+        """Test that JSONTas providers are checked out per IUT next to a bulk checkout.
+
+        Approval criteria:
+            - External providers shall be requested once for all IUTs.
+            - JSONTas providers shall be requested once per IUT, with the IUT in the dataset.
+
+        Test steps::
+            1. Check out environments for 3 IUTs from an external execution space provider
+               and a JSONTas log area provider.
+            2. Verify that the execution space provider was requested once, for 3 items.
+            3. Verify that the log area provider was requested once per IUT.
+        """
+        provider = self.environment_provider(
+            {"id": "execution_space", "type": "external"},
+            {"id": "log_area", "type": "jsontas"},
+        )
+        iuts = {Iut(id=str(index)): {} for index in range(3)}
+
+        self.logger.info(
+            "STEP: Check out environments for 3 IUTs from an external execution space provider "
+            "and a JSONTas log area provider."
+        )
+        checked_out = list(provider.checkout_executors_and_log_areas("runner", iuts))
+
+        self.logger.info(
+            "STEP: Verify that the execution space provider was requested once, for 3 items."
+        )
+        self.assertEqual(FakeProvider.requests.count(("execution_space", 3)), 1)
+
+        self.logger.info("STEP: Verify that the log area provider was requested once per IUT.")
+        self.assertEqual(FakeProvider.requests.count(("log_area", 1)), 3)
+        self.assertEqual(len(FakeProvider.requests), 4)
+        for iut, suite in checked_out:
+            self.assertEqual(suite["log_area"].iut, iut.id)
+
+    def test_bulk_checkout_mismatch(self) -> None:
+        """Test bulk checkouts where the provider does not return one item per IUT.
+
+        Approval criteria:
+            - Items returned in surplus shall be checked in immediately.
+            - IUTs without an item, when too few are returned, shall be checked out per IUT.
+
+        Test steps::
+            1. Check out environments for 3 IUTs from an execution space provider returning
+               2 items and a log area provider returning 5 items.
+            2. Verify that the last IUT got an execution space from a per-IUT checkout.
+            3. Verify that the surplus log areas were checked in.
+        """
+        provider = self.environment_provider(
+            {"id": "execution_space", "type": "external", "amount": 2},
+            {"id": "log_area", "type": "external", "amount": 5},
+        )
+        iuts = {Iut(id=str(index)): {} for index in range(3)}
+
+        self.logger.info(
+            "STEP: Check out environments for 3 IUTs from an execution space provider "
+            "returning 2 items and a log area provider returning 5 items."
+        )
+        checked_out = dict(provider.checkout_executors_and_log_areas("runner", iuts))
+
+        self.logger.info(
+            "STEP: Verify that the last IUT got an execution space from a per-IUT checkout."
+        )
+        self.assertEqual(len(checked_out), 3)
+        self.assertEqual(
+            FakeProvider.requests.count(("execution_space", 1)), 1, FakeProvider.requests
+        )
+        last = list(iuts)[-1]
+        self.assertEqual(checked_out[last]["executor"].iut, last.id)
+        self.assertIsNone(checked_out[list(iuts)[0]]["executor"].iut)
+
+        self.logger.info("STEP: Verify that the surplus log areas were checked in.")
+        log_areas = [suite["log_area"] for suite in checked_out.values()]
+        surplus = [item for item in FakeProvider.checked_out if isinstance(item, LogArea)]
+        surplus = [item for item in surplus if item not in log_areas]
+        self.assertEqual(len(surplus), 2)
+        self.assertCountEqual(FakeProvider.checked_in, surplus)
+
+    def test_checkout_stopped_early(self) -> None:
+        """Test that checkouts are cancelled and waited for when the caller stops early.
+
+        Approval criteria:
+            - Checkouts that have not started shall be cancelled when the caller stops.
+            - Checkouts in progress shall be finished before the caller continues.
+            - No worker threads shall be left running.
+            - Everything that was checked out shall be checked in by the cleanup.
+
+        Test steps::
+            1. Check out environments for 4 IUTs, 2 at a time, and stop after the first.
+            2. Verify that the checkouts that had not started were cancelled.
+            3. Verify that no worker threads are left running.
+            4. Clean up and verify that everything that was checked out was checked in.
+        """
+        provider = self.environment_provider(
+            {"id": "execution_space", "type": "jsontas", "delay": {"1": 0.3, "2": 0.3, "3": 0.3}},
+            {"id": "log_area", "type": "jsontas"},
+        )
+        provider.etos.config.set("CHECKOUT_CONCURRENCY", 2)
+        iuts = {Iut(id=str(index)): {} for index in range(4)}
+        threads = set(threading.enumerate())
+
+        self.logger.info(
+            "STEP: Check out environments for 4 IUTs, 2 at a time, and stop after the first."
+        )
+        checkouts = provider.checkout_executors_and_log_areas("runner", iuts)
+        iut, _ = next(checkouts)
+        checkouts.close()
+        checked_out = list(FakeProvider.checked_out)
+
+        self.logger.info("STEP: Verify that the checkouts that had not started were cancelled.")
+        self.assertEqual(iut.id, "0")
+        # The worker that checked out the first IUT may have started on the third IUT
+        # before the caller stopped, but the last IUT is never started.
+        self.assertLess(FakeProvider.requests.count(("execution_space", 1)), 4)
+        self.assertEqual(FakeProvider.requests.count(("log_area", 1)), 1)
+        self.assertEqual(len(checked_out), len(FakeProvider.requests))
+
+        self.logger.info("STEP: Verify that no worker threads are left running.")
+        self.assertEqual(set(threading.enumerate()) - threads, set())
+        time.sleep(0.5)
+        self.assertEqual(FakeProvider.checked_out, checked_out)
+
+        self.logger.info(
+            "STEP: Clean up and verify that everything that was checked out was checked in."
+        )
+        provider.cleanup()
+        self.assertCountEqual(FakeProvider.checked_in, checked_out)
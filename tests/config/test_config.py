@@ -0,0 +1,93 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the environment provider configuration."""
+
+import logging
+import os
+import unittest
+
+from etos_lib import ETOS
+from mock import MagicMock, patch
+
+from environment_provider.lib.config import Config
+
+
+class TestConfig(unittest.TestCase):
+    """Test the environment provider configuration."""
+
+    logger = logging.getLogger(__name__)
+
+    @patch("environment_provider.lib.config.EnvironmentRequest")
+    def test_runtime_profile(self, environment_request: MagicMock) -> None:
+        """Test that the runtime profile is only resolved once.
+
+        Approval criteria:
+            - The Kubernetes API shall only be queried once for the runtime profile.
+            - The runtime profile shall not be modifiable.
+
+        Test steps::
+            1. Initialize the configuration as a part of the ETOS controller.
+            2. Check whether the environment provider is running in the ETOS controller.
+            3. Verify that the Kubernetes API was only queried once.
+            4. Verify that the runtime profile cannot be modified.
+        """
+        environment_request.return_value.exists.return_value = True
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+
+        self.logger.info("STEP: Initialize the configuration as a part of the ETOS controller.")
+        with patch.dict(os.environ, {"REQUEST": "my-request"}):
+            config = Config(etos, MagicMock())
+
+        self.logger.info(
+            "STEP: Check whether the environment provider is running in the ETOS controller."
+        )
+        for _ in range(10):
+            self.assertTrue(config.etos_controller)
+        self.assertEqual(config.runtime.request_name, "my-request")
+
+        self.logger.info("STEP: Verify that the Kubernetes API was only queried once.")
+        environment_request.return_value.exists.assert_called_once_with("my-request")
+
+        self.logger.info("STEP: Verify that the runtime profile cannot be modified.")
+        with self.assertRaises(AttributeError):
+            config.runtime.etos_controller = False  # type: ignore
+
+    @patch("environment_provider.lib.config.EnvironmentRequest")
+    def test_runtime_profile_outside_controller(self, environment_request: MagicMock) -> None:
+        """Test that the Kubernetes API is not queried outside of the ETOS controller.
+
+        Approval criteria:
+            - The Kubernetes API shall not be queried if no request is given.
+
+        Test steps::
+            1. Initialize the configuration without a request.
+            2. Verify that the environment provider is not running in the ETOS controller.
+            3. Verify that the Kubernetes API was not queried.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+
+        self.logger.info("STEP: Initialize the configuration without a request.")
+        with patch.dict(os.environ):
+            os.environ.pop("REQUEST", None)
+            config = Config(etos, MagicMock())
+
+        self.logger.info(
+            "STEP: Verify that the environment provider is not running in the ETOS controller."
+        )
+        self.assertFalse(config.etos_controller)
+
+        self.logger.info("STEP: Verify that the Kubernetes API was not queried.")
+        environment_request.assert_not_called()
@@ -0,0 +1,301 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests and benchmarks for the data objects of checked out provider items."""
+
+import logging
+import pickle
+import time
+import tracemalloc
+import unittest
+from copy import copy, deepcopy
+from typing import Any, Callable
+
+from packageurl import PackageURL
+
+from execution_space_provider.execution_space import ExecutionSpace
+from iut_provider.iut import Iut
+
+OBJECTS = 10000
+
+
+class DoubleStoredIut:
+    """IUT that stores every value both as an attribute and in a dictionary.
+
+    This is the layout that the IUT, execution space and log area data objects used to have
+    and is used as a reference in the benchmarks.
+    """
+
+    _iut_dictionary = None
+
+    def __init__(self, **iut: Any) -> None:
+        """Take a dictionary as input and setattr on instance.
+
+        :param iut: Dictionary to set attributes from.
+        """
+        self._iut_dictionary = iut
+        for key, value in iut.items():
+            setattr(self, key, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set IUT parameters to dict and object.
+
+        :param name: Name of parameter to set.
+        :param value: Value of parameter.
+        """
+        if self._iut_dictionary is not None:
+            self._iut_dictionary[name] = value
+        super().__setattr__(name, value)
+
+    @property
+    def as_dict(self) -> dict:
+        """Represent IUT as dictionary.
+
+        :return: IUT dictionary.
+        """
+        iut_dictionary = deepcopy(self._iut_dictionary)
+        if iut_dictionary.get("identity") and not isinstance(iut_dictionary.get("identity"), str):
+            iut_dictionary["identity"] = iut_dictionary["identity"].to_string()
+        return iut_dictionary
+
+
+def create(cls: Callable, identity: PackageURL) -> list:
+    """Create data objects, like an IUT provider checking out IUTs.
+
+    :param cls: Data object class to create.
+    :param identity: Identity of the IUTs.
+    :return: The created data objects.
+    """
+    return [
+        cls(
+            identity=identity,
+            provider_id="provider",
+            test_id=str(index),
+            checkout={"id": str(index), "host": "lab.example.com"},
+        )
+        for index in range(OBJECTS)
+    ]
+
+
+def measure_memory(cls: Callable, identity: PackageURL) -> int:
+    """Measure the memory, in bytes, that data objects allocate.
+
+    :param cls: Data object class to measure.
+    :param identity: Identity of the IUTs.
+    :return: Bytes allocated for the data objects.
+    """
+    tracemalloc.start()
+    try:
+        objects = create(cls, identity)
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(objects) == OBJECTS
+    return allocated
+
+
+def measure_as_dict(objects: list) -> float:
+    """Measure the time, in seconds, to represent data objects as dictionaries.
+
+    Every object is represented 5 times, like when it is added to a sub suite, to tracing
+    attributes and checked in.
+
+    :param objects: Data objects to represent as dictionaries.
+    :return: Seconds taken.
+    """
+    start = time.perf_counter()
+    for _ in range(5):
+        for data_object in objects:
+            _ = data_object.as_dict
+    return time.perf_counter() - start
+
+
+class TestDataObject(unittest.TestCase):
+    """Test the data objects of checked out provider items."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_attributes(self) -> None:
+        """Test that data object attributes are backed by their dictionary.
+
+        Approval criteria:
+            - Attributes shall be read from and written to the dictionary.
+            - The dictionary representation shall be recreated when attributes change.
+            - Data objects shall not have an instance dictionary.
+
+        Test steps::
+            1. Create an IUT and set and update its attributes.
+            2. Verify that the attributes were stored in the dictionary representation.
+            3. Verify that the IUT does not have an instance dictionary.
+        """
+        identity = PackageURL.from_string("pkg:testing/etos/iut@1.0")
+
+        self.logger.info("STEP: Create an IUT and set and update its attributes.")
+        iut = Iut(identity=identity, provider_id="provider")
+        before = iut.as_dict
+        iut.test_id = "test"
+        iut.update(checkout={"id": "1"})
+
+        self.logger.info(
+            "STEP: Verify that the attributes were stored in the dictionary representation."
+        )
+        self.assertEqual(iut.test_id, "test")
+        self.assertEqual(iut.checkout, {"id": "1"})
+        self.assertDictEqual(before, {"identity": identity.to_string(), "provider_id": "provider"})
+        self.assertDictEqual(
+            iut.as_dict,
+            {
+                "identity": identity.to_string(),
+                "provider_id": "provider",
+                "test_id": "test",
+                "checkout": {"id": "1"},
+            },
+        )
+        self.assertIsNot(iut.as_dict, iut.as_dict)
+        self.assertIs(iut.identity, identity)
+        with self.assertRaises(AttributeError):
+            _ = iut.missing
+
+        self.logger.info("STEP: Verify that the IUT does not have an instance dictionary.")
+        self.assertFalse(hasattr(iut, "__dict__"))
+        self.assertFalse(hasattr(ExecutionSpace(id="space"), "__dict__"))
+
+    def test_as_dict_not_shared(self) -> None:
+        """Test that changing a dictionary representation does not change the data object.
+
+        Approval criteria:
+            - Every caller shall get a dictionary representation of its own.
+            - Changing a dictionary representation shall not change the data object or the
+              representations given to other callers.
+
+        Test steps::
+            1. Add the dictionary representation of an execution space to a sub suite.
+            2. Change the execution space in the sub suite.
+            3. Verify that the execution space and its representation were not changed.
+        """
+        execution_space = ExecutionSpace(id="space", instructions={"image": "etr"})
+
+        self.logger.info(
+            "STEP: Add the dictionary representation of an execution space to a sub suite."
+        )
+        sub_suite = {"executor": execution_space.as_dict}
+
+        self.logger.info("STEP: Change the execution space in the sub suite.")
+        sub_suite["executor"]["id"] = "changed"
+        sub_suite["executor"]["extra"] = True
+
+        self.logger.info(
+            "STEP: Verify that the execution space and its representation were not changed."
+        )
+        self.assertEqual(execution_space.id, "space")
+        self.assertEqual(execution_space.as_dict, {"id": "space", "instructions": {"image": "etr"}})
+
+    def test_copy(self) -> None:
+        """Test that copies of data objects do not share their dictionary.
+
+        Approval criteria:
+            - A deep copy of a data object shall not change the original.
+
+        Test steps::
+            1. Deep copy an execution space and change an attribute of the copy.
+            2. Verify that the original execution space was not changed.
+        """
+        execution_space = ExecutionSpace(id="space", instructions={"image": "etr"})
+
+        self.logger.info("STEP: Deep copy an execution space and change an attribute of the copy.")
+        copied = deepcopy(execution_space)
+        copied.id = "copy"
+
+        self.logger.info("STEP: Verify that the original execution space was not changed.")
+        self.assertEqual(execution_space.id, "space")
+        self.assertEqual(copied.as_dict, {"id": "copy", "instructions": {"image": "etr"}})
+
+    def test_equality(self) -> None:
+        """Test that data objects are equal to their copies, and only to their copies.
+
+        Approval criteria:
+            - Copies and pickled copies of a data object shall be equal to it and have the
+              same hash.
+            - Data objects with the same values shall not be equal.
+            - A shallow copy of a data object shall not share its dictionary.
+
+        Test steps::
+            1. Create two IUTs with the same values and copy them.
+            2. Verify that the copies are equal to, and hash like, their originals.
+            3. Verify that the IUTs are not equal to each other.
+            4. Verify that changing a shallow copy does not change the original.
+        """
+        self.logger.info("STEP: Create two IUTs with the same values and copy them.")
+        first = Iut(provider_id="provider", test_id="test")
+        second = Iut(provider_id="provider", test_id="test")
+        copies = deepcopy([first, second])
+        pickled = pickle.loads(pickle.dumps(first))
+        shallow = copy(first)
+
+        self.logger.info(
+            "STEP: Verify that the copies are equal to, and hash like, their originals."
+        )
+        self.assertEqual(copies, [first, second])
+        self.assertEqual({first: "first", second: "second"}[copies[1]], "second")
+        self.assertEqual(pickled, first)
+        self.assertEqual(hash(pickled), hash(first))
+        self.assertEqual(shallow, first)
+
+        self.logger.info("STEP: Verify that the IUTs are not equal to each other.")
+        self.assertNotEqual(first, second)
+        self.assertNotEqual(Iut(**first.as_dict), first)
+
+        self.logger.info("STEP: Verify that changing a shallow copy does not change the original.")
+        shallow.test_id = "changed"
+        self.assertEqual(first.test_id, "test")
+
+    def test_benchmark(self) -> None:
+        """Benchmark memory and CPU usage of 10000 data objects.
+
+        Approval criteria:
+            - Data objects shall use less memory than objects storing every value twice.
+
+        Test steps::
+            1. Measure the memory used by 10000 IUTs and double stored IUTs.
+            2. Measure the time to represent 10000 IUTs and double stored IUTs as dictionaries.
+            3. Verify that the IUTs used less memory.
+
+        The times are only logged, since wall-clock comparisons are unreliable on loaded
+        machines.
+        """
+        identity = PackageURL.from_string("pkg:testing/etos/iut@1.0")
+
+        self.logger.info("STEP: Measure the memory used by 10000 IUTs and double stored IUTs.")
+        compact_memory = measure_memory(Iut, identity)
+        double_memory = measure_memory(DoubleStoredIut, identity)
+        self.logger.info(
+            "Memory per object: %d bytes compact, %d bytes double stored",
+            compact_memory // OBJECTS,
+            double_memory // OBJECTS,
+        )
+
+        self.logger.info(
+            "STEP: Measure the time to represent 10000 IUTs and double stored IUTs as dictionaries."
+        )
+        compact_time = measure_as_dict(create(Iut, identity))
+        double_time = measure_as_dict(create(DoubleStoredIut, identity))
+        self.logger.info(
+            "Time to represent as dictionaries: %.3fs compact, %.3fs double stored",
+            compact_time,
+            double_time,
+        )
+
+        self.logger.info("STEP: Verify that the IUTs used less memory.")
+        self.assertLess(compact_memory, double_memory)
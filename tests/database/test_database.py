@@ -0,0 +1,273 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the environment provider database layer."""
+
+import base64
+import json
+import logging
+import os
+import unittest
+
+import requests
+from etcd3gw import client
+from etos_lib.lib.config import Config
+from mock import MagicMock, patch
+
+from environment_provider.lib.database import Database, ETCDPath
+from tests.library.fake_database import FakeDatabase
+
+
+class TestDatabase(unittest.TestCase):
+    """Test the environment provider database layer."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_shared_database(self) -> None:
+        """Test that ETCD paths share a single database layer.
+
+        Approval criteria:
+            - ETCD paths shall share the database layer of the configured database.
+            - A new database layer shall be used if the configured database is replaced.
+
+        Test steps::
+            1. Create ETCD paths and join them with other paths.
+            2. Verify that all paths share the same database layer.
+            3. Replace the configured database.
+            4. Verify that new paths use a new database layer.
+        """
+        database = FakeDatabase()
+        Config().set("database", database)
+
+        self.logger.info("STEP: Create ETCD paths and join them with other paths.")
+        first = ETCDPath("/testrun/id")
+        second = ETCDPath("/environment")
+        joined = first.join("provider").join("iut")
+
+        self.logger.info("STEP: Verify that all paths share the same database layer.")
+        self.assertIs(first.database, second.database)
+        self.assertIs(first.database, joined.database)
+        self.assertIs(first.database.client, database)
+
+        self.logger.info("STEP: Replace the configured database.")
+        Config().set("database", FakeDatabase())
+
+        self.logger.info("STEP: Verify that new paths use a new database layer.")
+        self.assertIsNot(ETCDPath("/testrun/id").database, first.database)
+
+    def test_latency(self) -> None:
+        """Test that the latency of database operations is recorded.
+
+        Approval criteria:
+            - The latency of each type of database operation shall be recorded.
+
+        Test steps::
+            1. Write, read and delete ETCD paths.
+            2. Verify that the latency of each operation was recorded.
+        """
+        Config().set("database", FakeDatabase())
+        path = ETCDPath("/testrun/id")
+
+        self.logger.info("STEP: Write, read and delete ETCD paths.")
+        for index in range(3):
+            path.join(str(index)).write("value")
+        self.assertEqual(path.join("0").read(), b"value")
+        self.assertEqual(len(path.read_all()), 3)
+        path.delete_all()
+
+        self.logger.info("STEP: Verify that the latency of each operation was recorded.")
+        latency = path.database.latency
+        self.assertEqual(latency["put"]["count"], 3)
+        self.assertEqual(latency["get"]["count"], 1)
+        self.assertEqual(latency["get_prefix"]["count"], 1)
+        self.assertEqual(latency["delete_prefix"]["count"], 1)
+        self.assertGreaterEqual(latency["put"]["max"], latency["put"]["mean"])
+
+    def test_connect(self) -> None:
+        """Test that the ETCD client is connected with a pooled session.
+
+        Approval criteria:
+            - The ETCD client shall use a pooled session with configured size and timeouts.
+
+        Test steps::
+            1. Connect an ETCD client with a configured pool size and timeouts.
+            2. Verify that the client uses the configured pool size and timeouts.
+        """
+        self.logger.info("STEP: Connect an ETCD client with a configured pool size and timeouts.")
+        environment = {
+            "ETOS_ETCD_POOL_SIZE": "4",
+            "ETOS_ETCD_CONNECT_TIMEOUT": "2",
+            "ETOS_ETCD_READ_TIMEOUT": "20",
+        }
+        with patch.dict(os.environ, environment):
+            database = Database.connect()
+
+        self.logger.info("STEP: Verify that the client uses the configured pool size and timeouts.")
+        self.assertEqual(database.timeout, (2.0, 20.0))
+        adapter = database.session.get_adapter("http://etcd-client:2379")
+        self.assertEqual(adapter._pool_maxsize, 4)  # pylint:disable=protected-access
+
+    def test_watch_session(self) -> None:
+        """Test that watches do not use the pooled session of the ETCD client.
+
+        Approval criteria:
+            - Watches shall be streamed over an HTTP session of their own.
+            - The watch session shall be reused by all watches.
+            - The watch session shall verify and authenticate like the pooled session.
+
+        Test steps::
+            1. Watch two keys with a database layer of an ETCD client.
+            2. Verify that both watches used the same session, which is not the pooled one.
+            3. Verify that the watch session has the certificates of the pooled session.
+        """
+        etcd = client(host="localhost", api_path="/v3/", ca_cert="/ca.crt")
+        database = Database(etcd)
+
+        self.logger.info("STEP: Watch two keys with a database layer of an ETCD client.")
+        with patch.object(requests.Session, "post", autospec=True) as post:
+            post.return_value = MagicMock(iter_content=MagicMock(return_value=iter([])))
+            _, cancel = database.watch("/testrun/first")
+            cancel()
+            _, cancel = ETCDPath("/testrun/second", database=database).watch_all()
+            cancel()
+
+        self.logger.info(
+            "STEP: Verify that both watches used the same session, which is not the pooled one."
+        )
+        sessions = [call.args[0] for call in post.call_args_list]
+        self.assertEqual(len(sessions), 2)
+        self.assertIs(sessions[0], sessions[1])
+        self.assertIsNot(sessions[0], etcd.session)
+
+        self.logger.info(
+            "STEP: Verify that the watch session has the certificates of the pooled session."
+        )
+        self.assertEqual(sessions[0].verify, "/ca.crt")
+
+    def test_transaction(self) -> None:
+        """Test that writes and deletes in a transaction are committed together.
+
+        Approval criteria:
+            - Writes and deletes in a transaction shall be committed in a single transaction.
+            - Writes and deletes in a transaction shall be discarded on exceptions.
+
+        Test steps::
+            1. Write and delete ETCD paths in a transaction.
+            2. Verify that nothing was written before the transaction was committed.
+            3. Verify that everything was written in a single transaction.
+            4. Write ETCD paths in a transaction that raises an exception.
+            5. Verify that nothing was written.
+        """
+        database = FakeDatabase()
+        Config().set("database", database)
+        testrun = ETCDPath("/testrun/id")
+        testrun.join("suite/old/subsuite/1").write("old")
+        testrun.join("suite/old/subsuite/2").write("old")
+
+        self.logger.info("STEP: Write and delete ETCD paths in a transaction.")
+        with testrun.transaction() as batch:
+            batch.join("provider/iut").write("iut")
+            batch.join("provider/log-area").write("log-area")
+            batch.join("suite/old").delete_all()
+
+            self.logger.info(
+                "STEP: Verify that nothing was written before the transaction was committed."
+            )
+            self.assertIsNone(testrun.join("provider/iut").read())
+            self.assertEqual(len(testrun.join("suite").read_all()), 2)
+
+        self.logger.info("STEP: Verify that everything was written in a single transaction.")
+        self.assertEqual(testrun.join("provider/iut").read(), b"iut")
+        self.assertEqual(testrun.join("provider/log-area").read(), b"log-area")
+        self.assertListEqual(testrun.join("suite").read_all(), [])
+        self.assertEqual(testrun.database.latency["transaction"]["count"], 1)
+
+        self.logger.info("STEP: Write ETCD paths in a transaction that raises an exception.")
+        with self.assertRaises(RuntimeError):
+            with testrun.transaction() as batch:
+                batch.join("provider/execution-space").write("execution-space")
+                raise RuntimeError("Failed to configure testrun")
+
+        self.logger.info("STEP: Verify that nothing was written.")
+        self.assertIsNone(testrun.join("provider/execution-space").read())
+
+    def test_read_keys(self) -> None:
+        """Test that keys are read with a range request the ETCD gateway accepts.
+
+        Approval criteria:
+            - The key and range end of a key request shall be base64 encoded once.
+            - The limit of a key request shall only be sent when it is set.
+
+        Test steps::
+            1. Read the keys below an ETCD path with a database layer of an ETCD client.
+            2. Verify that the key and range end were encoded and that no limit was sent.
+            3. Check whether any key exists below the ETCD path.
+            4. Verify that a limit was sent.
+        """
+        etcd = client(host="localhost", api_path="/v3/")
+        path = ETCDPath("/testrun/id", database=Database(etcd))
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "kvs": [{"key": base64.b64encode(b"/testrun/id/suite/1").decode()}]
+        }
+
+        self.logger.info(
+            "STEP: Read the keys below an ETCD path with a database layer of an ETCD client."
+        )
+        with patch.object(requests.Session, "post", autospec=True) as post:
+            post.return_value = response
+            keys = path.read_keys()
+        self.assertListEqual(keys, ["/testrun/id/suite/1"])
+
+        self.logger.info(
+            "STEP: Verify that the key and range end were encoded and that no limit was sent."
+        )
+        payload = post.call_args.kwargs["json"]
+        json.dumps(payload)
+        self.assertEqual(payload["key"], base64.b64encode(b"/testrun/id").decode())
+        self.assertEqual(payload["range_end"], base64.b64encode(b"/testrun/ie").decode())
+        self.assertTrue(payload["keys_only"])
+        self.assertNotIn("limit", payload)
+
+        self.logger.info("STEP: Check whether any key exists below the ETCD path.")
+        with patch.object(requests.Session, "post", autospec=True) as post:
+            post.return_value = response
+            self.assertTrue(path.exists_all())
+
+        self.logger.info("STEP: Verify that a limit was sent.")
+        self.assertEqual(post.call_args.kwargs["json"]["limit"], 1)
+
+    def test_delete_if_exists(self) -> None:
+        """Test that a path is deleted by only one of several callers deleting it.
+
+        Approval criteria:
+            - Deleting an existing path shall report that it was deleted.
+            - Deleting a path that no longer exists shall report that it was not deleted.
+
+        Test steps::
+            1. Write a path and delete it, if it exists, twice.
+            2. Verify that only the first delete reported that it deleted the path.
+        """
+        path = ETCDPath("/testrun/id/flag", database=Database(FakeDatabase()))
+
+        self.logger.info("STEP: Write a path and delete it, if it exists, twice.")
+        path.write("true")
+        deleted = [path.delete_if_exists(), path.delete_if_exists()]
+
+        self.logger.info(
+            "STEP: Verify that only the first delete reported that it deleted the path."
+        )
+        self.assertListEqual(deleted, [True, False])
+        self.assertIsNone(path.read())
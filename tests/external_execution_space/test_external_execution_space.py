@@ -17,10 +17,12 @@
 
 import logging
 import os
+import time
 import unittest
 
 from etos_lib import ETOS
 from jsontas.jsontas import JsonTas
+from mock import patch
 from packageurl import PackageURL
 from requests.exceptions import RetryError
 
@@ -31,7 +33,7 @@ from execution_space_provider.exceptions import (
 )
 from execution_space_provider.execution_space import ExecutionSpace
 from execution_space_provider.utilities.external_provider import ExternalProvider
-from tests.library.fake_server import FakeServer
+from tests.library.fake_server import FakeServer, LongPollHandler
 
 
 class TestExternalExecutionSpace(unittest.TestCase):
@@ -396,6 +398,43 @@ class TestExternalExecutionSpace(unittest.TestCase):
             self.logger.info("STEP: Verify that the wait method waits on PENDING.")
             self.assertEqual(server.nbr_of_requests, len(responses))
 
+    def test_provider_status_long_poll(self):
+        """Test that the wait method long-polls providers that advertise it.
+
+        Approvial criteria:
+            - The status requests shall ask the provider to hold the request.
+            - The wait method shall not sleep between held status requests.
+
+        Test steps::
+            1. Initialize an external provider that advertises long-polling.
+            2. Send status requests until the execution space provider is DONE.
+            3. Verify that the status requests were long-polls, sent back to back.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        etos.config.set("WAIT_FOR_EXECUTION_SPACE_TIMEOUT", 20)
+        responses = [{"status": "PENDING"}, {"status": "DONE"}]
+        with FakeServer("ok", responses.copy(), LongPollHandler) as server:
+            ruleset = {
+                "id": "test_provider_status_long_poll",
+                "status": {"host": server.host, "protocol": "long-poll", "wait": 5},
+            }
+            self.logger.info("STEP: Initialize an external provider that advertises long-polling.")
+            provider = ExternalProvider(etos, JsonTas(), ruleset)
+            self.logger.info(
+                "STEP: Send status requests until the execution space provider is DONE."
+            )
+            with patch("environment_provider.lib.provider_session.time", wraps=time) as clock:
+                provider.wait("1")
+            # Close the kept alive connection so that the fake server can shut down.
+            provider.http.poolmanager.clear()
+
+        self.logger.info("STEP: Verify that the status requests were long-polls, back to back.")
+        self.assertEqual(server.nbr_of_requests, len(responses))
+        for path in server.requests:
+            self.assertIn("wait=5s", path)
+        # The held request took longer than the poll interval, so there was nothing to wait for.
+        clock.sleep.assert_called_once_with(0.0)
+
     def test_provider_status_failed(self):
         """Test that the wait method raises ExecutionSpaceCheckoutFailed on FAILED status.
 
@@ -0,0 +1,210 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for concurrent checkout and checkin of JSONTas providers."""
+
+import logging
+import time
+import unittest
+from threading import Barrier
+
+from jsontas.jsontas import JsonTas
+from mock import patch
+
+from execution_space_provider.exceptions import ExecutionSpaceCheckoutFailed
+from execution_space_provider.execution_space import ExecutionSpace
+from execution_space_provider.utilities.checkin import Checkin
+from execution_space_provider.utilities.checkout import Checkout
+
+
+def slow_run(self: JsonTas, json_data: dict):
+    """Fake a JSONTas ruleset taking 0.5s, like an HTTP request to a lab inventory system."""
+    time.sleep(0.5)
+    execution_space = self.dataset.get("execution_space")
+    if execution_space.id in json_data.get("fail", []):
+        return json_data.get("refusal", f"Inventory refused {execution_space.id}")
+    return {"checked": execution_space.id}
+
+
+def concurrent_run(barrier: Barrier):
+    """Fake JSONTas rulesets that wait for each other, so that they all run at the same time."""
+
+    def run(self: JsonTas, json_data: dict):
+        barrier.wait()
+        return slow_run(self, json_data)
+
+    return run
+
+
+class TestJSONTasCheckout(unittest.TestCase):
+    """Test concurrent checkout and checkin of JSONTas providers."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_checkout_concurrently(self) -> None:
+        """Test that execution spaces are checked out concurrently.
+
+        Approval criteria:
+            - The checkout ruleset shall be run for all execution spaces at the same time.
+            - The checked out execution spaces shall keep their order.
+            - Execution spaces that failed checkout shall be removed.
+
+        Test steps::
+            1. Check out 6 execution spaces, 2 failing, with a concurrency of 6.
+            2. Verify that the execution spaces were checked out at the same time.
+            3. Verify that the failed execution spaces were removed, keeping the order.
+        """
+        jsontas = JsonTas()
+        execution_spaces = [ExecutionSpace(id=str(index)) for index in range(6)]
+        checkout = Checkout(jsontas, {"fail": ["1", "4"]}, concurrency=6)
+
+        barrier = Barrier(6, timeout=10)
+
+        self.logger.info("STEP: Check out 6 execution spaces, 2 failing, with a concurrency of 6.")
+        with patch.object(JsonTas, "run", concurrent_run(barrier)):
+            checked_out = checkout.checkout(execution_spaces)
+
+        self.logger.info(
+            "STEP: Verify that the execution spaces were checked out at the same time."
+        )
+        self.assertFalse(barrier.broken)
+
+        self.logger.info("STEP: Verify that the failed execution spaces were removed, in order.")
+        self.assertEqual([space.id for space in checked_out], ["0", "2", "3", "5"])
+        self.assertEqual([space.checked for space in checked_out], ["0", "2", "3", "5"])
+        self.assertEqual(
+            [space.id for space in jsontas.dataset.get("execution_spaces")], ["0", "2", "3", "5"]
+        )
+
+    def test_checkout_all_failed(self) -> None:
+        """Test that a concurrent checkout fails if all execution spaces failed checkout.
+
+        Approval criteria:
+            - The checkout shall raise ExecutionSpaceCheckoutFailed with the reason.
+
+        Test steps::
+            1. Check out 3 execution spaces that all fail, with a concurrency of 3.
+            2. Verify that the checkout failed with the reason of the failure.
+        """
+        execution_spaces = [ExecutionSpace(id=str(index)) for index in range(3)]
+        checkout = Checkout(JsonTas(), {"fail": ["0", "1", "2"]}, concurrency=3)
+
+        self.logger.info("STEP: Check out 3 execution spaces that all fail, concurrency 3.")
+        with patch.object(JsonTas, "run", slow_run):
+            with self.assertRaises(ExecutionSpaceCheckoutFailed) as context:
+                checkout.checkout(execution_spaces)
+
+        self.logger.info("STEP: Verify that the checkout failed with the reason of the failure.")
+        self.assertIn("Inventory refused 0", str(context.exception))
+
+    def test_checkin_all_concurrently(self) -> None:
+        """Test that all execution spaces are checked in concurrently.
+
+        Approval criteria:
+            - The checkin ruleset shall be run for all execution spaces at the same time.
+            - Only execution spaces that were checked in shall be removed from the dataset.
+
+        Test steps::
+            1. Check in 6 execution spaces, 2 failing, with a concurrency of 6.
+            2. Verify that the execution spaces were checked in at the same time.
+            3. Verify that only the failed execution spaces are left in the dataset.
+        """
+        jsontas = JsonTas()
+        jsontas.dataset.add(
+            "execution_spaces", [ExecutionSpace(id=str(index)) for index in range(6)]
+        )
+        checkin = Checkin(jsontas, {"fail": ["1", "4"], "refusal": False}, concurrency=6)
+
+        barrier = Barrier(6, timeout=10)
+
+        self.logger.info("STEP: Check in 6 execution spaces, 2 failing, with a concurrency of 6.")
+        with patch.object(JsonTas, "run", concurrent_run(barrier)):
+            checkin.checkin_all()
+
+        self.logger.info("STEP: Verify that the execution spaces were checked in at the same time.")
+        self.assertFalse(barrier.broken)
+
+        self.logger.info("STEP: Verify that only the failed execution spaces are left.")
+        self.assertEqual(
+            [space.id for space in jsontas.dataset.get("execution_spaces")], ["1", "4"]
+        )
+
+    def test_checkin_copy_once(self) -> None:
+        """Test that a checked out execution space is only checked in once.
+
+        Approval criteria:
+            - Checking in an execution space shall remove its copy from the checked out index.
+            - Checking in an execution space twice shall not run the checkin ruleset again.
+
+        Test steps::
+            1. Check out 3 execution spaces.
+            2. Check in one of the returned execution spaces twice.
+            3. Verify that the checkin ruleset was run once.
+            4. Verify that the execution space was removed from the checked out index.
+        """
+        jsontas = JsonTas()
+        execution_spaces = [ExecutionSpace(id=str(index)) for index in range(3)]
+
+        self.logger.info("STEP: Check out 3 execution spaces.")
+        with patch.object(JsonTas, "run", slow_run):
+            checked_out = Checkout(jsontas, {"fail": []}).checkout(execution_spaces)
+
+        self.logger.info("STEP: Check in one of the returned execution spaces twice.")
+        checkin = Checkin(jsontas, {"fail": []})
+        with patch.object(JsonTas, "run", autospec=True, side_effect=slow_run) as run:
+            checkin.checkin(checked_out[1])
+            checkin.checkin(checked_out[1])
+
+        self.logger.info("STEP: Verify that the checkin ruleset was run once.")
+        self.assertEqual(run.call_count, 1)
+
+        self.logger.info("STEP: Verify that the execution space was removed from the index.")
+        index = jsontas.dataset.get("execution_spaces")
+        self.assertNotIn(checked_out[1], index)
+        self.assertEqual([space.id for space in index], ["0", "2"])
+
+    def test_checkin_all_skips_checked_in(self) -> None:
+        """Test that concurrent checkins skip execution spaces that are already checked in.
+
+        Approval criteria:
+            - Checking in concurrently shall not run the checkin ruleset for an execution
+              space that has already been checked in.
+
+        Test steps::
+            1. Check out 3 execution spaces and check in one of them.
+            2. Check in all execution spaces, and the checked in one again, concurrently.
+            3. Verify that the checkin ruleset was run once for each execution space.
+        """
+        jsontas = JsonTas()
+        execution_spaces = [ExecutionSpace(id=str(index)) for index in range(3)]
+
+        self.logger.info("STEP: Check out 3 execution spaces and check in one of them.")
+        with patch.object(JsonTas, "run", slow_run):
+            checked_out = Checkout(jsontas, {"fail": []}).checkout(execution_spaces)
+        checkin = Checkin(jsontas, {"fail": []}, concurrency=3)
+        with patch.object(JsonTas, "run", autospec=True, side_effect=slow_run) as run:
+            checkin.checkin(checked_out[1])
+
+            self.logger.info(
+                "STEP: Check in all execution spaces, and the checked in one again, concurrently."
+            )
+            checkin.checkin_all()
+            self.assertIsNone(checkin.run_checkin_ruleset(checked_out[1]))
+
+        self.logger.info(
+            "STEP: Verify that the checkin ruleset was run once for each execution space."
+        )
+        self.assertEqual(run.call_count, 3)
+        self.assertEqual(len(jsontas.dataset.get("execution_spaces")), 0)
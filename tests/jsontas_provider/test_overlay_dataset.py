@@ -0,0 +1,143 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for copy-on-write JSONTas datasets."""
+
+import logging
+import unittest
+from collections import OrderedDict
+
+from jsontas.dataset import Dataset
+from jsontas.jsontas import JsonTas
+from mock import patch
+
+from environment_provider.lib.overlay_dataset import (
+    OverlayDataset,
+    check_dataset_dictionary,
+    dataset_dictionary,
+)
+
+
+class TestOverlayDataset(unittest.TestCase):
+    """Test copy-on-write JSONTas datasets."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_overlay_dataset(self) -> None:
+        """Test that overlay datasets share a snapshot and keep additions to themselves.
+
+        Approval criteria:
+            - Rulesets shall be able to look up values from the snapshot and the overlay.
+            - Values in the snapshot shall be shared, not copied.
+            - Values added to an overlay shall not be visible outside of it.
+
+        Test steps::
+            1. Create two overlays on a dataset and add an IUT to each of them.
+            2. Run a ruleset on each overlay.
+            3. Verify that the rulesets could look up values from the snapshot and overlay.
+            4. Verify that the values in the snapshot were shared.
+            5. Verify that the added values were not visible outside of the overlays.
+        """
+        jsontas = JsonTas()
+        tercc = {"meta": {"id": "tercc"}}
+        jsontas.dataset.add("tercc", tercc)
+
+        self.logger.info("STEP: Create two overlays on a dataset and add an IUT to each of them.")
+        snapshot = OverlayDataset.snapshot(jsontas.dataset)
+        first = OverlayDataset(snapshot)
+        first.add("iut", "first")
+        second = OverlayDataset(snapshot)
+        second.add("iut", "second")
+
+        self.logger.info("STEP: Run a ruleset on each overlay.")
+        ruleset = OrderedDict(tercc="$tercc.meta.id", iut="$iut")
+        first_result = JsonTas(dataset=first).run(OrderedDict(ruleset))
+        second_result = JsonTas(dataset=second).run(OrderedDict(ruleset))
+
+        self.logger.info(
+            "STEP: Verify that the rulesets could look up values from the snapshot and overlay."
+        )
+        self.assertDictEqual(dict(first_result), {"tercc": "tercc", "iut": "first"})
+        self.assertDictEqual(dict(second_result), {"tercc": "tercc", "iut": "second"})
+
+        self.logger.info("STEP: Verify that the values in the snapshot were shared.")
+        self.assertIs(first.get("tercc"), tercc)
+        self.assertIs(second.get("tercc"), tercc)
+
+        self.logger.info(
+            "STEP: Verify that the added values were not visible outside of the overlays."
+        )
+        self.assertIsNone(jsontas.dataset.get("iut"))
+        self.assertNotIn("iut", snapshot)
+        self.assertEqual(first.get("iut"), "first")
+        self.assertIsNot(first.copy().get("tercc"), tercc)
+
+    def test_jsontas_dataset_dictionary(self) -> None:
+        """Test that JSONTas datasets still resolve lookups with the dictionary overlays replace.
+
+        Approval criteria:
+            - Values added to a JSONTas dataset shall be stored in its dataset dictionary.
+            - JSONTas lookups shall be resolved using the dataset dictionary.
+            - Objects without a dataset dictionary shall not be accepted.
+
+        Test steps::
+            1. Add a value to a JSONTas dataset.
+            2. Verify that the value was stored in the dataset dictionary.
+            3. Replace the value in the dataset dictionary and run a ruleset.
+            4. Verify that the ruleset looked up the replaced value.
+            5. Verify that objects without a dataset dictionary are not accepted.
+        """
+        dataset = Dataset()
+
+        self.logger.info("STEP: Add a value to a JSONTas dataset.")
+        dataset.add("iut", "added")
+
+        self.logger.info("STEP: Verify that the value was stored in the dataset dictionary.")
+        dictionary = dataset_dictionary(dataset)
+        self.assertEqual(dictionary["iut"], "added")
+
+        self.logger.info("STEP: Replace the value in the dataset dictionary and run a ruleset.")
+        dictionary["iut"] = "replaced"
+        result = JsonTas(dataset=dataset).run(OrderedDict(iut="$iut"))
+
+        self.logger.info("STEP: Verify that the ruleset looked up the replaced value.")
+        self.assertDictEqual(dict(result), {"iut": "replaced"})
+
+        self.logger.info("STEP: Verify that objects without a dataset dictionary are not accepted.")
+        with self.assertRaises(TypeError):
+            dataset_dictionary(JsonTas())
+
+    def test_unsupported_jsontas(self) -> None:
+        """Test that an unsupported JSONTas version is reported when it is checked at import.
+
+        Approval criteria:
+            - A JSONTas dataset without a dataset dictionary shall raise an ImportError that
+              names the problem.
+
+        Test steps::
+            1. Check a JSONTas dataset that does not store its values in a dataset dictionary.
+            2. Verify that an ImportError naming the dataset dictionary was raised.
+        """
+        self.logger.info(
+            "STEP: Check a JSONTas dataset that does not store its values in a dataset dictionary."
+        )
+        with patch.object(Dataset, "__init__", lambda self: None):
+            with self.assertRaises(ImportError) as context:
+                check_dataset_dictionary()
+
+        self.logger.info(
+            "STEP: Verify that an ImportError naming the dataset dictionary was raised."
+        )
+        self.assertIn("_Dataset__dataset", str(context.exception))
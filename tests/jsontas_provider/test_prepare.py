@@ -0,0 +1,282 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for preparing IUTs on the shared thread pool."""
+
+import logging
+import os
+import time
+import unittest
+from threading import Thread
+
+from jsontas.jsontas import JsonTas
+from mock import patch
+
+from iut_provider.iut import Iut
+from iut_provider.utilities.prepare import Prepare
+
+RULESET = {
+    "stages": {
+        "environment_provider": {
+            "steps": {
+                "flash": {"sleep": 0.2},
+                "boot": {"sleep": 0.1},
+            }
+        }
+    }
+}
+
+
+def sleeping_run(self: JsonTas, json_data: dict):  # pylint:disable=unused-argument
+    """Fake a JSONTas preparation step that takes as long as its 'sleep' value."""
+    time.sleep(json_data.get("sleep", 0))
+    return {"done": True}
+
+
+class TestPrepare(unittest.TestCase):
+    """Test preparing IUTs on the shared thread pool."""
+
+    logger = logging.getLogger(__name__)
+
+    def tearDown(self) -> None:
+        """Shut down the preparation thread pool."""
+        Prepare.shutdown()
+
+    def test_prepare_reuses_pool(self) -> None:
+        """Test that the preparation thread pool is reused between preparations.
+
+        Approval criteria:
+            - All preparations shall use the same thread pool until it is shut down.
+            - The duration of each preparation step shall be recorded and logged.
+
+        Test steps::
+            1. Prepare IUTs twice.
+            2. Verify that the same thread pool was used for both preparations.
+            3. Verify that the durations of the preparation steps were recorded and logged.
+            4. Shut down the thread pool and verify that a new one is created.
+        """
+        prepare = Prepare(JsonTas(), RULESET)
+
+        self.logger.info("STEP: Prepare IUTs twice.")
+        with patch.object(JsonTas, "run", sleeping_run):
+            prepare.prepare([Iut(id="0"), Iut(id="1")])
+            pool = Prepare.pool()
+            with self.assertLogs(Prepare.logger, level="INFO") as logs:
+                prepared, failed = prepare.prepare([Iut(id="2")])
+
+        self.logger.info("STEP: Verify that the same thread pool was used for both preparations.")
+        self.assertIs(Prepare.pool(), pool)
+        self.assertEqual([iut.id for iut in prepared], ["2"])
+        self.assertEqual(failed, [])
+
+        self.logger.info(
+            "STEP: Verify that the durations of the preparation steps were recorded and logged."
+        )
+        self.assertEqual(len(prepare.step_durations["flash"]), 3)
+        self.assertEqual(len(prepare.step_durations["boot"]), 3)
+        self.assertGreaterEqual(min(prepare.step_durations["flash"]), 0.2)
+        self.assertTrue(any("Step 'flash' executed 3 times" in line for line in logs.output))
+
+        self.logger.info("STEP: Shut down the thread pool and verify that a new one is created.")
+        Prepare.shutdown()
+        self.assertIsNot(Prepare.pool(), pool)
+
+    def test_prepare_timeout(self) -> None:
+        """Test that an IUT with a hanging preparation step is failed after a timeout.
+
+        Approval criteria:
+            - An IUT that is not prepared within ETOS_PREPARE_TIMEOUT shall be failed.
+            - Other IUTs shall still be prepared.
+            - The timeout shall not include the time an IUT waits for a thread in the pool.
+
+        Test steps::
+            1. Prepare 3 IUTs, with a concurrency of 2, where one of them hangs.
+            2. Verify that the hanging IUT was failed.
+            3. Verify that the other IUTs were prepared.
+        """
+        ruleset = {"stages": {"environment_provider": {"steps": {"flash": {"sleep": 0.7}}}}}
+        iuts = [Iut(id="0"), Iut(id="1"), Iut(id="2")]
+
+        def hanging_run(self: JsonTas, json_data: dict):
+            """Hang the preparation of the IUT with ID '1'."""
+            if self.dataset.get("iut").id == "1":
+                time.sleep(3)
+                return {"done": True}
+            return sleeping_run(self, json_data)
+
+        self.logger.info("STEP: Prepare 3 IUTs, with a concurrency of 2, where one of them hangs.")
+        environ = {"ETOS_PREPARE_TIMEOUT": "1", "ETOS_PREPARE_CONCURRENCY": "2"}
+        with patch.dict(os.environ, environ), patch.object(JsonTas, "run", hanging_run):
+            prepare = Prepare(JsonTas(), ruleset)
+            start = time.monotonic()
+            prepared, failed = prepare.prepare(iuts)
+            duration = time.monotonic() - start
+
+        self.logger.info("STEP: Verify that the hanging IUT was failed.")
+        self.assertEqual([iut.id for iut in failed], ["1"])
+        self.assertLess(duration, 3)
+
+        self.logger.info("STEP: Verify that the other IUTs were prepared.")
+        self.assertEqual(sorted(iut.id for iut in prepared), ["0", "2"])
+
+    def test_prepare_timeout_replaces_pool(self) -> None:
+        """Test that a hung preparation neither keeps its steps nor its pool.
+
+        Approval criteria:
+            - The thread pool shall be replaced when a preparation times out.
+            - Preparations after the timeout shall not wait for the hung preparation.
+            - The remaining steps of a timed out preparation shall not be executed.
+            - A timed out IUT shall not be changed by its hung preparation.
+            - Shutting down shall wait for the hung preparation in the replaced pool.
+
+        Test steps::
+            1. Prepare an IUT, with a concurrency of 1, that hangs in its first step.
+            2. Verify that the thread pool was replaced.
+            3. Prepare another IUT while the first one is still hanging.
+            4. Verify that the other IUT was prepared without waiting for the hung IUT.
+            5. Shut down the preparation thread pools.
+            6. Verify that the remaining steps of the hung IUT were not executed.
+            7. Verify that the timed out IUT was not changed by its hung preparation.
+        """
+
+        def hanging_run(self: JsonTas, json_data: dict):
+            """Hang the first preparation step of the IUT with ID '0'."""
+            if self.dataset.get("iut").id == "0" and json_data.get("sleep") == 0.2:
+                time.sleep(1.5)
+                return {"done": True}
+            return sleeping_run(self, json_data)
+
+        environ = {"ETOS_PREPARE_TIMEOUT": "0.5", "ETOS_PREPARE_CONCURRENCY": "1"}
+        with patch.dict(os.environ, environ), patch.object(JsonTas, "run", hanging_run):
+            self.logger.info(
+                "STEP: Prepare an IUT, with a concurrency of 1, that hangs in its first step."
+            )
+            hung = Prepare(JsonTas(), RULESET)
+            pool = Prepare.pool()
+            _, failed = hung.prepare([Iut(id="0")])
+            self.assertEqual([iut.id for iut in failed], ["0"])
+
+            self.logger.info("STEP: Verify that the thread pool was replaced.")
+            self.assertIsNot(Prepare.pool(), pool)
+
+            self.logger.info("STEP: Prepare another IUT while the first one is still hanging.")
+            start = time.monotonic()
+            prepared, _ = Prepare(JsonTas(), RULESET).prepare([Iut(id="1")])
+            duration = time.monotonic() - start
+
+        self.logger.info(
+            "STEP: Verify that the other IUT was prepared without waiting for the hung IUT."
+        )
+        self.assertEqual([iut.id for iut in prepared], ["1"])
+        self.assertLess(duration, 0.9)
+
+        self.logger.info("STEP: Shut down the preparation thread pools.")
+        Prepare.shutdown()
+
+        self.logger.info("STEP: Verify that the remaining steps of the hung IUT were not executed.")
+        self.assertEqual(len(hung.step_durations["flash"]), 1)
+        self.assertNotIn("boot", hung.step_durations)
+
+        self.logger.info(
+            "STEP: Verify that the timed out IUT was not changed by its hung preparation."
+        )
+        self.assertFalse(hasattr(failed[0], "flash"))
+
+    def test_shutdown_is_process_wide(self) -> None:
+        """Test that shutting down the preparation thread pool affects every preparation.
+
+        Approval criteria:
+            - All preparations in the process shall share the same thread pool.
+            - Shutting down the thread pool shall abandon the preparations of every caller.
+            - Preparations after the shutdown shall use a new thread pool.
+
+        Test steps::
+            1. Start preparing an IUT with one preparation handler.
+            2. Shut down the thread pool from another preparation handler.
+            3. Verify that the running preparation was abandoned.
+            4. Verify that the other handler prepares IUTs on a new thread pool.
+        """
+        results = {}
+
+        def prepare_in_thread(prepare: Prepare) -> None:
+            """Prepare an IUT, storing the result."""
+            results["prepared"], results["failed"] = prepare.prepare([Iut(id="0")])
+
+        environ = {"ETOS_PREPARE_TIMEOUT": "1"}
+        with patch.dict(os.environ, environ), patch.object(JsonTas, "run", sleeping_run):
+            self.logger.info("STEP: Start preparing an IUT with one preparation handler.")
+            first = Prepare(JsonTas(), RULESET)
+            second = Prepare(JsonTas(), RULESET)
+            pool = Prepare.pool()
+            thread = Thread(target=prepare_in_thread, args=(first,))
+            thread.start()
+            time.sleep(0.1)
+
+            self.logger.info("STEP: Shut down the thread pool from another preparation handler.")
+            second.shutdown()
+            thread.join()
+
+            self.logger.info("STEP: Verify that the running preparation was abandoned.")
+            self.assertEqual([iut.id for iut in results["failed"]], ["0"])
+
+            self.logger.info(
+                "STEP: Verify that the other handler prepares IUTs on a new thread pool."
+            )
+            prepared, _ = second.prepare([Iut(id="1")])
+            self.assertIsNot(Prepare.pool(), pool)
+            self.assertEqual([iut.id for iut in prepared], ["1"])
+
+    def test_prepare_timeout_moves_queued_iuts(self) -> None:
+        """Test that IUTs waiting for a thread in a retired pool are moved to a new pool.
+
+        Approval criteria:
+            - IUTs queued behind a hung preparation shall be prepared on the new pool.
+            - IUTs moved to the new pool shall not also be prepared on the retired pool.
+
+        Test steps::
+            1. Prepare 2 IUTs, with a concurrency of 1, where the first one hangs.
+            2. Verify that the queued IUT was prepared without waiting for the hung IUT.
+            3. Verify that the queued IUT was only prepared once.
+        """
+
+        def hanging_run(self: JsonTas, json_data: dict):
+            """Hang the first preparation step of the IUT with ID '0'."""
+            if self.dataset.get("iut").id == "0" and json_data.get("sleep") == 0.2:
+                time.sleep(3)
+                return {"done": True}
+            return sleeping_run(self, json_data)
+
+        self.logger.info(
+            "STEP: Prepare 2 IUTs, with a concurrency of 1, where the first one hangs."
+        )
+        environ = {"ETOS_PREPARE_TIMEOUT": "0.5", "ETOS_PREPARE_CONCURRENCY": "1"}
+        with patch.dict(os.environ, environ), patch.object(JsonTas, "run", hanging_run):
+            prepare = Prepare(JsonTas(), RULESET)
+            start = time.monotonic()
+            # IUTs are prepared in reverse order, so the IUT with ID '0' is started first.
+            prepared, failed = prepare.prepare([Iut(id="1"), Iut(id="0")])
+            duration = time.monotonic() - start
+
+            self.logger.info(
+                "STEP: Verify that the queued IUT was prepared without waiting for the hung IUT."
+            )
+            self.assertEqual([iut.id for iut in failed], ["0"])
+            self.assertEqual([iut.id for iut in prepared], ["1"])
+            self.assertLess(duration, 2.5)
+
+            self.logger.info("STEP: Verify that the queued IUT was only prepared once.")
+            time.sleep(max(0, 3.2 - duration))
+        self.assertEqual(len(prepare.step_durations["boot"]), 1)
+        self.assertEqual(len(prepare.step_durations["flash"]), 2)
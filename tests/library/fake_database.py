@@ -15,6 +15,7 @@
 # limitations under the License.
 """Fake database library helpers."""
 
+import base64
 from queue import Queue
 from threading import Event, RLock, Timer
 from typing import Any, Iterator, Optional
@@ -35,6 +36,8 @@ class FakeDatabase:
         self.expire = []
         self.leases = {}
         self.watchers = []
+        self.revision = 0
+        self.revisions = {}
 
     def __call__(self):
         """Database instantiation faker."""
@@ -49,8 +52,11 @@ class FakeDatabase:
             canceled.set()
             queue.put(None)
 
+        # Register the watcher right away, like the etcd client does, so that no events
+        # are missed between watching and iterating.
+        self.watchers.append(queue)
+
         def iterator():
-            self.watchers.append(queue)
             try:
                 while not canceled.is_set():
                     event = queue.get()
@@ -78,7 +84,16 @@ class FakeDatabase:
                 timer.daemon = True
                 timer.start()
             self.db_dict[item].append(str(value).encode())
-        self.__event({"kv": {"key": item.encode(), "value": str(value).encode()}})
+            self.revision += 1
+            self.revisions[item] = self.revision
+            event = {
+                "kv": {
+                    "key": item.encode(),
+                    "value": str(value).encode(),
+                    "mod_revision": str(self.revision),
+                }
+            }
+        self.__event(event)
 
     def lease(self, ttl=30) -> Lease:
         """Create a lease."""
@@ -89,12 +104,37 @@ class FakeDatabase:
         # etcd server.
         return Lease(len(self.expire) - 1)
 
-    def get(self, path: str) -> list[bytes]:
+    def get(self, path: str, metadata: bool = False) -> list:
         """Get an item from database."""
         if isinstance(path, bytes):
             path = path.decode()
         with self.lock:
-            return list(reversed(self.db_dict.get(path, [])))
+            values = list(reversed(self.db_dict.get(path, [])))
+            if metadata:
+                return [
+                    (value, {"key": path.encode(), "mod_revision": str(self.revisions[path])})
+                    for value in values
+                ]
+            return values
+
+    def get_url(self, path: str) -> str:
+        """Get the URL of a request to the ETCD gRPC gateway."""
+        return f"/v3/{path.lstrip('/')}"
+
+    def post(self, url: str, json: Optional[dict] = None) -> dict:
+        """Process a range request, base64 encoded like the ETCD gRPC gateway expects it."""
+        assert url == self.get_url("/kv/range"), f"Unsupported request {url!r}"
+        key = base64.b64decode(json["key"], validate=True).decode()
+        range_end = base64.b64decode(json["range_end"], validate=True).decode()
+        with self.lock:
+            keys = sorted(path for path in self.db_dict if key <= path < range_end)
+        kvs = []
+        for path in keys[: json.get("limit")]:
+            kv = {"key": base64.b64encode(path.encode()).decode()}
+            if not json.get("keys_only", False):
+                kv["value"] = base64.b64encode(self.db_dict[path][-1]).decode()
+            kvs.append(kv)
+        return {"kvs": kvs} if kvs else {}
 
     def get_prefix(self, prefix: str) -> list[tuple[bytes, dict]]:
         """Get items based on prefix."""
@@ -111,10 +151,16 @@ class FakeDatabase:
         """Delete a single item."""
         with self.lock:
             del self.db_dict[path]
+            del self.revisions[path]
             if self.leases.get(path):
                 self.expire.pop(self.leases.get(path).id)
                 del self.leases[path]
-        self.__event({"kv": {"key": path.encode()}, "type": "DELETE"})
+            self.revision += 1
+            event = {
+                "kv": {"key": path.encode(), "mod_revision": str(self.revision)},
+                "type": "DELETE",
+            }
+        self.__event(event)
 
     def delete_prefix(self, prefix: str) -> None:
         """Delete items based on prefix."""
@@ -123,3 +169,33 @@ class FakeDatabase:
         for key in db_dict:
             if key.startswith(prefix):
                 self.delete(key)
+
+    def transaction(self, txn: dict) -> dict:
+        """Process put and delete requests of a transaction, if its key existence compares hold."""
+        with self.lock:
+            succeeded = all(
+                base64.b64decode(compare["key"]).decode() in self.db_dict
+                for compare in txn.get("compare", [])
+                if compare.get("target") == "CREATE" and compare.get("result") == "GREATER"
+            )
+            for request in txn.get("success" if succeeded else "failure", []):
+                if "request_put" in request:
+                    put = request["request_put"]
+                    lease = put.get("lease")
+                    self.put(
+                        base64.b64decode(put["key"]).decode(),
+                        base64.b64decode(put["value"]).decode(),
+                        None if lease is None else Lease(lease, client=self),
+                    )
+                elif "request_delete_range" in request:
+                    delete = request["request_delete_range"]
+                    key = base64.b64decode(delete["key"]).decode()
+                    if delete.get("range_end") is None:
+                        if key in self.db_dict:
+                            self.delete(key)
+                        continue
+                    range_end = base64.b64decode(delete["range_end"]).decode()
+                    for path in list(self.db_dict):
+                        if key <= path < range_end:
+                            self.delete(path)
+        return {"succeeded": succeeded}
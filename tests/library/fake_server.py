@@ -18,6 +18,7 @@
 import json
 import logging
 import socket
+import time
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from threading import Thread
 
@@ -68,6 +69,38 @@ class Handler(BaseHTTPRequestHandler):
         self.do()
 
 
+class KeepAliveHandler(Handler):
+    """HTTP handler for the fake HTTP server, keeping connections alive."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do(self):
+        """Handle fake requests to server, responding with a content length."""
+        response = self.response_json
+        if isinstance(self.response_json, list):
+            response = self.response_json.pop(0)
+        self.parent.store_request(self.path)
+        content = json.dumps(response).encode("utf-8")
+        self.send_response(requests.codes[self.response_code])
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class LongPollHandler(KeepAliveHandler):
+    """HTTP handler for the fake HTTP server, holding PENDING responses like a long-poll."""
+
+    hold = 2.5
+
+    def do(self):
+        """Hold the request for a while if the response is not DONE."""
+        response = self.response_json[0] if isinstance(self.response_json, list) else {}
+        if response.get("status") == "PENDING":
+            time.sleep(self.hold)
+        super().do()
+
+
 class FakeServer:
     """A fake server implementation for use in tests."""
 
@@ -0,0 +1,145 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for uploading logs to a log area."""
+
+import gzip
+import json
+import logging
+import os
+import unittest
+from http.server import BaseHTTPRequestHandler
+from tempfile import TemporaryDirectory
+
+from etos_lib import ETOS
+
+from environment_provider.lib.log_area import LogArea
+from tests.library.fake_server import FakeServer
+
+# pylint:disable=invalid-name
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    """HTTP handler storing the headers and decoded body of uploads."""
+
+    parent = None
+
+    def read_body(self) -> bytes:
+        """Read the body of a request, with or without chunked transfer encoding."""
+        if self.headers.get("Content-Length") is not None:
+            return self.rfile.read(int(self.headers["Content-Length"]))
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            if size == 0:
+                self.rfile.readline()
+                return body
+            body += self.rfile.read(size)
+            self.rfile.readline()
+
+    def do_PUT(self):
+        """Handle PUT requests."""
+        body = self.read_body()
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        self.parent.store_request((dict(self.headers), body))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+
+class TestLogArea(unittest.TestCase):
+    """Test uploading logs to a log area."""
+
+    logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def sub_suite(host: str, compress: bool = False) -> dict:
+        """Create a sub suite with a log area uploading to host."""
+        return {
+            "name": "Sub suite",
+            "log_area": {
+                "upload": {
+                    "url": f"{host}/{{main_suite_id}}/{{sub_suite_id}}/{{name}}",
+                    "method": "PUT",
+                    "compress": compress,
+                }
+            },
+        }
+
+    def test_upload(self) -> None:
+        """Test that logs can be uploaded from a file, from bytes and from chunks.
+
+        Approval criteria:
+            - It shall be possible to upload a log from a file, from bytes and from chunks.
+
+        Test steps::
+            1. Upload a log from a file, from bytes and from chunks.
+            2. Verify that the same log was uploaded from all sources.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        log = json.dumps({"recipes": [{"id": str(index)} for index in range(1000)]}).encode()
+
+        with FakeServer(None, None, UploadHandler) as server, TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "log.json")
+            with open(path, "wb") as log_file:
+                log_file.write(log)
+            log_area = LogArea(etos, self.sub_suite(server.host))
+
+            self.logger.info("STEP: Upload a log from a file, from bytes and from chunks.")
+            chunks = (log[index : index + 100] for index in range(0, len(log), 100))
+            for source in (path, log, chunks):
+                url = log_area.upload(source, "log.json", "main", "sub")
+                self.assertEqual(url, f"{server.host}/main/sub/log.json")
+
+            self.logger.info("STEP: Verify that the same log was uploaded from all sources.")
+            self.assertEqual(server.nbr_of_requests, 3)
+            for headers, body in server.requests:
+                self.assertEqual(body, log)
+                self.assertNotIn("Content-Encoding", headers)
+            self.assertEqual(server.requests[2][0].get("Transfer-Encoding"), "chunked")
+
+    def test_upload_compressed(self) -> None:
+        """Test that logs can be uploaded with gzip content encoding.
+
+        Approval criteria:
+            - Logs shall be compressed with gzip if configured in the log area.
+
+        Test steps::
+            1. Upload a compressed log from a file, from bytes and from chunks.
+            2. Verify that the logs were uploaded with gzip content encoding.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        log = json.dumps({"recipes": [{"id": str(index)} for index in range(1000)]}).encode()
+
+        with FakeServer(None, None, UploadHandler) as server, TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "log.json")
+            with open(path, "wb") as log_file:
+                log_file.write(log)
+            log_area = LogArea(etos, self.sub_suite(server.host, compress=True))
+
+            self.logger.info(
+                "STEP: Upload a compressed log from a file, from bytes and from chunks."
+            )
+            chunks = (log[index : index + 100] for index in range(0, len(log), 100))
+            for source in (path, log, chunks):
+                log_area.upload(source, "log.json", "main", "sub")
+
+            self.logger.info("STEP: Verify that the logs were uploaded with gzip content encoding.")
+            self.assertEqual(server.nbr_of_requests, 3)
+            for headers, body in server.requests:
+                self.assertEqual(headers.get("Content-Encoding"), "gzip")
+                self.assertEqual(body, log)
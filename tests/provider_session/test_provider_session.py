@@ -0,0 +1,91 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the shared HTTP sessions of external providers."""
+
+import logging
+import unittest
+
+from urllib3.util import Retry
+
+from environment_provider.lib.provider_session import ProviderSession
+
+
+class TestProviderSession(unittest.TestCase):
+    """Test the shared HTTP sessions of external providers."""
+
+    logger = logging.getLogger(__name__)
+
+    def tearDown(self) -> None:
+        """Close the shared sessions."""
+        ProviderSession.close_all()
+
+    def test_shared_per_kind(self) -> None:
+        """Test that sessions are shared per kind of provider and provider ID.
+
+        Approval criteria:
+            - Providers of the same kind and ID shall share a session.
+            - Providers of different kinds shall not share a session, even with the same ID.
+            - Each session shall use the retry policy of its kind of provider.
+
+        Test steps::
+            1. Get shared sessions for IUT and log area providers with the same ID.
+            2. Verify that only providers of the same kind share a session.
+            3. Verify that each session uses the retry policy of its kind of provider.
+        """
+        iut_retry = Retry(connect=10)
+        log_area_retry = Retry(connect=3)
+
+        self.logger.info(
+            "STEP: Get shared sessions for IUT and log area providers with the same ID."
+        )
+        iut = ProviderSession.shared("iut", "provider", iut_retry)
+        log_area = ProviderSession.shared("log_area", "provider", log_area_retry)
+
+        self.logger.info("STEP: Verify that only providers of the same kind share a session.")
+        self.assertIs(ProviderSession.shared("iut", "provider", Retry(connect=1)), iut)
+        self.assertIsNot(log_area, iut)
+
+        self.logger.info(
+            "STEP: Verify that each session uses the retry policy of its kind of provider."
+        )
+        self.assertIs(iut.adapter.max_retries, iut_retry)
+        self.assertIs(log_area.adapter.max_retries, log_area_retry)
+
+    def test_close_all(self) -> None:
+        """Test that closing the shared sessions closes their connections.
+
+        Approval criteria:
+            - Closing the shared sessions shall close the connection pools of the sessions.
+            - Providers shall get a new session after the shared sessions are closed.
+
+        Test steps::
+            1. Get a shared session and open a connection pool with it.
+            2. Close all shared sessions.
+            3. Verify that the connection pool was closed and that a new session is shared.
+        """
+        self.logger.info("STEP: Get a shared session and open a connection pool with it.")
+        session = ProviderSession.shared("iut", "provider", Retry(connect=1))
+        session.poolmanager.connection_from_url("http://localhost")
+        self.assertEqual(len(session.poolmanager.pools), 1)
+
+        self.logger.info("STEP: Close all shared sessions.")
+        ProviderSession.close_all()
+
+        self.logger.info(
+            "STEP: Verify that the connection pool was closed and that a new session is shared."
+        )
+        self.assertEqual(len(session.poolmanager.pools), 0)
+        self.assertIsNot(ProviderSession.shared("iut", "provider", Retry(connect=1)), session)
@@ -0,0 +1,408 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the environment provider registry."""
+
+import json
+import logging
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+from threading import Event, Timer
+
+from etos_lib import ETOS
+from etos_lib.lib.config import Config
+from jsonschema.exceptions import ValidationError
+from jsontas.jsontas import JsonTas
+from mock import MagicMock, Mock, patch
+
+from environment_provider.lib.database import Database, ETCDPath
+from environment_provider.lib.provider_cache import (
+    CONCURRENCY_ANNOTATION,
+    STATUS_PROTOCOL_ANNOTATION,
+    STATUS_WAIT_ANNOTATION,
+    to_ruleset,
+)
+from environment_provider.lib.registry import ProviderRegistry
+from execution_space_provider import execution_space_provider_schema
+from iut_provider import iut_provider_schema
+from log_area_provider import log_area_provider_schema
+from tests.library.fake_database import FakeDatabase
+
+IUT_PROVIDER = {"iut": {"id": "default", "list": {"available": [], "possible": []}}}
+LOG_AREA_PROVIDER = {"log": {"id": "default", "list": {"available": [], "possible": []}}}
+EXECUTION_SPACE_PROVIDER = {
+    "execution_space": {"id": "default", "list": {"available": [], "possible": []}}
+}
+
+
+class TestRegistry(unittest.TestCase):
+    """Test the environment provider registry."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_provider_cache(self) -> None:
+        """Test that provider rulesets are read from the database only once.
+
+        Approval criteria:
+            - Provider rulesets shall only be read once from the database.
+            - Modifying a provider ruleset shall not modify the cached ruleset.
+            - A changed provider ruleset shall be read again from the database.
+
+        Test steps::
+            1. Get the providers of a testrun 200 times.
+            2. Verify that each provider was read once from the database.
+            3. Modify the IUT provider ruleset in place.
+            4. Verify that the cached IUT provider was not modified.
+            5. Change the IUT provider of the testrun.
+            6. Verify that the changed IUT provider is read again from the database.
+        """
+        suite_id = "e7d24b4b-7f3a-4a61-a0d3-3a5b1b4c1c39"
+        database = FakeDatabase()
+        Config().set("database", database)
+        database.put(f"/testrun/{suite_id}/provider/iut", json.dumps(IUT_PROVIDER))
+        database.put(f"/testrun/{suite_id}/provider/log-area", json.dumps(LOG_AREA_PROVIDER))
+        database.put(
+            f"/testrun/{suite_id}/provider/execution-space", json.dumps(EXECUTION_SPACE_PROVIDER)
+        )
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), suite_id)
+        try:
+            self.logger.info("STEP: Get the providers of a testrun 200 times.")
+            for _ in range(200):
+                self.assertDictEqual(registry.get_iut_provider(), IUT_PROVIDER)
+                self.assertDictEqual(registry.get_log_area_provider(), LOG_AREA_PROVIDER)
+                self.assertDictEqual(
+                    registry.get_execution_space_provider(), EXECUTION_SPACE_PROVIDER
+                )
+
+            self.logger.info("STEP: Verify that each provider was read once from the database.")
+            self.assertEqual(Database.shared().latency["get"]["count"], 3)
+
+            self.logger.info("STEP: Modify the IUT provider ruleset in place.")
+            registry.get_iut_provider()["iut"]["id"] = "modified"
+            registry.get_iut_provider()["iut"].clear()
+
+            self.logger.info("STEP: Verify that the cached IUT provider was not modified.")
+            self.assertDictEqual(registry.get_iut_provider(), IUT_PROVIDER)
+            self.assertEqual(Database.shared().latency["get"]["count"], 3)
+
+            self.logger.info("STEP: Change the IUT provider of the testrun.")
+            changed = {"iut": {"id": "changed", "list": {"available": [], "possible": []}}}
+            database.put(f"/testrun/{suite_id}/provider/iut", json.dumps(changed))
+
+            self.logger.info(
+                "STEP: Verify that the changed IUT provider is read again from the database."
+            )
+            timeout = time.time() + 10
+            while registry.get_iut_provider() != changed and time.time() < timeout:
+                time.sleep(0.01)
+            self.assertDictEqual(registry.get_iut_provider(), changed)
+            self.assertEqual(Database.shared().latency["get"]["count"], 4)
+        finally:
+            registry.close()
+
+    def test_wait_for_configuration(self) -> None:
+        """Test that the registry stops waiting as soon as the testrun is configured.
+
+        Approval criteria:
+            - Waiting for configuration shall return as soon as a provider is configured.
+            - Waiting for configuration shall not read any values from the database.
+
+        Test steps::
+            1. Wait for configuration and configure a provider while waiting.
+            2. Verify that the wait returned as soon as the provider was configured.
+            3. Verify that no values were read from the database.
+        """
+        suite_id = "e7d24b4b-7f3a-4a61-a0d3-3a5b1b4c1c39"
+        database = FakeDatabase()
+        Config().set("database", database)
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), suite_id)
+
+        self.logger.info("STEP: Wait for configuration and configure a provider while waiting.")
+        database.put(f"/testrun/{suite_id}/tercc", "{}")
+        timer = Timer(
+            0.2, database.put, args=(f"/testrun/{suite_id}/provider/iut", json.dumps(IUT_PROVIDER))
+        )
+        timer.start()
+        start = time.time()
+        configured = registry.wait_for_configuration()
+        duration = time.time() - start
+
+        self.logger.info(
+            "STEP: Verify that the wait returned as soon as the provider was configured."
+        )
+        self.assertTrue(configured)
+        self.assertLess(duration, 2)
+
+        self.logger.info("STEP: Verify that no values were read from the database.")
+        latency = Database.shared().latency
+        self.assertNotIn("get", latency)
+        self.assertNotIn("get_prefix", latency)
+        self.assertEqual(latency["get_keys"]["count"], 1)
+
+    def test_wait_for_configuration_without_watch(self) -> None:
+        """Test that the registry polls the configuration if it cannot be watched.
+
+        Approval criteria:
+            - The configuration shall be polled if it cannot be watched.
+
+        Test steps::
+            1. Wait for configuration of a configured testrun without watches.
+            2. Verify that the configuration was polled without reading any values.
+        """
+        suite_id = "e7d24b4b-7f3a-4a61-a0d3-3a5b1b4c1c39"
+        database = FakeDatabase()
+        database.watch = Mock(side_effect=ConnectionError("Watches are not available"))
+        Config().set("database", database)
+        database.put(f"/testrun/{suite_id}/provider/iut", json.dumps(IUT_PROVIDER))
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), suite_id)
+
+        self.logger.info("STEP: Wait for configuration of a configured testrun without watches.")
+        self.assertTrue(registry.wait_for_configuration())
+
+        self.logger.info(
+            "STEP: Verify that the configuration was polled without reading any values."
+        )
+        self.assertEqual(database.watch.call_count, 1)
+        latency = Database.shared().latency
+        self.assertNotIn("get_prefix", latency)
+        self.assertEqual(latency["get_keys"]["count"], 1)
+
+    def test_provider_watch_concurrent_getters(self) -> None:
+        """Test that getters called from several threads start only one watch.
+
+        Approval criteria:
+            - Only one watch of the provider configuration shall be started.
+            - Closing the registry shall cancel the watch.
+
+        Test steps::
+            1. Get the providers of a testrun from 10 threads at the same time.
+            2. Verify that only one watch was started.
+            3. Close the registry and verify that the watch was cancelled.
+        """
+        suite_id = "e7d24b4b-7f3a-4a61-a0d3-3a5b1b4c1c39"
+        database = FakeDatabase()
+        Config().set("database", database)
+        database.put(f"/testrun/{suite_id}/provider/iut", json.dumps(IUT_PROVIDER))
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), suite_id)
+        cancelled = Event()
+        cancel = MagicMock(side_effect=cancelled.set)
+
+        def events():
+            """Stream no events until the watch is cancelled."""
+            cancelled.wait()
+            yield from ()
+
+        def slow_watch_all(_):
+            """Start a watch slowly, to give other threads a chance to start one too."""
+            time.sleep(0.1)
+            return events(), cancel
+
+        self.logger.info("STEP: Get the providers of a testrun from 10 threads at the same time.")
+        with patch.object(
+            ETCDPath, "watch_all", autospec=True, side_effect=slow_watch_all
+        ) as watch:
+            with ThreadPool(10) as pool:
+                providers = pool.map(lambda _: registry.get_iut_provider(), range(10))
+
+        self.logger.info("STEP: Verify that only one watch was started.")
+        self.assertEqual(providers, [IUT_PROVIDER] * 10)
+        self.assertEqual(watch.call_count, 1)
+
+        self.logger.info("STEP: Close the registry and verify that the watch was cancelled.")
+        registry.close()
+        cancel.assert_called_once()
+
+    def test_provider_cache_watch_stopped(self) -> None:
+        """Test that provider rulesets are read from the database when they are not watched.
+
+        Approval criteria:
+            - Cached rulesets shall be invalidated when the watch stops.
+            - Rulesets shall be read from the database when they cannot be watched.
+
+        Test steps::
+            1. Get the IUT provider of a testrun twice.
+            2. Verify that the IUT provider was read once from the database.
+            3. Stop the watch, as if its stream had died, and change the IUT provider.
+            4. Verify that the changed IUT provider is read again from the database.
+            5. Get the IUT provider twice while watches are not available.
+            6. Verify that the IUT provider was read from the database every time.
+        """
+        suite_id = "e7d24b4b-7f3a-4a61-a0d3-3a5b1b4c1c39"
+        database = FakeDatabase()
+        Config().set("database", database)
+        database.put(f"/testrun/{suite_id}/provider/iut", json.dumps(IUT_PROVIDER))
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), suite_id)
+        watches = []
+        watch = database.watch
+
+        def record_watch(*args, **kwargs):
+            """Start a watch and record its cancel function."""
+            events, cancel = watch(*args, **kwargs)
+            watches.append(cancel)
+            return events, cancel
+
+        database.watch = record_watch
+        try:
+            self.logger.info("STEP: Get the IUT provider of a testrun twice.")
+            for _ in range(2):
+                self.assertDictEqual(registry.get_iut_provider(), IUT_PROVIDER)
+
+            self.logger.info("STEP: Verify that the IUT provider was read once from the database.")
+            self.assertEqual(Database.shared().latency["get"]["count"], 1)
+
+            self.logger.info(
+                "STEP: Stop the watch, as if its stream had died, and change the IUT provider."
+            )
+            # Wait for the registry to see that the watch has stopped, before changing the
+            # provider, since a stopped watch does not see the change.
+            watches[0]()
+            timeout = time.time() + 10
+            # pylint:disable=protected-access
+            while registry._ProviderRegistry__cancel is not None and time.time() < timeout:
+                time.sleep(0.01)
+            changed = {"iut": {"id": "changed", "list": {"available": [], "possible": []}}}
+            database.db_dict[f"/testrun/{suite_id}/provider/iut"] = [json.dumps(changed).encode()]
+
+            self.logger.info(
+                "STEP: Verify that the changed IUT provider is read again from the database."
+            )
+            self.assertDictEqual(registry.get_iut_provider(), changed)
+            self.assertEqual(Database.shared().latency["get"]["count"], 2)
+            self.assertEqual(len(watches), 2)
+        finally:
+            registry.close()
+
+        self.logger.info("STEP: Get the IUT provider twice while watches are not available.")
+        database.watch = Mock(side_effect=ConnectionError("Watches are not available"))
+        registry = ProviderRegistry(etos, JsonTas(), suite_id)
+        for _ in range(2):
+            self.assertDictEqual(registry.get_iut_provider(), changed)
+
+        self.logger.info(
+            "STEP: Verify that the IUT provider was read from the database every time."
+        )
+        self.assertEqual(Database.shared().latency["get"]["count"], 4)
+
+    def test_validate_long_poll_rulesets(self) -> None:
+        """Test that external rulesets advertising long-polling are valid.
+
+        Approval criteria:
+            - External IUT, log area and execution space rulesets shall be allowed to set
+              the status protocol and wait.
+            - An unknown status protocol shall not be allowed.
+
+        Test steps::
+            1. Convert annotated external Provider resources to rulesets.
+            2. Verify that the rulesets are valid for each type of provider.
+            3. Verify that a ruleset with an unknown status protocol is not valid.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), None)
+        providers = {
+            "iut": ("iut", iut_provider_schema),
+            "log": ("log-area", log_area_provider_schema),
+            "execution_space": ("execution-space", execution_space_provider_schema),
+        }
+
+        self.logger.info("STEP: Convert annotated external Provider resources to rulesets.")
+        rulesets = {}
+        for name, (provider_type, _) in providers.items():
+            rulesets[name] = to_ruleset(
+                {
+                    "metadata": {
+                        "name": name,
+                        "namespace": "etos",
+                        "annotations": {
+                            STATUS_PROTOCOL_ANNOTATION: "long-poll",
+                            STATUS_WAIT_ANNOTATION: "30",
+                        },
+                    },
+                    "spec": {"type": provider_type, "host": "http://provider"},
+                }
+            )
+            self.assertEqual(rulesets[name]["status"]["protocol"], "long-poll")
+            self.assertEqual(rulesets[name]["status"]["wait"], 30)
+
+        self.logger.info("STEP: Verify that the rulesets are valid for each type of provider.")
+        for name, (_, schema) in providers.items():
+            ruleset = {name: rulesets[name]}
+            self.assertDictEqual(registry.validate(ruleset, schema(ruleset)), ruleset)
+
+        self.logger.info(
+            "STEP: Verify that a ruleset with an unknown status protocol is not valid."
+        )
+        for name, (_, schema) in providers.items():
+            ruleset = {name: rulesets[name]}
+            ruleset[name]["status"]["protocol"] = "websocket"
+            with self.assertRaises(ValidationError):
+                registry.validate(ruleset, schema(ruleset))
+
+    def test_validate_concurrency_rulesets(self) -> None:
+        """Test that JSONTas rulesets with a concurrency are valid.
+
+        Approval criteria:
+            - JSONTas IUT, log area and execution space rulesets shall be allowed to set a
+              concurrency.
+            - A concurrency below 1 shall not be allowed.
+
+        Test steps::
+            1. Convert annotated JSONTas Provider resources to rulesets.
+            2. Verify that the rulesets are valid for each type of provider.
+            3. Verify that a ruleset with a concurrency of 0 is not valid.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        registry = ProviderRegistry(etos, JsonTas(), None)
+        providers = {
+            "iut": ("iut", iut_provider_schema),
+            "log": ("log-area", log_area_provider_schema),
+            "execution_space": ("execution-space", execution_space_provider_schema),
+        }
+
+        self.logger.info("STEP: Convert annotated JSONTas Provider resources to rulesets.")
+        rulesets = {}
+        for name, (provider_type, _) in providers.items():
+            jsontas = {"id": name, "list": {"possible": {}, "available": {}}}
+            if name == "iut":
+                stages = ("environment_provider", "suite_runner", "test_runner")
+                jsontas["prepare"] = {"stages": {stage: {"steps": {}} for stage in stages}}
+            rulesets[name] = to_ruleset(
+                {
+                    "metadata": {
+                        "name": name,
+                        "namespace": "etos",
+                        "annotations": {CONCURRENCY_ANNOTATION: "4"},
+                    },
+                    "spec": {"type": provider_type, "jsontas": {name: jsontas}},
+                }
+            )
+            self.assertEqual(rulesets[name]["concurrency"], 4)
+
+        self.logger.info("STEP: Verify that the rulesets are valid for each type of provider.")
+        for name, (_, schema) in providers.items():
+            ruleset = {name: rulesets[name]}
+            self.assertDictEqual(registry.validate(ruleset, schema(ruleset)), ruleset)
+
+        self.logger.info("STEP: Verify that a ruleset with a concurrency of 0 is not valid.")
+        for name, (_, schema) in providers.items():
+            ruleset = {name: rulesets[name]}
+            ruleset[name]["concurrency"] = 0
+            with self.assertRaises(ValidationError):
+                registry.validate(ruleset, schema(ruleset))
@@ -0,0 +1,268 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the provider cache."""
+
+import logging
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+from queue import Queue
+
+from etos_lib.kubernetes.schemas import Provider as ProviderSchema
+from mock import MagicMock, patch
+
+from environment_provider.lib.provider_cache import (
+    STATUS_PROTOCOL_ANNOTATION,
+    STATUS_WAIT_ANNOTATION,
+    ProviderCache,
+)
+
+
+def provider(
+    name: str, resource_version: str, host: str = "http://provider", annotations: dict = None
+) -> dict:
+    """Create a fake external Provider resource."""
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": "etos",
+            "resourceVersion": resource_version,
+            "annotations": annotations or {},
+        },
+        "spec": {"type": "iut", "host": host},
+    }
+
+
+class FakeProviderClient:
+    """Fake Kubernetes client for providers, counting requests."""
+
+    namespace = "etos"
+
+    def __init__(self, providers: dict) -> None:
+        """Initialize with providers keyed by name."""
+        self.providers = providers
+        self.requests = 0
+        self.events = Queue()
+        self.client = MagicMock()
+        self.client.watch.side_effect = self.watch
+
+    def get(self, name: str) -> MagicMock:
+        """Get a provider by name."""
+        self.requests += 1
+        resource = MagicMock()
+        resource.to_dict.return_value = self.providers[name]
+        return resource
+
+    def watch(self, **_) -> iter:
+        """Yield provider events until a None event is received."""
+        while (event := self.events.get()) is not None:
+            yield event
+
+
+class TestProviderCache(unittest.TestCase):
+    """Test the provider cache."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_cache_within_ttl(self) -> None:
+        """Test that a provider is only requested once within the TTL of the cache.
+
+        Approval criteria:
+            - A cached provider shall not be requested from Kubernetes within the TTL.
+
+        Test steps::
+            1. Get the same provider from the cache several times.
+            2. Verify that the provider was requested from Kubernetes once.
+        """
+        client = FakeProviderClient({"iut": provider("iut", "1")})
+        cache = ProviderCache(ttl=60, size=10)
+
+        self.logger.info("STEP: Get the same provider from the cache several times.")
+        rulesets = [cache.get(client, "iut") for _ in range(10)]
+
+        self.logger.info("STEP: Verify that the provider was requested from Kubernetes once.")
+        self.assertEqual(client.requests, 1)
+        self.assertEqual(rulesets[0]["start"], {"host": "http://provider/start"})
+        self.assertEqual(cache.hits, 9)
+        self.assertIsNot(rulesets[0], rulesets[1])
+
+    def test_status_protocol_annotations(self) -> None:
+        """Test that the status protocol of a provider is read from its annotations.
+
+        Approval criteria:
+            - The status protocol and wait of an external provider shall be read from the
+              annotations of the Provider resource.
+            - Providers without annotations shall be polled.
+
+        Test steps::
+            1. Get an annotated and an unannotated provider from the cache.
+            2. Verify that the status protocol was added to the annotated ruleset only.
+        """
+        annotations = {STATUS_PROTOCOL_ANNOTATION: "long-poll", STATUS_WAIT_ANNOTATION: "20"}
+        client = FakeProviderClient(
+            {
+                "long-poll": provider("long-poll", "1", annotations=annotations),
+                "poll": provider("poll", "1"),
+            }
+        )
+        cache = ProviderCache(ttl=60, size=10)
+
+        self.logger.info("STEP: Get an annotated and an unannotated provider from the cache.")
+        long_poll = cache.get(client, "long-poll")
+        poll = cache.get(client, "poll")
+
+        self.logger.info(
+            "STEP: Verify that the status protocol was added to the annotated ruleset only."
+        )
+        self.assertDictEqual(
+            long_poll["status"],
+            {"host": "http://provider/status", "protocol": "long-poll", "wait": 20},
+        )
+        self.assertDictEqual(poll["status"], {"host": "http://provider/status"})
+
+    def test_statistics_concurrently(self) -> None:
+        """Test that hits and misses are counted correctly when the cache is used concurrently.
+
+        Approval criteria:
+            - Every get from the cache shall be counted as either a hit or a miss.
+
+        Test steps::
+            1. Get providers from the cache, without TTL, from 8 threads at the same time.
+            2. Verify that every get was counted as a hit or a miss.
+        """
+        client = FakeProviderClient({name: provider(name, "1") for name in ("iut", "log_area")})
+        cache = ProviderCache(ttl=0, size=10)
+
+        self.logger.info(
+            "STEP: Get providers from the cache, without TTL, from 8 threads at the same time."
+        )
+        with ThreadPool(8) as pool:
+            pool.map(lambda index: cache.get(client, ("iut", "log_area")[index % 2]), range(2000))
+
+        self.logger.info("STEP: Verify that every get was counted as a hit or a miss.")
+        self.assertEqual(cache.hits + cache.misses, 2000)
+        self.assertGreaterEqual(cache.misses, 2)
+
+    def test_resource_version(self) -> None:
+        """Test that a provider is only parsed again if its resource version has changed.
+
+        Approval criteria:
+            - An expired provider with the same resource version shall not be parsed again.
+            - An expired provider with a new resource version shall be parsed again.
+
+        Test steps::
+            1. Get a provider from the cache, without TTL, twice.
+            2. Verify that the provider was parsed once.
+            3. Update the provider and get it from the cache again.
+            4. Verify that the updated provider was parsed.
+        """
+        client = FakeProviderClient({"iut": provider("iut", "1")})
+        cache = ProviderCache(ttl=0, size=10)
+
+        self.logger.info("STEP: Get a provider from the cache, without TTL, twice.")
+        with patch(
+            "environment_provider.lib.provider_cache.ProviderSchema.model_validate",
+            wraps=ProviderSchema.model_validate,
+        ) as validate:
+            cache.get(client, "iut")
+            cache.get(client, "iut")
+
+            self.logger.info("STEP: Verify that the provider was parsed once.")
+            self.assertEqual(client.requests, 2)
+            self.assertEqual(validate.call_count, 1)
+
+            self.logger.info("STEP: Update the provider and get it from the cache again.")
+            client.providers["iut"] = provider("iut", "2", host="http://updated")
+            ruleset = cache.get(client, "iut")
+
+        self.logger.info("STEP: Verify that the updated provider was parsed.")
+        self.assertEqual(validate.call_count, 2)
+        self.assertEqual(ruleset["start"], {"host": "http://updated/start"})
+
+    def test_lru_eviction(self) -> None:
+        """Test that the least recently used provider is evicted when the cache is full.
+
+        Approval criteria:
+            - The least recently used provider shall be evicted from a full cache.
+
+        Test steps::
+            1. Fill a cache of size 2 and use the first provider again.
+            2. Add a third provider to the cache.
+            3. Verify that the second provider was evicted.
+        """
+        client = FakeProviderClient({name: provider(name, "1") for name in ("a", "b", "c")})
+        cache = ProviderCache(ttl=60, size=2)
+
+        self.logger.info("STEP: Fill a cache of size 2 and use the first provider again.")
+        cache.get(client, "a")
+        cache.get(client, "b")
+        cache.get(client, "a")
+
+        self.logger.info("STEP: Add a third provider to the cache.")
+        cache.get(client, "c")
+
+        self.logger.info("STEP: Verify that the second provider was evicted.")
+        requests = client.requests
+        cache.get(client, "a")
+        self.assertEqual(client.requests, requests)
+        cache.get(client, "b")
+        self.assertEqual(client.requests, requests + 1)
+
+    def test_watch_refresh(self) -> None:
+        """Test that a watched cache is refreshed by provider events.
+
+        Approval criteria:
+            - A modified provider shall be refreshed without requesting it.
+            - A deleted provider shall be removed from the cache.
+
+        Test steps::
+            1. Get a provider from a cache watching providers.
+            2. Send a modified event for the provider.
+            3. Verify that the cache was refreshed without a request.
+            4. Send a deleted event for the provider.
+            5. Verify that the provider is requested again.
+        """
+        client = FakeProviderClient({"iut": provider("iut", "1")})
+        cache = ProviderCache(ttl=0, size=10)
+
+        self.logger.info("STEP: Get a provider from a cache watching providers.")
+        cache.watch(client)
+        cache.get(client, "iut")
+        self.assertEqual(client.requests, 1)
+        try:
+            self.logger.info("STEP: Send a modified event for the provider.")
+            client.events.put(
+                {"type": "MODIFIED", "raw_object": provider("iut", "2", host="http://updated")}
+            )
+            self.logger.info("STEP: Verify that the cache was refreshed without a request.")
+            timeout = time.time() + 5
+            while cache.get(client, "iut")["start"]["host"] != "http://updated/start":
+                self.assertLess(time.time(), timeout, "Cache was not refreshed")
+                time.sleep(0.01)
+            self.assertEqual(client.requests, 1)
+
+            self.logger.info("STEP: Send a deleted event for the provider.")
+            client.events.put({"type": "DELETED", "raw_object": provider("iut", "2")})
+
+            self.logger.info("STEP: Verify that the provider is requested again.")
+            timeout = time.time() + 5
+            while client.requests == 1:
+                self.assertLess(time.time(), timeout, "Provider was not removed from cache")
+                cache.get(client, "iut")
+                time.sleep(0.01)
+        finally:
+            cache.close()
+            client.events.put(None)
@@ -0,0 +1,319 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for releasing the full environment of a testrun."""
+
+import base64
+import json
+import logging
+import os
+import time
+import unittest
+from threading import Timer
+from uuid import uuid4
+
+from etos_lib import ETOS
+from etos_lib.lib.config import Config
+from jsontas.jsontas import JsonTas
+from mock import patch
+
+from environment_provider.environment import (
+    release_full_environment,
+    sub_suite_keys,
+    wait_for_logs_collected,
+)
+from environment_provider.lib.database import ETCDPath
+from tests.library.fake_database import FakeDatabase
+
+
+class TestReleaseFullEnvironment(unittest.TestCase):
+    """Test releasing the full environment of a testrun."""
+
+    logger = logging.getLogger(__name__)
+
+    def setUp(self) -> None:
+        """Set up a fake database with a testrun of several sub suites."""
+        self.database = FakeDatabase()
+        Config().set("database", self.database)
+        self.suite_id = str(uuid4())
+        self.testrun = ETCDPath(f"/testrun/{self.suite_id}")
+        main_suite_id = str(uuid4())
+        self.sub_suites = {}
+        for index in range(4):
+            sub_suite_id = str(uuid4())
+            key = f"/testrun/{self.suite_id}/suite/{main_suite_id}/subsuite/{sub_suite_id}/suite"
+            self.sub_suites[key] = {"name": f"sub_suite_{index}", "suite_id": self.suite_id}
+            self.database.put(key, json.dumps(self.sub_suites[key]))
+        self.etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        # Nothing collects the logs in these tests, do not wait for it unless configured.
+        environ = patch.dict(os.environ, {"ETOS_LOGS_COLLECTED_TIMEOUT": "0"})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def test_wait_for_logs_collected(self) -> None:
+        """Test that waiting for collected logs returns as soon as they are collected.
+
+        Approval criteria:
+            - The wait shall return as soon as a registered log collector has collected the logs.
+            - The wait shall return False if the logs are not collected within the timeout.
+            - The wait shall return False after the timeout if no log collector has registered.
+
+        Test steps::
+            1. Register a log collector that collects the logs while waiting for them.
+            2. Verify that the wait returned when the logs were collected.
+            3. Wait for the logs of a registered log collector that never collects them.
+            4. Verify that the wait timed out.
+            5. Wait for the logs of a testrun without a registered log collector.
+            6. Verify that the wait lasted the full timeout.
+        """
+        testrun = ETCDPath(f"/testrun/{uuid4()}")
+        self.logger.info(
+            "STEP: Register a log collector that collects the logs while waiting for them."
+        )
+        testrun.join("logs-collected").write("false")
+        timer = Timer(0.2, testrun.join("logs-collected").write, args=("true",))
+        timer.start()
+        collected = wait_for_logs_collected(testrun, 10)
+
+        self.logger.info("STEP: Verify that the wait returned when the logs were collected.")
+        self.assertTrue(collected)
+
+        self.logger.info(
+            "STEP: Wait for the logs of a registered log collector that never collects them."
+        )
+        testrun = ETCDPath(f"/testrun/{uuid4()}")
+        testrun.join("logs-collected").write("false")
+        collected = wait_for_logs_collected(testrun, 0.2)
+
+        self.logger.info("STEP: Verify that the wait timed out.")
+        self.assertFalse(collected)
+
+        self.logger.info("STEP: Wait for the logs of a testrun without a registered log collector.")
+        with patch("environment_provider.environment.time.sleep") as sleep:
+            collected = wait_for_logs_collected(ETCDPath(f"/testrun/{uuid4()}"), 30)
+
+        self.logger.info("STEP: Verify that the wait lasted the full timeout.")
+        self.assertFalse(collected)
+        sleep.assert_called_once_with(30)
+
+    def test_release_concurrently(self) -> None:
+        """Test that sub suites are released concurrently and the testrun is deleted.
+
+        Approval criteria:
+            - All sub suites shall be released at the same time.
+            - All keys of the testrun shall be removed from the database.
+
+        Test steps::
+            1. Release a testrun where each sub suite takes 0.5 seconds to release.
+            2. Verify that all sub suites were released at the same time.
+            3. Verify that the testrun was removed from the database.
+        """
+        released = []
+
+        def release(_, __, ___, sub_suite):
+            time.sleep(0.5)
+            released.append(sub_suite["name"])
+
+        self.logger.info("STEP: Release a testrun where each sub suite takes 0.5 seconds.")
+        with patch("environment_provider.environment.release_environment", side_effect=release):
+            start = time.time()
+            success, message = release_full_environment(self.etos, JsonTas(), self.suite_id)
+            duration = time.time() - start
+
+        self.logger.info("STEP: Verify that all sub suites were released at the same time.")
+        self.assertTrue(success, message)
+        self.assertCountEqual(
+            released, [sub_suite["name"] for sub_suite in self.sub_suites.values()]
+        )
+        self.assertLess(duration, 1.5)
+
+        self.logger.info("STEP: Verify that the testrun was removed from the database.")
+        self.assertFalse(self.testrun.exists_all())
+
+    def test_release_after_logs_collected(self) -> None:
+        """Test that sub suites are released once the logs have been collected.
+
+        Approval criteria:
+            - The release shall wait 30 seconds for the logs to be collected by default.
+            - Sub suites shall not be released until the logs have been collected.
+            - A release concurrency of 0 shall release the sub suites one at a time.
+
+        Test steps::
+            1. Release a testrun, that never collects its logs, without configuration.
+            2. Verify that the release waited 30 seconds for the logs to be collected.
+            3. Release a testrun, waiting for its logs, with a concurrency of 0.
+            4. Verify that the sub suites were released after the logs were collected.
+        """
+        released = {}
+
+        def release(_, __, ___, sub_suite):
+            released[sub_suite["name"]] = self.testrun.join("logs-collected").read()
+
+        self.logger.info(
+            "STEP: Release a testrun, that never collects its logs, without configuration."
+        )
+        os.environ.pop("ETOS_LOGS_COLLECTED_TIMEOUT")
+        with (
+            patch("environment_provider.environment.release_environment", side_effect=release),
+            patch(
+                "environment_provider.environment.wait_for_logs_collected", return_value=False
+            ) as wait,
+        ):
+            success, message = release_full_environment(self.etos, JsonTas(), self.suite_id)
+
+        self.logger.info(
+            "STEP: Verify that the release waited 30 seconds for the logs to be collected."
+        )
+        self.assertTrue(success, message)
+        self.assertEqual(len(released), len(self.sub_suites))
+        wait.assert_called_once()
+        testrun, timeout = wait.call_args.args
+        self.assertEqual(str(testrun), str(self.testrun))
+        self.assertEqual(timeout, 30)
+        self.assertFalse(self.testrun.exists_all())
+
+        self.logger.info("STEP: Release a testrun, waiting for its logs, with a concurrency of 0.")
+        released.clear()
+        self.setUp()
+        self.testrun.join("logs-collected").write("false")
+        timer = Timer(0.5, self.testrun.join("logs-collected").write, args=("true",))
+        timer.start()
+        environ = {"ETOS_LOGS_COLLECTED_TIMEOUT": "10", "ETOS_RELEASE_CONCURRENCY": "0"}
+        with (
+            patch("environment_provider.environment.release_environment", side_effect=release),
+            patch.dict(os.environ, environ),
+        ):
+            success, message = release_full_environment(self.etos, JsonTas(), self.suite_id)
+
+        self.logger.info(
+            "STEP: Verify that the sub suites were released after the logs were collected."
+        )
+        self.assertTrue(success, message)
+        self.assertEqual(list(released.values()), [b"true"] * len(self.sub_suites))
+        self.assertFalse(self.testrun.exists_all())
+
+    def test_release_failures(self) -> None:
+        """Test that failures are reported for every failed sub suite.
+
+        Approval criteria:
+            - Every failed sub suite shall be part of the failure message.
+            - Sub suites that did not fail shall not be part of the failure message.
+
+        Test steps::
+            1. Release a testrun where two out of four sub suites fail.
+            2. Verify that the release failed with both failures in the message.
+        """
+        failing = list(self.sub_suites)[:2]
+
+        def release(_, __, ___, sub_suite):
+            if sub_suite["name"] in ("sub_suite_0", "sub_suite_1"):
+                return RuntimeError(f"Failed {sub_suite['name']}")
+            return None
+
+        self.logger.info("STEP: Release a testrun where two out of four sub suites fail.")
+        with (
+            patch("environment_provider.environment.release_environment", side_effect=release),
+            patch.dict(os.environ, {"ETOS_RELEASE_CONCURRENCY": "2"}),
+        ):
+            success, message = release_full_environment(self.etos, JsonTas(), self.suite_id)
+
+        self.logger.info("STEP: Verify that the release failed with both failures in the message.")
+        self.assertFalse(success)
+        for key in failing:
+            self.assertIn(key, message)
+        self.assertIn("Failed sub_suite_0", message)
+        self.assertIn("Failed sub_suite_1", message)
+        for key in list(self.sub_suites)[2:]:
+            self.assertNotIn(key, message)
+
+    def test_sub_suite_index(self) -> None:
+        """Test that sub suites are found using the sub suite index of a testrun.
+
+        Approval criteria:
+            - Sub suites shall be found from the index without reading the sub suites.
+            - Sub suites of a testrun without an index shall be found by their keys.
+
+        Test steps::
+            1. Get the sub suite keys of a testrun without an index.
+            2. Verify that all sub suites were found, without reading any values.
+            3. Add an index of two sub suites to the testrun.
+            4. Verify that the sub suites in the index were found.
+        """
+        self.database.put(f"/testrun/{self.suite_id}/suite/{uuid4()}/unrelated", "{}")
+
+        self.logger.info("STEP: Get the sub suite keys of a testrun without an index.")
+        with patch.object(self.database, "get_prefix", wraps=self.database.get_prefix) as read:
+            keys = sub_suite_keys(self.testrun)
+
+        self.logger.info("STEP: Verify that all sub suites were found, without reading any values.")
+        self.assertCountEqual(keys, self.sub_suites)
+        for (prefix,), _ in read.call_args_list:
+            self.assertFalse(prefix.startswith(f"/testrun/{self.suite_id}/suite"))
+
+        self.logger.info("STEP: Add an index of two sub suites to the testrun.")
+        indexed = list(self.sub_suites)[:2]
+        for key in indexed:
+            self.testrun.join(f"subsuites/{key.split('/')[-2]}").write(key)
+
+        self.logger.info("STEP: Verify that the sub suites in the index were found.")
+        self.assertCountEqual(sub_suite_keys(self.testrun), indexed)
+
+    def test_release_without_index(self) -> None:
+        """Test that a testrun created without a sub suite index can be released.
+
+        Approval criteria:
+            - Sub suites of a testrun without an index shall be found with a range request
+              that is encoded like the ETCD client sends it.
+            - All sub suites of a testrun without an index shall be released.
+
+        Test steps::
+            1. Release a testrun that has no sub suite index.
+            2. Verify that the sub suites were found with a base64 encoded range request.
+            3. Verify that all sub suites were released and the testrun was removed.
+        """
+        released = []
+
+        def release(_, __, ___, sub_suite):
+            released.append(sub_suite["name"])
+
+        self.logger.info("STEP: Release a testrun that has no sub suite index.")
+        self.assertListEqual(self.testrun.join("subsuites").read_all(), [])
+        with (
+            patch("environment_provider.environment.release_environment", side_effect=release),
+            patch.object(self.database, "post", wraps=self.database.post) as post,
+        ):
+            success, message = release_full_environment(self.etos, JsonTas(), self.suite_id)
+
+        self.logger.info(
+            "STEP: Verify that the sub suites were found with a base64 encoded range request."
+        )
+        suite = f"/testrun/{self.suite_id}/suite"
+        requests = [call.kwargs["json"] for call in post.call_args_list]
+        ranges = [
+            request["range_end"]
+            for request in requests
+            if base64.b64decode(request["key"]).decode() == suite
+        ]
+        self.assertEqual(len(ranges), 1)
+        self.assertEqual(base64.b64decode(ranges[0]).decode(), suite[:-1] + "f")
+
+        self.logger.info(
+            "STEP: Verify that all sub suites were released and the testrun was removed."
+        )
+        self.assertTrue(success, message)
+        self.assertCountEqual(
+            released, [sub_suite["name"] for sub_suite in self.sub_suites.values()]
+        )
+        self.assertFalse(self.testrun.exists_all())
@@ -0,0 +1,483 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the environment releaser."""
+
+import logging
+import time
+import unittest
+from typing import Optional
+
+from kubernetes.client.exceptions import ApiException
+from kubernetes.dynamic.exceptions import NotFoundError
+from mock import MagicMock, mock_open, patch
+
+from environment_provider.environment import run
+from environment_provider.lib.releaser import (
+    BatchReleaser,
+    EnvironmentReleaser,
+    ReleaseError,
+    ReleaseTimeout,
+)
+
+
+def fake_task(name: str, duration: float, released: list, error: bool = False) -> type:
+    """Create a fake release task that takes a duration to release."""
+
+    class FakeTask:  # pylint:disable=too-few-public-methods
+        """Fake release task."""
+
+        def __init__(self, *_):
+            """Initialize fake task."""
+
+        def run(self):
+            """Fake a release taking some time."""
+            time.sleep(duration)
+            released.append(name)
+            if error:
+                raise RuntimeError(f"Failed to release {name}")
+
+    FakeTask.__name__ = name
+    return FakeTask
+
+
+def fake_environment(
+    name: str, iut: str, log_area: str, executor: str, suite_id: str = "suite-id"
+) -> MagicMock:
+    """Create a fake Kubernetes environment resource using providers."""
+    environment = MagicMock()
+    environment.to_dict.return_value = {
+        "metadata": {"name": name, "namespace": "etos"},
+        "spec": {
+            "name": name,
+            "suite_id": suite_id,
+            "sub_suite_id": name,
+            "test_suite_started_id": "test-suite-started-id",
+            "artifact": "artifact-id",
+            "context": "context-id",
+            "test_runner": "runner",
+            "recipes": [],
+            "iut": {"id": f"{name}-iut", "provider_id": iut},
+            "executor": {"id": f"{name}-executor", "provider_id": executor},
+            "log_area": {"id": f"{name}-log-area", "provider_id": log_area},
+        },
+    }
+    return environment
+
+
+class TestReleaser(unittest.TestCase):
+    """Test the environment releaser."""
+
+    logger = logging.getLogger(__name__)
+
+    def test_release_in_parallel(self) -> None:
+        """Test that the IUT, log area and executor are released at the same time.
+
+        Approval criteria:
+            - The release shall take as long as the slowest release task.
+
+        Test steps::
+            1. Release an environment where each release task takes 0.5 seconds.
+            2. Verify that all release tasks were run at the same time.
+        """
+        released = []
+        releaser = EnvironmentReleaser()
+
+        self.logger.info("STEP: Release an environment where each release task takes 0.5 seconds.")
+        with (
+            patch.multiple(
+                "environment_provider.lib.releaser",
+                Iut=fake_task("Iut", 0.5, released),
+                LogArea=fake_task("LogArea", 0.5, released),
+                Executor=fake_task("Executor", 0.5, released),
+            ),
+            patch.object(EnvironmentReleaser, "environment", return_value=MagicMock()),
+        ):
+            start = time.time()
+            releaser.run("environment-id")
+            duration = time.time() - start
+
+        self.logger.info("STEP: Verify that all release tasks were run at the same time.")
+        self.assertCountEqual(released, ["Iut", "LogArea", "Executor"])
+        self.assertLess(duration, 1.0)
+
+    def test_release_failure(self) -> None:
+        """Test that a failing release task does not stop the other release tasks.
+
+        Approval criteria:
+            - All release tasks shall run even if one of them fails.
+            - A ReleaseError shall be raised if any release task fails.
+
+        Test steps::
+            1. Release an environment where the IUT release fails.
+            2. Verify that a ReleaseError was raised and that all release tasks were run.
+        """
+        released = []
+        releaser = EnvironmentReleaser()
+
+        self.logger.info("STEP: Release an environment where the IUT release fails.")
+        with (
+            patch.multiple(
+                "environment_provider.lib.releaser",
+                Iut=fake_task("Iut", 0, released, error=True),
+                LogArea=fake_task("LogArea", 0.1, released),
+                Executor=fake_task("Executor", 0.1, released),
+            ),
+            patch.object(EnvironmentReleaser, "environment", return_value=MagicMock()),
+        ):
+            self.logger.info(
+                "STEP: Verify that a ReleaseError was raised and that all release tasks were run."
+            )
+            with self.assertRaises(ReleaseError):
+                releaser.run("environment-id")
+        self.assertCountEqual(released, ["Iut", "LogArea", "Executor"])
+
+    def test_run_single_environment_id(self) -> None:
+        """Test that the release entrypoint releases a single environment ID by itself.
+
+        Approval criteria:
+            - An environment ID given as a string shall be released by the environment releaser.
+            - A list of environment IDs shall be released by the batch releaser.
+
+        Test steps::
+            1. Run the release entrypoint with a single environment ID.
+            2. Verify that the environment was released by the environment releaser.
+            3. Run the release entrypoint with a list of environment IDs.
+            4. Verify that the environments were released by the batch releaser.
+        """
+        with (
+            patch("environment_provider.environment.EnvironmentReleaser") as releaser,
+            patch("environment_provider.environment.BatchReleaser") as batch_releaser,
+            patch("environment_provider.environment.open", mock_open(), create=True),
+        ):
+            self.logger.info("STEP: Run the release entrypoint with a single environment ID.")
+            run("environment-id")
+
+            self.logger.info(
+                "STEP: Verify that the environment was released by the environment releaser."
+            )
+            releaser.return_value.run.assert_called_once_with("environment-id")
+            batch_releaser.assert_not_called()
+
+            self.logger.info("STEP: Run the release entrypoint with a list of environment IDs.")
+            run(["environment-id", "other-id"])
+
+            self.logger.info(
+                "STEP: Verify that the environments were released by the batch releaser."
+            )
+            batch_releaser.return_value.run.assert_called_once_with(
+                ["environment-id", "other-id"], None
+            )
+
+
+class TestBatchReleaser(unittest.TestCase):
+    """Test the batch releaser of environments."""
+
+    logger = logging.getLogger(__name__)
+
+    def setUp(self) -> None:
+        """Set up fake Kubernetes environments and providers."""
+        self.rulesets = {
+            "external-iut": {"type": "external", "id": "external-iut"},
+            "jsontas-iut": {"type": "jsontas", "id": "jsontas-iut"},
+            "log-area": {"type": "external", "id": "log-area"},
+            "executor": {"type": "external", "id": "executor"},
+        }
+        self.items = [
+            fake_environment("env1", "external-iut", "log-area", "executor"),
+            fake_environment("env2", "external-iut", "log-area", "executor"),
+            fake_environment("env3", "jsontas-iut", "log-area", "executor"),
+            fake_environment("env4", "external-iut", "log-area", "executor"),
+        ]
+        self.environment = MagicMock()
+        self.environment.client.get.return_value.items = self.items
+        self.environment.get.side_effect = self.get_environment
+        self.config = {}
+        self.etos = MagicMock()
+        self.etos.config.set.side_effect = self.config.__setitem__
+        self.etos.config.get.side_effect = self.config.get
+        self.checkins = {}
+        self.identifiers = {}
+        self.recorded = []
+
+    def get_environment(self, name: str) -> MagicMock:
+        """Get a fake Kubernetes environment resource by name, failing like Kubernetes."""
+        for item in self.items:
+            if item.to_dict()["metadata"]["name"] == name:
+                return item
+        raise NotFoundError(ApiException(status=404, reason="Not Found"))
+
+    def provider(self, name: str) -> type:
+        """Create a fake provider class, storing its checkins."""
+
+        def create(etos: MagicMock, _, ruleset: dict) -> MagicMock:
+            """Create a fake provider from a ruleset, identified like an external provider."""
+            identifier = etos.config.get("SUITE_ID")
+            self.identifiers.setdefault((name, ruleset["id"]), []).append(identifier)
+            provider = MagicMock()
+
+            def checkin(items) -> None:
+                """Check in items, taking as long as the 'delay' of the ruleset."""
+                time.sleep(ruleset.get("delay", 0))
+                self.checkins.setdefault((name, ruleset["id"]), []).append(items)
+
+            provider.checkin.side_effect = checkin
+            return provider
+
+        return create
+
+    def release(self, *args, timeout: Optional[int] = None, **kwargs) -> None:
+        """Release environments using fake providers."""
+        with (
+            patch.multiple(
+                "environment_provider.lib.releaser",
+                Kubernetes=MagicMock(),
+                Provider=MagicMock(),
+                Environment=MagicMock(return_value=self.environment),
+                ETOS=MagicMock(return_value=self.etos),
+                IutProvider=self.provider("iut"),
+                LogAreaProvider=self.provider("log_area"),
+                ExecutionSpaceProvider=self.provider("execution_space"),
+                provider_ruleset=lambda _, provider_id: self.rulesets[provider_id],
+                record_released_sub_suite=lambda _, spec: self.recorded.append(spec["name"]),
+            ),
+        ):
+            BatchReleaser(concurrency=2, timeout=timeout).run(*args, **kwargs)
+
+    def test_release_per_provider(self) -> None:
+        """Test that the batch releaser checks in all items of a provider at once.
+
+        Approval criteria:
+            - External providers shall get a single checkin with all of their items.
+            - JSONTas providers shall get a checkin per item.
+            - Environments shall be listed from Kubernetes with a single request.
+
+        Test steps::
+            1. Release four environments using external and JSONTas providers.
+            2. Verify that the external providers got one checkin each.
+            3. Verify that the JSONTas provider got a checkin per item.
+        """
+        self.logger.info("STEP: Release four environments using external and JSONTas providers.")
+        self.release(label_selector="etos.eiffel-community.github.io/id=suite-id")
+        self.environment.client.get.assert_called_once_with(
+            namespace=self.environment.namespace,
+            label_selector="etos.eiffel-community.github.io/id=suite-id",
+        )
+
+        self.logger.info("STEP: Verify that the external providers got one checkin each.")
+        self.assertEqual(len(self.checkins[("iut", "external-iut")]), 1)
+        self.assertEqual(
+            [iut.id for iut in self.checkins[("iut", "external-iut")][0]],
+            ["env1-iut", "env2-iut", "env4-iut"],
+        )
+        self.assertEqual(len(self.checkins[("log_area", "log-area")]), 1)
+        self.assertEqual(len(self.checkins[("log_area", "log-area")][0]), 4)
+        self.assertEqual(len(self.checkins[("execution_space", "executor")]), 1)
+        self.assertEqual(len(self.checkins[("execution_space", "executor")][0]), 4)
+
+        self.logger.info("STEP: Verify that the JSONTas provider got a checkin per item.")
+        self.assertEqual(len(self.checkins[("iut", "jsontas-iut")]), 1)
+        self.assertEqual(self.checkins[("iut", "jsontas-iut")][0].id, "env3-iut")
+
+    def test_release_by_id(self) -> None:
+        """Test that the batch releaser only releases the requested environments.
+
+        Approval criteria:
+            - Only the environments with the requested IDs shall be released.
+            - Only the requested environments shall be requested from Kubernetes.
+
+        Test steps::
+            1. Release two out of four environments by ID.
+            2. Verify that only the items of those two environments were checked in.
+        """
+        self.logger.info("STEP: Release two out of four environments by ID.")
+        self.release(["env1", "env3"])
+        self.environment.client.get.assert_not_called()
+
+        self.logger.info(
+            "STEP: Verify that only the items of those two environments were checked in."
+        )
+        self.assertEqual(
+            [iut.id for iut in self.checkins[("iut", "external-iut")][0]], ["env1-iut"]
+        )
+        self.assertEqual(self.checkins[("iut", "jsontas-iut")][0].id, "env3-iut")
+        self.assertEqual(
+            [log_area.id for log_area in self.checkins[("log_area", "log-area")][0]],
+            ["env1-log-area", "env3-log-area"],
+        )
+
+    def test_release_failure(self) -> None:
+        """Test that the batch releaser releases all providers even if one of them fails.
+
+        Approval criteria:
+            - A failing provider shall not stop other providers from being released.
+            - The batch release shall raise ReleaseError if any provider failed.
+
+        Test steps::
+            1. Release environments where one provider does not exist.
+            2. Verify that the release raised ReleaseError.
+            3. Verify that the other providers were released.
+        """
+        self.logger.info("STEP: Release environments where one provider does not exist.")
+        del self.rulesets["jsontas-iut"]
+        with self.assertRaises(ReleaseError):
+            self.logger.info("STEP: Verify that the release raised ReleaseError.")
+            self.release(label_selector="app=etos")
+
+        self.logger.info("STEP: Verify that the other providers were released.")
+        self.assertIn(("iut", "external-iut"), self.checkins)
+        self.assertIn(("log_area", "log-area"), self.checkins)
+        self.assertIn(("execution_space", "executor"), self.checkins)
+
+    def test_release_missing_environment(self) -> None:
+        """Test that the batch releaser logs environments that cannot be found.
+
+        Approval criteria:
+            - An environment that cannot be found shall be logged.
+            - The environments that were found shall be released.
+
+        Test steps::
+            1. Release an existing and a missing environment by ID.
+            2. Verify that the missing environment was logged.
+            3. Verify that the existing environment was released.
+        """
+        self.logger.info("STEP: Release an existing and a missing environment by ID.")
+        with self.assertLogs("environment_provider.lib.releaser", level="ERROR") as logs:
+            self.release(["env1", "env5"])
+
+        self.logger.info("STEP: Verify that the missing environment was logged.")
+        self.assertTrue(any("'env5'" in line for line in logs.output))
+
+        self.logger.info("STEP: Verify that the existing environment was released.")
+        self.assertEqual(
+            [iut.id for iut in self.checkins[("iut", "external-iut")][0]], ["env1-iut"]
+        )
+
+    def test_release_per_testrun(self) -> None:
+        """Test that the batch releaser identifies every checkin with its testrun.
+
+        Approval criteria:
+            - Items of different testruns shall be checked in separately.
+            - Providers shall be created with the suite ID of the testrun as identifier.
+
+        Test steps::
+            1. Release environments of two testruns using the same providers.
+            2. Verify that the items of each testrun were checked in separately.
+            3. Verify that each checkin was identified by the suite ID of its testrun.
+        """
+        self.items[1] = fake_environment(
+            "env2", "external-iut", "log-area", "executor", suite_id="other-suite-id"
+        )
+
+        self.logger.info("STEP: Release environments of two testruns using the same providers.")
+        self.release(label_selector="app=etos")
+
+        self.logger.info("STEP: Verify that the items of each testrun were checked in separately.")
+        checkins = sorted(
+            [iut.id for iut in items] for items in self.checkins[("iut", "external-iut")]
+        )
+        self.assertEqual(checkins, [["env1-iut", "env4-iut"], ["env2-iut"]])
+
+        self.logger.info(
+            "STEP: Verify that each checkin was identified by the suite ID of its testrun."
+        )
+        self.assertEqual(
+            sorted(self.identifiers[("iut", "external-iut")]), ["other-suite-id", "suite-id"]
+        )
+        self.assertEqual(self.identifiers[("iut", "jsontas-iut")], ["suite-id"])
+
+    def test_release_records_timings(self) -> None:
+        """Test that the batch releaser records the test durations of every environment.
+
+        Approval criteria:
+            - The test durations of every released environment shall be recorded.
+
+        Test steps::
+            1. Release four environments.
+            2. Verify that the test durations of all four environments were recorded.
+        """
+        self.logger.info("STEP: Release four environments.")
+        self.release(label_selector="app=etos")
+
+        self.logger.info(
+            "STEP: Verify that the test durations of all four environments were recorded."
+        )
+        self.assertCountEqual(self.recorded, ["env1", "env2", "env3", "env4"])
+
+    def test_release_malformed_environment(self) -> None:
+        """Test that the batch releaser skips environments without a provider.
+
+        Approval criteria:
+            - An environment without a provider for an item shall be logged and skipped.
+            - The other environments shall be released.
+
+        Test steps::
+            1. Release environments where one of them has no IUT provider.
+            2. Verify that the environment without an IUT provider was logged and skipped.
+            3. Verify that the other environments were released.
+        """
+        malformed = fake_environment("env2", "external-iut", "log-area", "executor")
+        malformed.to_dict.return_value["spec"]["iut"] = {"id": "env2-iut"}
+        self.items[1] = malformed
+
+        self.logger.info("STEP: Release environments where one of them has no IUT provider.")
+        with self.assertLogs("environment_provider.lib.releaser", level="ERROR") as logs:
+            self.release(label_selector="app=etos")
+
+        self.logger.info(
+            "STEP: Verify that the environment without an IUT provider was logged and skipped."
+        )
+        self.assertTrue(any("'env2'" in line and "iut" in line for line in logs.output))
+        self.assertEqual(len(self.checkins[("log_area", "log-area")][0]), 3)
+
+        self.logger.info("STEP: Verify that the other environments were released.")
+        self.assertEqual(
+            [iut.id for iut in self.checkins[("iut", "external-iut")][0]],
+            ["env1-iut", "env4-iut"],
+        )
+        self.assertEqual(self.checkins[("iut", "jsontas-iut")][0].id, "env3-iut")
+
+    def test_release_timeout(self) -> None:
+        """Test that releases that do not finish in time are reported as unknown.
+
+        Approval criteria:
+            - Releases that have not finished at the deadline shall raise ReleaseTimeout,
+              and not ReleaseError.
+            - Releases that have not finished at the deadline shall not be stopped.
+
+        Test steps::
+            1. Release environments where the log area provider is slower than the deadline.
+            2. Verify that the release raised ReleaseTimeout, naming the log area provider.
+            3. Verify that the log areas were checked in after the deadline.
+        """
+        self.rulesets["log-area"]["delay"] = 2
+
+        self.logger.info(
+            "STEP: Release environments where the log area provider is slower than the deadline."
+        )
+        with self.assertRaises(ReleaseTimeout) as timeout:
+            self.release(label_selector="app=etos", timeout=1)
+
+        self.logger.info(
+            "STEP: Verify that the release raised ReleaseTimeout, naming the log area provider."
+        )
+        self.assertNotIsInstance(timeout.exception, ReleaseError)
+        self.assertIn("'log-area'", str(timeout.exception))
+        self.assertNotIn("'executor'", str(timeout.exception))
+        self.assertNotIn(("log_area", "log-area"), self.checkins)
+
+        self.logger.info("STEP: Verify that the log areas were checked in after the deadline.")
+        time.sleep(2)
+        self.assertEqual(len(self.checkins[("log_area", "log-area")][0]), 4)
@@ -16,7 +16,9 @@
 """Integration tests for the environment provider splitter."""
 
 import logging
+import time
 import unittest
+from copy import deepcopy
 
 from etos_lib import ETOS
 from etos_lib.kubernetes.schemas.environment_request import Splitter as SplitterSchema
@@ -25,6 +27,56 @@ from environment_provider.splitter.split import Splitter
 from iut_provider.iut import Iut
 
 
+def legacy_assign_iuts(etos: ETOS, test_runners: dict, iuts: list[Iut]) -> list[Iut]:
+    """Assign IUTs to test runners the way the splitter did before using apportionment."""
+    iuts = deepcopy(iuts)
+    for test_runner in test_runners.values():
+        test_runner["iuts"] = {}
+        test_runner["percentage_of_tests"] = len(
+            test_runner.get("unsplit_recipes")
+        ) / etos.config.get("TOTAL_TEST_COUNT")
+        number_of_iuts = round(len(iuts) * test_runner["percentage_of_tests"])
+        if not number_of_iuts:
+            number_of_iuts = 1
+        number_of_tests = len(test_runner.get("unsplit_recipes"))
+        number_of_iuts = number_of_tests if number_of_tests < number_of_iuts else number_of_iuts
+        test_runner["number_of_iuts"] = number_of_iuts
+    while True:
+        time.sleep(0.01)
+        try:
+            for test_runner in test_runners.values():
+                if len(test_runner.get("iuts")) >= test_runner["number_of_iuts"]:
+                    continue
+                test_runner["iuts"][iuts.pop(0)] = {"recipes": [], "executor": None}
+            unfinished = [
+                test_runner
+                for test_runner in test_runners.values()
+                if len(test_runner.get("iuts")) != test_runner["number_of_iuts"]
+            ]
+            if not unfinished:
+                break
+        except IndexError:
+            break
+    return iuts
+
+
+def legacy_splitter(test_suite: dict) -> None:
+    """Split recipes over IUTs the way the splitter did before striding over recipes."""
+
+    def iterator(iterable):
+        yield from iterable
+
+    test_list = iterator(deepcopy(test_suite.get("unsplit_recipes")))
+    while True:
+        try:
+            for _, iut_dict in test_suite.get("iuts").items():
+                test = next(test_list)
+                iut_dict["recipes"].append(test)
+                test_suite["unsplit_recipes"].remove(test)
+        except StopIteration:
+            break
+
+
 class TestSplitter(unittest.TestCase):
     """Test the environment provider slitter."""
 
@@ -60,3 +112,194 @@ class TestSplitter(unittest.TestCase):
                 0,
                 f"'number_of_iuts' is 0, test_runner got 0 assigned IUTs. {test_runner}]",
             )
+
+    def test_assign_iuts_apportionment(self) -> None:
+        """Test that the apportionment of IUTs uses all IUTs and respects the number of tests.
+
+        Approval criteria:
+            - The number of assigned IUTs shall be equal to the available IUTs.
+            - A test runner shall never get more IUTs than it has tests.
+            - The IUTs shall be apportioned by the number of tests of each test runner.
+            - The apportionment shall be deterministic.
+
+        Test steps::
+            1. Assign IUTs to test runners with an uneven distribution of tests.
+            2. Verify that all IUTs were assigned according to the number of tests.
+            3. Verify that the assignment is the same when executed again.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        splitter = Splitter(etos, SplitterSchema(tests=[]))
+
+        self.logger.info("STEP: Assign IUTs to test runners with an uneven distribution of tests.")
+        iuts = [Iut(name=f"iut{index}") for index in range(10)]
+        test_runners = {
+            "runner1": {"unsplit_recipes": list(range(1))},
+            "runner2": {"unsplit_recipes": list(range(30))},
+            "runner3": {"unsplit_recipes": list(range(69))},
+        }
+        unassigned = splitter.assign_iuts(test_runners, iuts)
+
+        self.logger.info(
+            "STEP: Verify that all IUTs were assigned according to the number of tests."
+        )
+        self.assertListEqual(unassigned, [])
+        self.assertListEqual(
+            [test_runner["number_of_iuts"] for test_runner in test_runners.values()], [1, 3, 6]
+        )
+        assigned = [iut for test_runner in test_runners.values() for iut in test_runner["iuts"]]
+        self.assertListEqual(assigned, iuts)
+
+        self.logger.info("STEP: Verify that the assignment is the same when executed again.")
+        for _ in range(10):
+            self.assertListEqual(splitter.apportion([1, 30, 69], 10), [1, 3, 6])
+        self.assertListEqual(splitter.apportion([2, 2, 2], 2), [1, 1, 0])
+        self.assertListEqual(splitter.apportion([2, 1], 10), [2, 1])
+
+    def test_assign_iuts_benchmark(self) -> None:
+        """Benchmark the IUT assignment against the assignment used before apportionment.
+
+        Approval criteria:
+            - Both assignments shall assign the same number of IUTs.
+            - Every IUT shall be assigned once, and every test runner shall get at least one
+              IUT, but never more IUTs than it has tests.
+
+        Test steps::
+            1. Assign 500 IUTs to 50 test runners with both assignments.
+            2. Verify that the same number of IUTs were assigned.
+            3. Verify that every IUT was assigned once, within the bounds of each test runner.
+
+        The times are only logged, since wall-clock comparisons are unreliable on loaded
+        machines.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        iuts = [Iut(name=f"iut{index}") for index in range(500)]
+
+        def test_runners() -> dict:
+            return {
+                f"runner{index}": {"unsplit_recipes": list(range(index + 1))} for index in range(50)
+            }
+
+        etos.config.set("TOTAL_TEST_COUNT", sum(range(1, 51)))
+
+        self.logger.info("STEP: Assign 500 IUTs to 50 test runners with both assignments.")
+        legacy = test_runners()
+        start = time.perf_counter()
+        legacy_assign_iuts(etos, legacy, iuts)
+        legacy_duration = time.perf_counter() - start
+
+        apportioned = test_runners()
+        start = time.perf_counter()
+        unassigned = Splitter(etos, SplitterSchema(tests=[])).assign_iuts(apportioned, iuts)
+        duration = time.perf_counter() - start
+        self.logger.info(
+            "Previous assignment: %.4fs, apportionment: %.4fs (%.0fx)",
+            legacy_duration,
+            duration,
+            legacy_duration / duration,
+        )
+
+        self.logger.info("STEP: Verify that the same number of IUTs were assigned.")
+        self.assertEqual(
+            sum(len(test_runner["iuts"]) for test_runner in legacy.values()),
+            sum(len(test_runner["iuts"]) for test_runner in apportioned.values()),
+        )
+
+        self.logger.info(
+            "STEP: Verify that every IUT was assigned once, within the bounds of each test runner."
+        )
+        self.assertListEqual(unassigned, [])
+        assigned = [iut for test_runner in apportioned.values() for iut in test_runner["iuts"]]
+        self.assertEqual(len(assigned), len(iuts))
+        self.assertEqual(len({id(iut) for iut in assigned}), len(iuts))
+        for test_runner in apportioned.values():
+            self.assertEqual(len(test_runner["iuts"]), test_runner["number_of_iuts"])
+            self.assertGreaterEqual(len(test_runner["iuts"]), 1)
+            self.assertLessEqual(len(test_runner["iuts"]), len(test_runner["unsplit_recipes"]))
+
+    def test_split(self) -> None:
+        """Test that the splitter assigns recipes to IUTs in a round-robin fashion.
+
+        Approval criteria:
+            - All recipes shall be assigned to IUTs in a round-robin fashion.
+            - There shall be no unsplit recipes left.
+
+        Test steps::
+            1. Split 10 recipes over 3 IUTs.
+            2. Verify that the recipes were assigned in a round-robin fashion.
+            3. Verify that there are no unsplit recipes left.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        test_suite = {
+            "iuts": {
+                Iut(name=f"iut{index}"): {"recipes": [], "executor": None} for index in range(3)
+            },
+            "unsplit_recipes": [{"id": index} for index in range(10)],
+        }
+
+        self.logger.info("STEP: Split 10 recipes over 3 IUTs.")
+        Splitter(etos, SplitterSchema(tests=[])).split(test_suite)
+
+        self.logger.info("STEP: Verify that the recipes were assigned in a round-robin fashion.")
+        self.assertListEqual(
+            [[recipe["id"] for recipe in iut["recipes"]] for iut in test_suite["iuts"].values()],
+            [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]],
+        )
+
+        self.logger.info("STEP: Verify that there are no unsplit recipes left.")
+        self.assertListEqual(test_suite["unsplit_recipes"], [])
+
+    def test_split_benchmark(self) -> None:
+        """Benchmark the splitter against the splitter used before striding over recipes.
+
+        Approval criteria:
+            - Both splitters shall assign the same recipes to the same IUTs.
+            - All recipes shall be assigned, evenly over the IUTs.
+
+        Test steps::
+            1. Split 10000 recipes over 20 IUTs with both splitters.
+            2. Verify that both splitters assigned the same recipes.
+            3. Verify that all recipes were assigned, evenly over the IUTs.
+
+        The times are only logged, since wall-clock comparisons are unreliable on loaded
+        machines.
+        """
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+
+        def test_suite() -> dict:
+            return {
+                "iuts": {
+                    Iut(name=f"iut{index}"): {"recipes": [], "executor": None}
+                    for index in range(20)
+                },
+                "unsplit_recipes": [
+                    {"id": index, "testCase": {"id": f"test_{index}"}} for index in range(10000)
+                ],
+            }
+
+        self.logger.info("STEP: Split 10000 recipes over 20 IUTs with both splitters.")
+        legacy = test_suite()
+        start = time.perf_counter()
+        legacy_splitter(legacy)
+        legacy_duration = time.perf_counter() - start
+
+        strided = test_suite()
+        start = time.perf_counter()
+        Splitter(etos, SplitterSchema(tests=[])).split(strided)
+        duration = time.perf_counter() - start
+        self.logger.info(
+            "Previous splitter: %.4fs, new splitter: %.4fs (%.0fx)",
+            legacy_duration,
+            duration,
+            legacy_duration / duration,
+        )
+
+        self.logger.info("STEP: Verify that both splitters assigned the same recipes.")
+        self.assertListEqual(
+            [iut["recipes"] for iut in legacy["iuts"].values()],
+            [iut["recipes"] for iut in strided["iuts"].values()],
+        )
+        self.assertListEqual(legacy["unsplit_recipes"], strided["unsplit_recipes"])
+
+        self.logger.info("STEP: Verify that all recipes were assigned, evenly over the IUTs.")
+        self.assertListEqual(strided["unsplit_recipes"], [])
+        self.assertListEqual([len(iut["recipes"]) for iut in strided["iuts"].values()], [500] * 20)
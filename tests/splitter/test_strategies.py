@@ -0,0 +1,373 @@
+# Copyright Axis Communications AB.
+#
+# For a full list of individual contributors, please see the commit history.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the environment provider splitter strategies."""
+
+import json
+import logging
+import os
+import random
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+from tempfile import TemporaryDirectory
+
+from etos_lib import ETOS
+from etos_lib.kubernetes.schemas.environment_request import Splitter as SplitterSchema
+from etos_lib.lib.config import Config
+from mock import ANY, patch
+
+from environment_provider.lib.database import ETCDPath
+from environment_provider.splitter.split import Splitter
+from environment_provider.splitter.strategies import STRATEGIES
+from environment_provider.splitter.timings import TimingStore, record_released_sub_suite
+from iut_provider.iut import Iut
+from tests.library.fake_database import FakeDatabase
+
+
+class FakeTimingStore(TimingStore):
+    """Timing store with predefined durations."""
+
+    def __init__(self, timings: dict[str, float]) -> None:
+        """Initialize with predefined durations."""
+        super().__init__(scope="fake")
+        self.predefined = timings
+
+    def load(self, test_case_ids: list[str]) -> dict[str, float]:
+        """Load predefined durations."""
+        return {key: self.predefined[key] for key in test_case_ids if key in self.predefined}
+
+
+def create_test_suite(number_of_iuts: int, durations: list[float]) -> dict:
+    """Create a test suite with IUTs and one recipe per duration."""
+    return {
+        "iuts": {
+            Iut(name=f"iut{index}"): {"recipes": [], "executor": None}
+            for index in range(number_of_iuts)
+        },
+        "unsplit_recipes": [
+            {"id": str(index), "testCase": {"id": f"test_{index}"}}
+            for index in range(len(durations))
+        ],
+    }
+
+
+def makespan(suite: dict, timings: TimingStore) -> float:
+    """Calculate the duration of the longest running IUT in a test suite."""
+    return max(
+        sum(timings.durations([recipe["testCase"]["id"] for recipe in iut["recipes"]]))
+        for iut in suite["iuts"].values()
+    )
+
+
+class TestStrategies(unittest.TestCase):
+    """Test the splitter strategies."""
+
+    logger = logging.getLogger(__name__)
+
+    def tearDown(self) -> None:
+        """Reset the splitter configuration."""
+        Config().set("SPLITTER", None)
+        Config().set("TEST_TIMINGS_FILE", None)
+
+    def test_select_strategy(self) -> None:
+        """Test that splitter strategies can be selected by name.
+
+        Approval criteria:
+            - The round-robin strategy shall be used by default.
+            - The strategy shall be selectable by configuration and dataset.
+            - An unknown strategy shall raise a ValueError.
+
+        Test steps::
+            1. Initialize a splitter without a strategy.
+            2. Verify that the round-robin strategy is used.
+            3. Initialize splitters with a strategy from configuration and dataset.
+            4. Verify that the strategies are used.
+            5. Verify that an unknown strategy raises a ValueError.
+        """
+        Config().set("database", FakeDatabase())
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+
+        self.logger.info("STEP: Initialize a splitter without a strategy.")
+        splitter = Splitter(etos, SplitterSchema(tests=[]))
+
+        self.logger.info("STEP: Verify that the round-robin strategy is used.")
+        self.assertEqual(splitter.strategy, "round-robin")
+
+        self.logger.info(
+            "STEP: Initialize splitters with a strategy from configuration and dataset."
+        )
+        etos.config.set("SPLITTER", "lpt")
+        configured = Splitter(etos, SplitterSchema(tests=[]))
+        etos.config.set("SPLITTER", None)
+        dataset = Splitter(etos, SplitterSchema(tests=[]), "lpt")
+
+        self.logger.info("STEP: Verify that the strategies are used.")
+        self.assertEqual(configured.strategy, "lpt")
+        self.assertEqual(dataset.strategy, "lpt")
+
+        self.logger.info("STEP: Verify that an unknown strategy raises a ValueError.")
+        with self.assertRaises(ValueError):
+            Splitter(etos, SplitterSchema(tests=[]), "unknown")
+
+    def test_longest_processing_time(self) -> None:
+        """Test that the LPT strategy balances the expected durations of IUTs.
+
+        Approval criteria:
+            - The LPT strategy shall balance the expected durations of IUTs.
+            - The recipes of each IUT shall be kept in test suite order.
+            - Tests without timings shall be expected to take the average duration.
+
+        Test steps::
+            1. Split tests with known and unknown durations over 2 IUTs using LPT.
+            2. Verify that the expected durations of the IUTs are balanced.
+            3. Verify that the recipes are in test suite order.
+        """
+        timings = FakeTimingStore({"test_0": 8, "test_1": 1, "test_2": 3, "test_3": 2})
+        suite = create_test_suite(2, [8, 1, 3, 2, 3.5])
+
+        self.logger.info(
+            "STEP: Split tests with known and unknown durations over 2 IUTs using LPT."
+        )
+        STRATEGIES["lpt"](suite, timings)
+
+        self.logger.info("STEP: Verify that the expected durations of the IUTs are balanced.")
+        self.assertListEqual(suite["unsplit_recipes"], [])
+        self.assertEqual(makespan(suite, timings), 9)
+
+        self.logger.info("STEP: Verify that the recipes are in test suite order.")
+        self.assertListEqual(
+            [[recipe["id"] for recipe in iut["recipes"]] for iut in suite["iuts"].values()],
+            [["0", "1"], ["2", "3", "4"]],
+        )
+
+    def test_timing_store(self) -> None:
+        """Test that test durations can be recorded in ETCD and in a JSON file.
+
+        Approval criteria:
+            - Test durations shall be recorded as a moving average.
+            - Test durations shall be stored in ETCD by default.
+            - Test durations shall be stored in a JSON file if configured.
+
+        Test steps::
+            1. Record test durations in ETCD and in a JSON file.
+            2. Verify that the durations were stored in ETCD and in the JSON file.
+            3. Verify that new timing stores load the moving averages.
+        """
+        database = FakeDatabase()
+        Config().set("database", database)
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "timings.json")
+
+            self.logger.info("STEP: Record test durations in ETCD and in a JSON file.")
+            for store in (TimingStore(scope="provider"), TimingStore(path)):
+                store.record("test_0", 10)
+                store.record("test_0", 20)
+                store.record("test_1", 5)
+
+            self.logger.info(
+                "STEP: Verify that the durations were stored in ETCD and in the JSON file."
+            )
+            self.assertEqual(float(database.get("/environment/timings/provider/test_0")[0]), 15)
+            with open(path, encoding="UTF-8") as timings_file:
+                self.assertDictEqual(json.load(timings_file), {"test_0": 15, "test_1": 5})
+
+            self.logger.info("STEP: Verify that new timing stores load the moving averages.")
+            for store in (TimingStore(scope="provider"), TimingStore(path)):
+                self.assertListEqual(store.durations(["test_0", "test_1", "test_2"]), [15, 5, 10])
+            self.assertListEqual(TimingStore(scope="other").durations(["test_0"]), [1.0])
+
+    def test_record_released_sub_suite(self) -> None:
+        """Test that the test durations of a sub suite are recorded when it is released.
+
+        Approval criteria:
+            - The duration of a sub suite shall be taken from its started and finished events.
+            - The duration of a sub suite shall be divided over its tests, in proportion to
+              their expected durations.
+            - The durations shall be scoped by the IUT provider of the sub suite.
+            - The durations of a sub suite shall only be recorded once.
+            - Sub suites that have not finished shall not be recorded.
+            - Only the durations of the requested tests shall be read from ETCD.
+
+        Test steps::
+            1. Release a sub suite with two tests that has started but not finished.
+            2. Verify that no durations were recorded.
+            3. Release the sub suite twice after it finished, 12 seconds after it started.
+            4. Verify that the durations were recorded once, in the scope of the provider.
+            5. Verify that only the durations of the requested tests are read.
+        """
+        database = FakeDatabase()
+        Config().set("database", database)
+        etos = ETOS("testing_etos", "testing_etos", "testing_etos")
+        testrun = "/testrun/e7d24b4b-7f3a-4a61-a0d3-3a5b1b4c1c39"
+        database.put("/environment/timings/provider/test_0", "2")
+        database.put("/environment/timings/provider/test_1", "1")
+        database.put("/environment/timings/provider/unrelated", "1")
+        sub_suite = {
+            "name": "SubSuite_0",
+            "suite_id": testrun.rsplit("/", 1)[-1],
+            "test_suite_started_id": "main",
+            "recipes": [{"testCase": {"id": "test_0"}}, {"testCase": {"id": "test_1"}}],
+            "iut": {"provider_id": "provider"},
+            "executor": {"instructions": {"environment": {"ENVIRONMENT_ID": "environment"}}},
+        }
+        unrecorded = f"{testrun}/suite/main/subsuite/environment/unrecorded"
+        database.put(unrecorded, "true")
+        started = {"meta": {"id": "sub_suite_started", "time": 1700000000000}}
+        finished = {"meta": {"time": 1700000012000}}
+
+        self.logger.info(
+            "STEP: Release a sub suite with two tests that has started but not finished."
+        )
+        with (
+            patch(
+                "environment_provider.splitter.timings.request_sub_suite_started",
+                return_value=started,
+            ),
+            patch(
+                "environment_provider.splitter.timings.request_test_suite_finished",
+                return_value=None,
+            ),
+        ):
+            record_released_sub_suite(etos, sub_suite)
+
+        self.logger.info("STEP: Verify that no durations were recorded.")
+        self.assertNotEqual(database.get(unrecorded), [])
+        self.assertEqual(float(database.get("/environment/timings/provider/test_0")[0]), 2)
+
+        self.logger.info(
+            "STEP: Release the sub suite twice after it finished, 12 seconds after it started."
+        )
+        with (
+            patch(
+                "environment_provider.splitter.timings.request_sub_suite_started",
+                return_value=started,
+            ) as request_started,
+            patch(
+                "environment_provider.splitter.timings.request_test_suite_finished",
+                return_value=finished,
+            ) as request_finished,
+        ):
+            record_released_sub_suite(etos, sub_suite)
+            record_released_sub_suite(etos, sub_suite)
+        request_started.assert_called_once_with(etos, "environment")
+        request_finished.assert_called_once_with(etos, "sub_suite_started")
+
+        self.logger.info(
+            "STEP: Verify that the durations were recorded once, in the scope of the provider."
+        )
+        self.assertEqual(database.get(unrecorded), [])
+        # 12 seconds divided 2:1 and averaged with the previous durations.
+        self.assertAlmostEqual(float(database.get("/environment/timings/provider/test_0")[0]), 5)
+        self.assertAlmostEqual(float(database.get("/environment/timings/provider/test_1")[0]), 2.5)
+
+        self.logger.info("STEP: Verify that only the durations of the requested tests are read.")
+        with patch.object(TimingStore, "load", autospec=True, return_value={}) as load:
+            TimingStore(scope="provider").durations(["test_0", "test_0", "test_1"])
+        load.assert_called_once_with(ANY, ["test_0", "test_1"])
+
+    def test_record_concurrently(self) -> None:
+        """Test that concurrent recordings of test durations are neither lost nor repeated.
+
+        Approval criteria:
+            - Durations recorded by timing stores of the same JSON file at the same time
+              shall all be stored, in a valid JSON file.
+            - A sub suite released several times at once shall only be recorded once.
+
+        Test steps::
+            1. Record the durations of 20 tests at the same time, with a store per test.
+            2. Verify that the durations of all tests were stored in the JSON file.
+            3. Record the durations of a sub suite 10 times at the same time.
+            4. Verify that the durations of the sub suite were recorded once.
+        """
+        database = FakeDatabase()
+        Config().set("database", database)
+        with TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "timings.json")
+
+            self.logger.info(
+                "STEP: Record the durations of 20 tests at the same time, with a store per test."
+            )
+            with ThreadPool(10) as thread_pool:
+                thread_pool.map(
+                    lambda index: TimingStore(path).record(f"test_{index}", index), range(20)
+                )
+
+            self.logger.info(
+                "STEP: Verify that the durations of all tests were stored in the JSON file."
+            )
+            with open(path, encoding="UTF-8") as timings_file:
+                self.assertDictEqual(
+                    json.load(timings_file), {f"test_{index}": index for index in range(20)}
+                )
+            self.assertListEqual(os.listdir(tempdir), ["timings.json"])
+
+        self.logger.info("STEP: Record the durations of a sub suite 10 times at the same time.")
+        unrecorded = ETCDPath("/testrun/suite-id/suite/main/subsuite/environment/unrecorded")
+        unrecorded.write("true")
+        with ThreadPool(10) as thread_pool:
+            thread_pool.map(
+                lambda _: TimingStore(scope="provider").record_sub_suite(
+                    unrecorded, ["test_0"], 10
+                ),
+                range(10),
+            )
+
+        self.logger.info("STEP: Verify that the durations of the sub suite were recorded once.")
+        self.assertIsNone(unrecorded.read())
+        # The fake database keeps every value written to a key.
+        self.assertEqual(database.get("/environment/timings/provider/test_0"), [b"10.0"])
+
+    def test_makespan_simulation(self) -> None:
+        """Simulate the makespan of round-robin and LPT on synthetic duration distributions.
+
+        Approval criteria:
+            - LPT shall never have a longer makespan than round-robin.
+
+        Test steps::
+            1. Split synthetic test durations with round-robin and LPT.
+            2. Verify that the makespan of LPT is never longer than round-robin.
+        """
+        generator = random.Random(1234)
+        distributions = {
+            "uniform": lambda: generator.uniform(1, 100),
+            "exponential": lambda: generator.expovariate(1 / 30),
+            "long tail": lambda: 10 * generator.paretovariate(1.5),
+            "bimodal": lambda: generator.choice((5, 600)) * generator.uniform(0.8, 1.2),
+        }
+        for name, distribution in distributions.items():
+            durations = [distribution() for _ in range(1000)]
+            timings = FakeTimingStore(
+                {f"test_{index}": duration for index, duration in enumerate(durations)}
+            )
+
+            self.logger.info("STEP: Split synthetic test durations with round-robin and LPT.")
+            spans = {}
+            for strategy in ("round-robin", "lpt"):
+                suite = create_test_suite(16, durations)
+                STRATEGIES[strategy](suite, timings)
+                spans[strategy] = makespan(suite, timings)
+            self.logger.info(
+                "%s: optimal %.0fs, round-robin %.0fs, LPT %.0fs",
+                name,
+                sum(durations) / 16,
+                spans["round-robin"],
+                spans["lpt"],
+            )
+
+            self.logger.info(
+                "STEP: Verify that the makespan of LPT is never longer than round-robin."
+            )
+            self.assertLessEqual(spans["lpt"], spans["round-robin"])
@@ -136,6 +136,7 @@ class TestEnvironmentProvider(unittest.TestCase):
             1. Start up a fake server.
             2. Run the environment provider.
             3. Verify that two environments were sent.
+            4. Verify that both sub suites were added to the sub suite index.
         """
         tercc = TERCC_SUB_SUITES
 
@@ -176,6 +177,12 @@ class TestEnvironmentProvider(unittest.TestCase):
                 environments.append(event)
         self.assertEqual(len(environments), 2)
 
+        self.logger.info("STEP: Verify that both sub suites were added to the sub suite index.")
+        index = database.get_prefix(f"/testrun/{suite_id}/subsuites/")
+        self.assertEqual(len(index), 2)
+        for value, _ in index:
+            self.assertTrue(database.get(value.decode()))
+
     @patch("environment_provider.environment_provider.Kubernetes")
     def test_get_environment(self, _):
         """Test environment provider with single sub suites.